@@ -1,171 +1,348 @@
-from flask import Flask, request, jsonify, send_from_directory, render_template, Response
+from flask import Flask, request, jsonify, send_from_directory, send_file, render_template, Response
 from flask_socketio import SocketIO
 import threading
-import subprocess
 import json
-import sys
 import os
 import shutil
 import webbrowser
 import time
 import re
+import queue
+import uuid
+import atexit
+import argparse
+import socket
 from pathlib import Path
 from urllib.parse import urlparse, parse_qs
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, Future
 import logging
 
+from config_manager import ConfigManager
+from download_queue import DownloadScheduler, DownloadJob, SingleFlight, RetryLater, Pending
+from metadata_cache import MetadataCache, normalize_url, playlist_param, is_single_video, info_expired
+from ytdlp_engine import YtdlpEngine
+from backends import DownloaderBackend, YtdlpEngineBackend, AsyncDownloaderBackend
+from progress_emitter import ProgressEmitter
+from process_registry import ProcessRegistry
+from job_store import JobStore
+from metrics import MetricsRegistry, THROUGHPUT_BUCKETS
+from download_archive import DownloadArchive
+from broker import create_broker
+from bandwidth import BandwidthGovernor
+from concurrency_controller import AIMDController
+from retry import RetryPolicy, classify_failure
+from postprocess import PostProcessPool, extract_audio
+from storage import DiskSpaceGuard, move_into, expected_size
+from job_events import JobEventLog
+from async_runner import EventLoopThread
+from thumbnail_cache import ThumbnailCache, THUMBNAIL_SIZES, thumbnail_id
+
 # --- Constants ---
 FFMPEG_URL = "https://ffmpeg.org/download.html"
 YTDLP_URL = "https://github.com/yt-dlp/yt-dlp"
 
-# --- Backend Downloader Class (from your original script) ---
-class DownloaderBackend:
-    def __init__(self, ytdlp_path):
-        self.ytdlp_path = ytdlp_path
-
-    def get_metadata(self, url):
-        command = [
-            self.ytdlp_path,
-            '--dump-json',
-            '--flat-playlist',
-            '--no-warnings',
-            url
-        ]
-        try:
-            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding='utf-8', startupinfo=self._get_startup_info())
-            stdout, stderr = process.communicate(timeout=30)
-            if process.returncode != 0:
-                raise RuntimeError(f"yt-dlp error: {stderr.strip()}")
-            videos = [json.loads(line) for line in stdout.strip().split('\n')]
-            return videos
-        except Exception as e:
-            raise e
-
-    def download(self, job_id, url, options, sid):
-        command = [
-            self.ytdlp_path,
-            '--progress',
-            '--no-warnings',
-            '--encoding', 'utf-8',
-            '--output', options['output_template'],
-            '--format', options['format_code'],
-        ]
-        if options.get('extract_audio'):
-            command.extend(['--extract-audio', '--audio-format', options['audio_format']])
-        command.append(url)
-
-        try:
-            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding='utf-8', bufsize=1, startupinfo=self._get_startup_info())
-            
-            socketio.emit('progress_update', {'id': job_id, 'status': 'Downloading'}, room=sid)
-
-            for line in iter(process.stdout.readline, ''):
-                progress_data = self._parse_progress(line)
-                if progress_data:
-                    progress_data['id'] = job_id
-                    socketio.emit('progress_update', progress_data, room=sid)
-            
-            process.wait()
-            if process.returncode == 0:
-                socketio.emit('progress_update', {'id': job_id, 'status': 'Completed', 'progress': 100.0}, room=sid)
-            else:
-                socketio.emit('progress_update', {'id': job_id, 'status': 'Error'}, room=sid)
-        except Exception as e:
-            socketio.emit('progress_update', {'id': job_id, 'status': 'Error', 'message': str(e)}, room=sid)
-
-    def _parse_progress(self, line):
-        if line.strip().startswith('[download]'):
-            parts = line.split()
-            try:
-                percent_str = next((p for p in parts if '%' in p), None)
-                if percent_str:
-                    progress = float(percent_str.replace('%', ''))
-                    size_str = next((p for p in parts if 'iB' in p), None)
-                    speed_str = next((p for p in parts if 'iB/s' in p), None)
-                    eta_str = next((p for p in parts if ':' in p and len(p) > 4), None)
-                    return {'status': 'Downloading', 'progress': progress, 'size': size_str, 'speed': speed_str, 'eta': eta_str}
-            except (ValueError, IndexError):
-                pass
-        return None
-
-    def _get_startup_info(self):
-        if sys.platform == "win32":
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            startupinfo.wShowWindow = subprocess.SW_HIDE
-            return startupinfo
-        return None
-
 # --- Flask App Initialization ---
+# Routes and socket.io handlers below register on these at import; everything
+# that opens files or starts threads is built by create_app() instead
 app = Flask(__name__, static_folder='.', static_url_path='')
 socketio = SocketIO(app, cors_allowed_origins="*")
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Thread pool for concurrent downloads
-executor = ThreadPoolExecutor(max_workers=4)
+# Running download processes, for pause/resume
+process_registry = ProcessRegistry()
+
+# One job per (video, format, post-processing) at a time; duplicates follow it
+single_flight = SingleFlight()
+
+remote_jobs = {}  # job_id -> DownloadJob waiting on a worker
 
-# Global variables for tracking downloads
-active_downloads = {}
-download_stats = {
-    'total': 0,
-    'completed': 0,
-    'failed': 0,
-    'active': 0
+# job_id -> transfer timings of a running download, for the metrics below
+job_timings = {}
+
+# playlist id -> listing progress of a playlist being downloaded as it is listed
+playlist_jobs = {}
+
+# Progress statuses that change a job's state in the store; terminal states
+# are recorded by run_download once the backend returns
+JOB_STATES = {
+    'Queued': 'queued',
+    'Downloading': 'running',
+    'Processing': 'running',
+    'Paused': 'paused',
+    'Retrying': 'queued'
 }
 
-# --- Dependency Check ---
-YTDLP_PATH = shutil.which('yt-dlp')
-FFMPEG_PATH = shutil.which('ffmpeg')
+# --- Metrics ---
+metrics = MetricsRegistry()
+metadata_latency = metrics.histogram(
+    'ytdl_metadata_seconds', 'Time to list the metadata behind a URL', ['cache'])
+queue_wait = metrics.histogram(
+    'ytdl_queue_wait_seconds', 'Time download jobs spent queued before a worker picked them up')
+time_to_first_byte = metrics.histogram(
+    'ytdl_time_to_first_byte_seconds', 'Time from a download starting to its first bytes arriving')
+download_throughput = metrics.histogram(
+    'ytdl_download_bytes_per_second', 'Average transfer rate of each finished download', buckets=THROUGHPUT_BUCKETS)
+postprocess_time = metrics.histogram(
+    'ytdl_postprocess_seconds', 'Time from the last downloaded byte to a job finishing (merging, audio extraction)')
+jobs_finished = metrics.counter(
+    'ytdl_jobs_finished_total', 'Download jobs finished, by outcome', ['status'])
+active_subprocesses = metrics.gauge(
+    'ytdl_active_subprocesses', 'yt-dlp processes (or engine workers) currently busy', ['kind'])
+socket_emits = metrics.counter(
+    'ytdl_socket_emits_total', 'socket.io frames sent to clients', ['event'])
+progress_updates = metrics.counter(
+    'ytdl_progress_updates_total', 'Progress updates reported by download backends')
+deduplicated_jobs = metrics.counter(
+    'ytdl_deduplicated_jobs_total', 'Submissions attached to an identical job already in flight')
+retries = metrics.counter(
+    'ytdl_retries_total', 'Failed downloads scheduled for another attempt, by failure kind', ['kind'])
+failures = metrics.counter(
+    'ytdl_failures_total', 'Download attempts that failed, by failure kind', ['kind'])
+archive_skips = metrics.counter(
+    'ytdl_archive_skips_total', 'Submissions skipped because the download archive already has them')
+info_reuse = metrics.counter(
+    'ytdl_info_reuse_total', 'Downloads started from cached metadata, or re-extracted because its URLs expired',
+    ['outcome'])
+metrics.gauge('ytdl_queued_jobs', 'Download jobs waiting for a worker',
+              function=lambda: scheduler.snapshot()['queued'])
+metrics.gauge('ytdl_running_jobs', 'Download jobs currently running',
+              function=lambda: scheduler.snapshot()['running'])
+metrics.gauge('ytdl_download_workers', 'Size of the download worker pool',
+              function=lambda: scheduler.max_workers)
+
+# --- Services ---
+# Set by create_app(). Engine workers are spawned processes that re-import
+# this module without calling it, so they don't open the databases, start
+# scheduler threads or spawn workers of their own.
+config = None
+WORKER_MODE = False
+MAX_CONCURRENT_DOWNLOADS = 64
+YTDLP_PATH = FFMPEG_PATH = None
+download_dir = scratch_dir = None
+progress_emitter = disk_guard = scheduler = job_store = broker = None
+retry_policy = concurrency_controller = job_events = None
+download_archive = bandwidth = metadata_cache = thumbnail_cache = None
+postprocessor = downloader = metadata_executor = None
+
+# Progress is coalesced per job and sent as one batched frame per client per tick
+def emit_event(event, data, room=None):
+    socket_emits.inc(event=event)
+    socketio.emit(event, data, room=room)
+
+def create_app(worker_mode=False):
+    """Build the services behind the web app and return it.
+
+    With worker_mode (`python app.py --worker`) only downloads run here: the
+    job store and the caches belong to the web tier, which records whatever
+    the worker reports.
+    """
+    global config, WORKER_MODE, MAX_CONCURRENT_DOWNLOADS, YTDLP_PATH, FFMPEG_PATH, download_dir, scratch_dir
+    global progress_emitter, disk_guard, scheduler, job_store, broker, retry_policy, concurrency_controller
+    global job_events, download_archive, bandwidth, metadata_cache, thumbnail_cache, postprocessor
+    global downloader, metadata_executor
+    config = ConfigManager()
+    WORKER_MODE = worker_mode
+
+    progress_emitter = ProgressEmitter(
+        emit_event,
+        interval=config.get('progress_interval', 0.25)
+    )
+
+    # Bounded worker pool for downloads, sized from the advanced config
+    # Finished files land in download_dir; with temp_directory set, in-progress
+    # data (.part files, merge intermediates) stays there until the job is done
+    download_dir = os.path.join(os.path.expanduser('~'), 'Downloads', 'WebApp_Downloader')
+    scratch_dir = config.get('temp_directory')
+
+    # Jobs only start while the disks they write to have room for them
+    if config.get('disk_admission', True):
+        disk_guard = DiskSpaceGuard([scratch_dir, download_dir], min_free=config.get('min_free_space', 1024 ** 3))
 
-if not YTDLP_PATH or not FFMPEG_PATH:
-    print("ERROR: yt-dlp or ffmpeg not found in PATH.")
-    print("Please install them and ensure they are accessible.")
-    # In a real app, you might exit or provide download links.
-    # For this example, we will proceed but expect errors.
+    # Upper bound for max_concurrent_downloads: each slot costs a thread, except
+    # with the async backend, whose few scheduler threads drive every slot
+    MAX_CONCURRENT_DOWNLOADS = 5000 if config.get('download_backend') == 'async' else 64
 
-downloader = DownloaderBackend(YTDLP_PATH)
+    scheduler = DownloadScheduler(
+        max_workers=min(config.get('max_concurrent_downloads', 3), MAX_CONCURRENT_DOWNLOADS),
+        max_per_host=config.get('max_concurrent_per_host', 2),
+        admission=disk_guard,
+        # Jobs too big for the disk even with nothing else downloading fail instead of waiting forever
+        on_reject=reject_job,
+        # The async backend runs downloads on its event loop, so a few threads drive every slot
+        threads=config.get('scheduler_threads', 4) if config.get('download_backend') == 'async' else None
+    )
+
+    # Every job's state survives a restart; unfinished jobs are re-enqueued on startup
+    if not WORKER_MODE:
+        job_store = JobStore(
+            path=config.get('job_store_path', 'jobs.db'),
+            flush_interval=config.get('job_store_flush_interval', 0.5)
+        )
+        atexit.register(job_store.close)
+
+    # With a job broker configured, downloads run in `python app.py --worker`
+    # processes instead of this one
+    broker = create_broker(config.get('job_broker'), config.get('broker_path', 'broker.db'))
+
+    # Transient failures are re-queued after a backoff instead of failing the job
+    retry_policy = RetryPolicy(
+        max_attempts=config.get('retry_attempts', 3),
+        base_delay=config.get('retry_base_delay', 2),
+        max_delay=config.get('retry_max_delay', 300)
+    )
+
+    # Grows and shrinks per-host limits from measured throughput and throttling
+    concurrency_controller = AIMDController(
+        scheduler,
+        min_limit=config.get('adaptive_min_per_host', 1),
+        # A single site never gets more slots than the whole scheduler has
+        max_limit=min(config.get('adaptive_max_per_host', 6), scheduler.max_workers),
+        interval=config.get('adaptive_interval', 10)
+    )
+
+    # Recent events of every job, followed by /download streams (and replayed on reconnect)
+    job_events = JobEventLog(size=config.get('sse_event_buffer', 256), retention=config.get('sse_retention', 300),
+                             idle_timeout=config.get('sse_idle_timeout', 3600))
+
+    # --- Dependency Check ---
+    YTDLP_PATH = shutil.which('yt-dlp')
+    FFMPEG_PATH = shutil.which('ffmpeg')
+
+    if not YTDLP_PATH or not FFMPEG_PATH:
+        print("ERROR: yt-dlp or ffmpeg not found in PATH.")
+        print("Please install them and ensure they are accessible.")
+        # In a real app, you might exit or provide download links.
+        # For this example, we will proceed but expect errors.
+
+    # yt-dlp --download-archive file shared with the desktop GUI
+    download_archive = DownloadArchive(config.get('download_archive')) if config.get('download_archive') else None
+
+    # Splits rate_limit across running downloads; each backend applies its job's share
+    bandwidth = BandwidthGovernor(
+        total_rate=config.get('rate_limit'),
+        weights=config.get('bandwidth_weights'),
+        on_change=lambda job_id, rate: downloader.apply_rate(job_id, rate)
+    )
+
+    if not WORKER_MODE:
+        metadata_cache = MetadataCache(
+            path=config.get('metadata_cache_path', 'metadata_cache.db'),
+            ttl=config.get('metadata_cache_ttl', 3600),
+            max_entries=config.get('metadata_cache_max_entries', 5000)
+        )
+        # Resized thumbnails served by /api/thumb, shared with the desktop GUI
+        thumbnail_cache = ThumbnailCache(
+            directory=config.get('thumbnail_cache_dir', 'thumbnail_cache'),
+            max_files=config.get('thumbnail_cache_max_files', 20000)
+        )
+
+    # Audio conversions run in a core-count sized pool instead of holding a download slot
+    if FFMPEG_PATH and config.get('separate_postprocessing', True):
+        postprocessor = PostProcessPool(workers=config.get('postprocess_workers'))
+        metrics.gauge('ytdl_postprocess_queued_jobs', 'Downloaded jobs waiting for the post-processing pool',
+                      function=lambda: postprocessor.stats()['queued'])
+
+    downloader = create_downloader()
+
+    # Bounded fan-out for batch metadata requests
+    metadata_executor = ThreadPoolExecutor(max_workers=config.get('metadata_fanout', 8))
+    return app
+
+def create_downloader():
+    """Pick the download backend named by the download_backend config key"""
+    # What every backend reports to and is throttled, paused and measured by
+    services = {
+        'metadata_cache': metadata_cache,
+        'cache_max_listing': config.get('metadata_cache_max_listing', 2000),
+        'report_progress': report_progress,
+        'process_registry': process_registry,
+        'bandwidth': bandwidth,
+        'metadata_latency': metadata_latency,
+        'active_subprocesses': active_subprocesses
+    }
+    if config.get('download_backend', 'subprocess') == 'inprocess':
+        engine = YtdlpEngine(
+            download_workers=config.get('engine_download_workers', 5),
+            metadata_workers=config.get('engine_metadata_workers', 2)
+        )
+        return YtdlpEngineBackend(engine, **services)
+    if config.get('download_backend') == 'async':
+        return AsyncDownloaderBackend(YTDLP_PATH, EventLoopThread(),
+                                      download_idle_timeout=config.get('download_idle_timeout', 600),
+                                      idle_timeout=config.get('timeout_seconds', 30),
+                                      rebalance_threshold=config.get('bandwidth_rebalance_threshold', 0.25),
+                                      **services)
+    return DownloaderBackend(YTDLP_PATH,
+                             idle_timeout=config.get('timeout_seconds', 30),
+                             rebalance_threshold=config.get('bandwidth_rebalance_threshold', 0.25),
+                             **services)
 
 # --- HTTP API Routes ---
 @app.route('/')
 def index():
     return send_from_directory('.', 'index.html')
 
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/stats')
 def get_stats():
     """Get download statistics"""
-    return jsonify(download_stats)
+    return jsonify(job_store.stats())
 
 @app.route('/api/queue')
 def get_queue():
     """Get current download queue"""
     return jsonify({
-        'active_downloads': active_downloads,
-        'stats': download_stats
+        'active_downloads': {job['id']: job for job in job_store.active()},
+        'stats': job_store.stats(),
+        'scheduler': scheduler.snapshot(),
+        'disk': disk_guard.snapshot() if disk_guard is not None else None,
+        'postprocess': postprocessor.stats() if postprocessor is not None else None,
+        'broker': broker.stats(config.get('broker_heartbeat_timeout', 60)) if broker is not None else None
     })
 
+@app.route('/api/queue/concurrency', methods=['POST'])
+def set_concurrency():
+    """Resize the download worker pool"""
+    data = request.get_json() or {}
+    try:
+        max_workers = int(data.get('max_concurrent_downloads'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'max_concurrent_downloads must be an integer'}), 400
+    if max_workers < 1:
+        return jsonify({'error': 'max_concurrent_downloads must be at least 1'}), 400
+    if max_workers > MAX_CONCURRENT_DOWNLOADS:
+        return jsonify({'error': f'max_concurrent_downloads must be at most {MAX_CONCURRENT_DOWNLOADS}'}), 400
+
+    scheduler.set_max_workers(max_workers)
+    config.set('max_concurrent_downloads', max_workers)
+    concurrency_controller.max_limit = min(config.get('adaptive_max_per_host', 6), scheduler.max_workers)
+    return jsonify({'message': 'Concurrency updated', 'max_concurrent_downloads': scheduler.max_workers})
+
 @app.route('/api/queue/clear', methods=['POST'])
 def clear_queue():
     """Clear completed downloads from queue"""
     try:
-        # Reset stats but keep active downloads
-        download_stats['completed'] = 0
-        download_stats['failed'] = 0
-        download_stats['total'] = download_stats['active']
+        # Forget finished jobs but keep active downloads
+        job_store.clear_finished()
         
-        return jsonify({'message': 'Queue cleared successfully', 'stats': download_stats})
+        return jsonify({'message': 'Queue cleared successfully', 'stats': job_store.stats()})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/queue/pause', methods=['POST'])
 def pause_downloads():
-    """Pause all active downloads"""
+    """Pause all active downloads and stop starting queued ones"""
     try:
-        # In a real implementation, this would pause active downloads
-        # For now, we'll just return a success message
-        return jsonify({'message': 'Downloads paused'})
+        scheduler.pause()
+        paused = process_registry.pause_all()
+        for job_id in paused:
+            report_job_status(job_id, 'Paused')
+        return jsonify({'message': 'Downloads paused', 'paused': paused})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -173,16 +350,610 @@ def pause_downloads():
 def resume_downloads():
     """Resume all paused downloads"""
     try:
-        # In a real implementation, this would resume paused downloads
-        # For now, we'll just return a success message
-        return jsonify({'message': 'Downloads resumed'})
+        resumed = process_registry.resume_all()
+        scheduler.resume()
+        for job_id in resumed:
+            report_job_status(job_id, 'Downloading')
+        return jsonify({'message': 'Downloads resumed', 'resumed': resumed})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/jobs/<job_id>/pause', methods=['POST'])
+def pause_job(job_id):
+    """Pause a single running download"""
+    if process_registry.get(job_id) is None:
+        return jsonify({'error': 'Job is not running'}), 404
+    if not process_registry.pause(job_id):
+        return jsonify({'error': 'Job is already paused or cannot be paused'}), 400
+    report_job_status(job_id, 'Paused')
+    return jsonify({'message': 'Download paused', 'id': job_id})
+
+@app.route('/api/jobs/<job_id>/resume', methods=['POST'])
+def resume_job(job_id):
+    """Resume a single paused download"""
+    if process_registry.get(job_id) is None:
+        return jsonify({'error': 'Job is not running'}), 404
+    if not process_registry.resume(job_id):
+        return jsonify({'error': 'Job is not paused'}), 400
+    report_job_status(job_id, 'Downloading')
+    return jsonify({'message': 'Download resumed', 'id': job_id})
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job_route(job_id):
+    """Drop a download that is queued or waiting to retry"""
+    if not cancel_job(job_id):
+        return jsonify({'error': 'Job is not queued'}), 400
+    return jsonify({'message': 'Download cancelled', 'id': job_id})
+
+def report_job_status(job_id, status):
+    job = process_registry.get(job_id)
+    if job is not None:
+        report_progress(job_id, {'status': status}, job.room)
+
+def report_progress(job_id, data, room=None):
+    """Send a job's progress to its client and record it in the job store"""
+    progress_updates.inc()
+    track_transfer(job_id, data)
+    # Only the latest transfer progress matters to a stream that catches up
+    job_events.publish(job_id, data, coalesce=data.get('status') == 'Downloading')
+    if data.get('message') and job_id in job_timings:
+        job_timings[job_id]['error'] = data['message']
+    if WORKER_MODE:
+        # Goes back through the broker keyed by job id; the web tier records it and finds the client
+        progress_emitter.update(job_id, data)
+        return
+    record = job_store.get(job_id)
+    if record is None:
+        notify_client(job_id, data, room)
+        return
+    fields = {}
+    if 'progress' in data:
+        fields['progress'] = data['progress']
+    if data.get('status') in JOB_STATES:
+        fields['status'] = JOB_STATES[data['status']]
+    if data.get('message'):
+        fields['error'] = data['message']
+    if fields:
+        job_store.update(job_id, **fields)
+    # Clients know the job by the id they picked, not the server's
+    notify_client(record['client_id'] or job_id, data, record['room'])
+    for client_id, follower_room in single_flight.followers(job_id):
+        notify_client(client_id, data, follower_room)
+
+def notify_client(client_id, data, room):
+    """Queue progress for a Socket.IO client; jobs started over REST or SSE have no room and aren't broadcast"""
+    if room is not None:
+        progress_emitter.update(client_id, data, room)
+
+# --- Job Lifecycle ---
+def enqueue_download(url, quality, client_id=None, room=None, priority='normal', size=None):
+    """Record a new download in the job store and queue it.
+
+    size is the expected download size in bytes, if the caller knows it.
+    Returns (job, joined); joined means an identical download was already in
+    flight and the caller (if it gave a client_id) now follows that job.
+    """
+    job_id = uuid.uuid4().hex
+    if download_archive is not None and download_archive.has_url(url):
+        # Already downloaded: answer without starting yt-dlp at all
+        archive_skips.inc()
+        job = DownloadJob(job_id, url, None)
+        job.status = 'skipped'
+        job.finished_at = time.time()
+        job.done.set()
+        return job, False
+    options = get_download_options(quality, job_id)
+    options['priority'] = priority
+    options['expected_size'] = int(size) if size else cached_size(url)
+
+    def start():
+        job_store.add(job_id, url, quality=quality, options=options, client_id=client_id, room=room)
+        return submit_job(job_id, url, options, room)
+
+    follower = (client_id, room) if client_id is not None else None
+    job, joined = single_flight.join(dedupe_key(url, options), start, follower)
+    if joined:
+        deduplicated_jobs.inc()
+        logger.info(f"{url} is already downloading as job {job.id}, attaching to it")
+    return job, joined
+
+def announce_job(client_id, job, joined, room):
+    """Tell a client the initial state of a job it just enqueued"""
+    if job.status == 'skipped':
+        notify_client(client_id, {'status': 'Skipped', 'progress': 100.0}, room)
+    elif joined:
+        # Show the shared job's current state until its next progress update
+        record = job_store.get(job.id) or {}
+        status = 'Downloading' if job.status == 'running' else 'Queued'
+        notify_client(client_id, {'status': status, 'progress': record.get('progress', 0.0)}, room)
+    else:
+        report_progress(job.id, {'status': 'Queued'})
+
+def cached_size(url):
+    """Expected size of a single video from its cached metadata, or None"""
+    entries = metadata_cache.get(url, namespace='flat-playlist') if metadata_cache is not None else None
+    if entries and len(entries) == 1:
+        return expected_size(entries[0])
+    return None
+
+def dedupe_key(url, options):
+    """Jobs with the same key would write the same file"""
+    postprocess = options['audio_format'] if options.get('extract_audio') else None
+    # A watch URL with list= downloads the playlist, never just the video it names
+    return (normalize_url(url), playlist_param(url), options['format_code'], postprocess)
+
+def submit_job(job_id, url, options, room):
+    job_events.open(job_id)
+    job_events.publish(job_id, {'status': 'Queued'})
+    if broker is not None:
+        # A worker picks it up; relay_broker_events finishes it when they report back
+        job = remote_jobs[job_id] = DownloadJob(job_id, url, None)
+        broker.submit(job_id, url, options)
+        return job
+    return scheduler.submit(job_id, url, run_download, args=(job_id, url, options, room),
+                            size=options.get('expected_size'))
+
+def run_download(job_id, url, options, room, on_finish=None):
+    return finish_on_crash(job_id, room, on_finish, start_download, job_id, url, options, room, on_finish)
+
+def start_download(job_id, url, options, room, on_finish=None):
+    start_job(job_id)
+    deferred = postprocessor is not None and options.get('extract_audio')
+    if deferred:
+        options = dict(options, defer_postprocess=True)
+    info = reusable_info(job_id, url)
+    if info is not None:
+        options = dict(options, info=info)
+    if isinstance(downloader, AsyncDownloaderBackend):
+        # The transfer runs on the event loop; no thread waits on it
+        return Pending(downloader.download_async(job_id, url, options, room),
+                       lambda success: finish_on_crash(job_id, room, on_finish, complete_download,
+                                                       job_id, success, options, room, on_finish))
+    success = downloader.download(job_id, url, options, room)
+    return complete_download(job_id, success, options, room, on_finish)
+
+def finish_on_crash(job_id, room, on_finish, fn, *args):
+    """Call fn(*args) for a started job; if it raises, fail the job so nothing keeps waiting on it"""
+    try:
+        return fn(*args)
+    except RetryLater:
+        raise
+    except Exception as e:
+        # Timings exist from start_job until finish_job, so a job is only finished once
+        if job_id in job_timings:
+            report_progress(job_id, {'status': 'Error', 'message': str(e)}, room)
+            finish_job(job_id, False, str(e))
+            if on_finish is not None:
+                on_finish(False)
+        raise
+
+def complete_download(job_id, success, options, room, on_finish=None):
+    """Retry, post-process or finish a job whose yt-dlp run has ended"""
+    files = downloader.output_files.pop(job_id, None)
+    error = downloader.failures.pop(job_id, None)
+    if not success:
+        if error and job_id in job_timings:
+            job_timings[job_id]['error'] = error
+        # Transient failures only ever show as 'Retrying', never as an error first
+        retry_if_transient(job_id)
+        report_progress(job_id, {'status': 'Error', 'message': error} if error else {'status': 'Error'}, room)
+    if success and files:
+        if postprocessor is not None:
+            # Frees this download slot; the job finishes when ffmpeg and the move do
+            return start_postprocess(job_id, files, options, room, on_finish)
+        try:
+            finalize_files(files, options)
+        except Exception as e:
+            success, error = False, str(e)
+            report_progress(job_id, {'status': 'Error', 'message': error}, room)
+        else:
+            report_progress(job_id, {'status': 'Completed', 'progress': 100.0}, room)
+    discard_scratch(options)
+    finish_job(job_id, success, error)
+    if on_finish is not None:
+        on_finish(success)
+    return success
+
+def cancel_job(job_id):
+    """Remove a job that has not started (or is backing off) from the scheduler. Returns False if it can't be."""
+    job = scheduler.get(job_id)
+    if job is None or not scheduler.cancel(job_id):
+        return False
+    discard_scratch(job.args[2])
+    report_progress(job_id, {'status': 'Cancelled'}, job.args[3])
+    record_job(job_id, status='cancelled')
+    job_events.close(job_id, {'final': True, 'success': False, 'message': 'Cancelled'})
+    # Identical downloads submitted from now on start afresh instead of joining this one
+    single_flight.release(job_id)
+    return True
+
+def reject_job(job):
+    """Fail a job the disk space check refused for good, before it ever started"""
+    options = job.args[2]
+    room = job.args[3] if job.target is run_download else None
+    report_progress(job.id, {'status': 'Error', 'message': job.error}, room)
+    discard_scratch(options)
+    finish_job(job.id, False, job.error)
+    if job.target is run_worker_job:
+        broker.finish(job.id, False, job.error)
+
+def reusable_info(job_id, url):
+    """Info /api/metadata already extracted for url, for the download to start from; None to extract again"""
+    if metadata_cache is None or not config.get('reuse_extracted_info', True):
+        return None
+    job = scheduler.get(job_id)
+    if job is not None and job.attempts:
+        # A retry extracts afresh, in case what failed was a stale media URL
+        return None
+    entries = metadata_cache.get(url, namespace='flat-playlist')
+    # Playlist listings are flat and carry no formats; a playlist download lists its entries itself
+    if not entries or len(entries) != 1 or not is_single_video(url, entries[0]):
+        return None
+    if info_expired(entries[0], config.get('info_expiry_margin', 300)):
+        info_reuse.inc(outcome='expired')
+        return None
+    info_reuse.inc(outcome='reused')
+    return entries[0]
+
+def finalize_files(files, options):
+    """Convert a job's downloaded files if that was left to us, and move them into the library"""
+    if options.get('defer_postprocess'):
+        bitrate = config.get('audio_bitrate', '192')
+        active_subprocesses.inc(kind='ffmpeg')
+        try:
+            files = [extract_audio(FFMPEG_PATH, path, options['audio_format'], bitrate) for path in files]
+        finally:
+            active_subprocesses.dec(kind='ffmpeg')
+    if options.get('library_dir'):
+        files = [move_into(path, options['library_dir']) for path in files]
+        discard_scratch(options)
+    return files
+
+def discard_scratch(options):
+    if options.get('scratch_dir'):
+        shutil.rmtree(options['scratch_dir'], ignore_errors=True)
+
+def start_postprocess(job_id, files, options, room, on_finish=None):
+    """Queue a downloaded job's conversion and move; the returned future resolves once the job is finished"""
+    result = Future()
+
+    def done(future):
+        error = None
+        try:
+            future.result()
+            success = True
+        except Exception as e:
+            success, error = False, str(e)
+            failures.inc(kind=classify_failure(error))
+            logger.error(f"Post-processing failed for job {job_id}: {error}")
+            discard_scratch(options)
+        try:
+            report_progress(job_id, {'status': 'Completed', 'progress': 100.0} if success
+                            else {'status': 'Error', 'message': error}, room)
+            finish_job(job_id, success, error)
+            if on_finish is not None:
+                on_finish(success)
+        finally:
+            result.set_result(success)
+
+    postprocessor.submit(finalize_files, files, options).add_done_callback(done)
+    return result
+
+def retry_if_transient(job_id):
+    """Raise RetryLater so the scheduler runs a failed job again, if its failure is worth retrying"""
+    timing = job_timings.get(job_id) or {}
+    error = timing.get('error')
+    kind = classify_failure(error)
+    failures.inc(kind=kind)
+    job = scheduler.get(job_id)
+    attempt = job.attempts if job is not None else 0
+    if not retry_policy.should_retry(kind, attempt):
+        return
+    delay = retry_policy.delay(kind, attempt)
+    retries.inc(kind=kind)
+    if timing.get('host'):
+        concurrency_controller.record_result(timing['host'], False, error)
+    job_timings.pop(job_id, None)
+    logger.warning(f"Job {job_id} failed ({kind}: {error}); retry {attempt + 1} in {delay:.0f}s")
+    record_job(job_id, attempts=attempt + 1)
+    report_progress(job_id, {'status': 'Retrying', 'attempt': attempt + 1, 'retry_in': round(delay),
+                             'message': f'{kind} error, retrying in {delay:.0f}s'})
+    raise RetryLater(delay, error or kind)
+
+def start_job(job_id):
+    """Bookkeeping for a job a worker has just picked up"""
+    job = remote_jobs.get(job_id) or scheduler.get(job_id)
+    if job is not None:
+        if job.started_at is None:
+            job.status = 'running'
+            job.started_at = time.time()
+        queue_wait.observe(job.started_at - job.submitted_at)
+    job_timings[job_id] = {'started': time.monotonic(), 'first_byte': None, 'last_byte': None,
+                           'finished_files': 0, 'current': 0, 'host': job.host if job else None}
+    record_job(job_id, status='running')
+
+def record_job(job_id, **fields):
+    """Update a job's stored record; in a worker the web tier does that from the reported events"""
+    if job_store is not None:
+        job_store.update(job_id, **fields)
+
+def finish_job(job_id, success, error=None):
+    timing = job_timings.get(job_id)
+    if error is None and not success and timing is not None:
+        error = timing.get('error')
+    if timing is not None and timing['host']:
+        concurrency_controller.record_result(timing['host'], success, error)
+    if error:
+        record_job(job_id, error=error)
+    record_job(job_id, status='completed' if success else 'failed')
+    finish_transfer(job_id, success)
+    job_events.close(job_id, {'final': True, 'success': success, 'message': error})
+    # Followers that joined after the backend's last update still get the result
+    final = {'status': 'Completed', 'progress': 100.0} if success else {'status': 'Error'}
+    for client_id, follower_room in single_flight.release(job_id):
+        notify_client(client_id, final, follower_room)
+    job = remote_jobs.pop(job_id, None)
+    if job is not None:
+        job.status = 'completed' if success else 'failed'
+        job.error = error
+        job.finished_at = time.time()
+        job.done.set()
+
+def track_transfer(job_id, data):
+    """Feed time-to-first-byte and throughput tracking from a progress update"""
+    timing = job_timings.get(job_id)
+    downloaded = data.get('downloaded_bytes')
+    if timing is None or not downloaded:
+        return
+    now = time.monotonic()
+    if timing['first_byte'] is None:
+        # The first report may include bytes resumed from a .part file
+        timing['first_byte'] = now
+        time_to_first_byte.observe(now - timing['started'])
+    elif timing['host']:
+        concurrency_controller.record_bytes(
+            timing['host'], downloaded if downloaded < timing['current'] else downloaded - timing['current'])
+    if downloaded < timing['current']:
+        # yt-dlp moved on to the next file of the format (e.g. audio after video)
+        timing['finished_files'] += timing['current']
+    timing['current'] = downloaded
+    timing['last_byte'] = now
+
+def finish_transfer(job_id, success):
+    timing = job_timings.pop(job_id, None)
+    jobs_finished.inc(status='completed' if success else 'failed')
+    if not success or timing is None or timing['last_byte'] is None:
+        return
+    postprocess_time.observe(time.monotonic() - timing['last_byte'])
+    elapsed = timing['last_byte'] - timing['first_byte']
+    if elapsed > 0:
+        download_throughput.observe((timing['finished_files'] + timing['current']) / elapsed)
+
+def recover_jobs():
+    """Re-enqueue jobs a previous run left unfinished; yt-dlp resumes their .part files"""
+    jobs = job_store.active()
+    for job in jobs:
+        # The socket.io session that started the job is gone
+        job_store.update(job['id'], status='queued', room=None)
+        submitted, joined = single_flight.join(dedupe_key(job['url'], job['options']),
+                                               lambda job=job: submit_job(job['id'], job['url'], job['options'], None))
+        if joined:
+            job_store.update(job['id'], status='cancelled')
+        else:
+            submitted.attempts = job['attempts']
+    if jobs:
+        logger.info(f"Recovered {len(jobs)} unfinished downloads")
+    return len(jobs)
+
+# --- Worker Mode ---
+def relay_broker_events(cursor):
+    """Apply the progress and results download workers publish after event cursor"""
+    last_prune = time.monotonic()
+    while True:
+        events = broker.events(after=cursor)
+        for seq, job_id, kind, data in events:
+            cursor = seq
+            try:
+                if kind == 'started':
+                    start_job(job_id)
+                elif kind == 'progress':
+                    for update in data['updates']:
+                        update = dict(update)
+                        report_progress(update.pop('id'), update)
+                elif kind == 'finished':
+                    finish_job(job_id, data['success'], data.get('error'))
+            except Exception:
+                logger.exception(f"Failed to apply broker event {seq}")
+        if time.monotonic() - last_prune > 3600:
+            broker.prune(config.get('broker_retention', 86400))
+            last_prune = time.monotonic()
+        if not events:
+            time.sleep(config.get('progress_interval', 0.25))
+
+def run_worker(worker_id):
+    """Download jobs claimed from the broker instead of serving the web UI"""
+    # Coalesced progress frames (keyed by job id, see report_progress) go
+    # back through the broker; the web tier forwards them to its clients
+    progress_emitter.emit = lambda event, data, room: broker.publish(None, 'progress', data)
+    poll_interval = config.get('broker_poll_interval', 1.0)
+    heartbeat_timeout = config.get('broker_heartbeat_timeout', 60)
+    logger.info(f"Worker {worker_id} waiting for jobs")
+    while True:
+        broker.heartbeat(worker_id)
+        requeued = broker.requeue_stale(heartbeat_timeout)
+        if requeued:
+            logger.warning(f"Re-queued {requeued} jobs from unresponsive workers")
+        # Only claim what the local pool can start now, leaving the rest to other workers
+        snapshot = scheduler.snapshot()
+        if snapshot['queued'] == 0 and snapshot['running'] < scheduler.max_workers:
+            claimed = broker.claim(worker_id)
+            if claimed is not None:
+                job_id, url, options = claimed
+                scheduler.submit(job_id, url, run_worker_job, args=(job_id, url, options))
+                continue
+        time.sleep(poll_interval)
+
+def run_worker_job(job_id, url, options):
+    finished = []
+
+    def on_finish(success):
+        finished.append(success)
+        broker.finish(job_id, success)
+
+    try:
+        # Paths in the job were resolved on the web host; write where this machine keeps downloads
+        options = {key: value for key, value in options.items() if key not in PATH_OPTIONS}
+        options.update(download_paths(job_id))
+        return run_download(job_id, url, options, None, on_finish=on_finish)
+    except RetryLater:
+        raise
+    except Exception as e:
+        # Otherwise the broker shows the job running until its heartbeat goes stale
+        if not finished:
+            broker.finish(job_id, False, str(e))
+        raise
+
+# --- Playlist Jobs ---
+def start_playlist(url, quality, playlist_id=None, room=None, priority='normal'):
+    """Download every entry of a playlist or channel, starting while it is still being listed"""
+    playlist_id = playlist_id or uuid.uuid4().hex
+    state = {
+        'id': playlist_id,
+        'url': url,
+        'status': 'listing',
+        'listed': 0,
+        'queued': 0,
+        'joined': 0,
+        'skipped': 0,
+        'error': None,
+        'started_at': time.time()
+    }
+    playlist_jobs[playlist_id] = state
+    # Forget the oldest fully listed playlists
+    finished = [key for key, job in playlist_jobs.items() if job['status'] != 'listing']
+    for key in finished[:max(0, len(playlist_jobs) - 100)]:
+        del playlist_jobs[key]
+    threading.Thread(target=expand_playlist, args=(state, quality, room, priority), daemon=True).start()
+    return state
+
+def expand_playlist(state, quality, room, priority):
+    """Queue each playlist entry the moment yt-dlp lists it, and send the cards to the client in chunks"""
+    chunk_size = config.get('metadata_chunk_size', 50)
+    flush_interval = config.get('progress_interval', 0.25)
+    chunk = []
+    last_flush = time.monotonic()
+    entries = downloader.stream_metadata(state['url'])
+    try:
+        for entry in entries:
+            video = extract_video_metadata(entry)
+            state['listed'] += 1
+            if not video['url']:
+                continue
+            video['job_id'] = f"{state['id']}-{state['listed']}"
+            job, joined = enqueue_download(video['url'], quality, client_id=video['job_id'],
+                                           room=room, priority=priority, size=video['filesize'])
+            if job.status == 'skipped':
+                state['skipped'] += 1
+                video['status'] = 'Skipped'
+            else:
+                state['joined' if joined else 'queued'] += 1
+                video['status'] = 'Queued'
+            # Started over REST there is no socket to send cards to; the caller polls /api/playlists/<id>
+            if room is not None:
+                chunk.append(video)
+                if len(chunk) >= chunk_size or time.monotonic() - last_flush >= flush_interval:
+                    emit_event('playlist_entries', {'playlist_id': state['id'], 'videos': chunk}, room=room)
+                    chunk = []
+                    last_flush = time.monotonic()
+            announce_job(video['job_id'], job, joined, room)
+        state['status'] = 'listed'
+    except Exception as e:
+        logger.error(f"Error listing playlist {state['url']}: {str(e)}")
+        state['status'] = 'failed'
+        state['error'] = str(e)
+    finally:
+        entries.close()
+        if room is not None:
+            emit_event('playlist_entries', {'playlist_id': state['id'], 'videos': chunk, 'done': True,
+                                            'error': state['error']}, room=room)
+    logger.info(f"Playlist {state['url']}: {state['listed']} entries listed, {state['queued']} queued, "
+                f"{state['joined']} already downloading, {state['skipped']} skipped")
+
+@app.route('/api/playlists', methods=['POST'])
+def create_playlist_job():
+    """Queue every video of a playlist or channel as it is listed"""
+    data = request.get_json() or {}
+    url = data.get('url')
+    if not url:
+        return jsonify({'error': 'URL is required'}), 400
+    state = start_playlist(url, data.get('quality', 'best_mp4'), priority=data.get('priority', 'normal'))
+    return jsonify(state), 202
+
+@app.route('/api/playlists/<playlist_id>')
+def get_playlist_job(playlist_id):
+    state = playlist_jobs.get(playlist_id)
+    if state is None:
+        return jsonify({'error': 'Playlist job not found'}), 404
+    return jsonify(state)
+
+@app.route('/api/concurrency')
+def get_concurrency():
+    """Per-host limits chosen by the adaptive concurrency controller, and why"""
+    return jsonify(dict(concurrency_controller.snapshot(), enabled=config.get('adaptive_concurrency', True)))
+
+@app.route('/api/bandwidth', methods=['GET', 'POST'])
+def bandwidth_settings():
+    """Get or change the total download rate and how it is split across jobs"""
+    if request.method == 'POST':
+        data = request.get_json() or {}
+        try:
+            bandwidth.set_total_rate(data.get('rate_limit'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        config.set('rate_limit', data.get('rate_limit'))
+    return jsonify(bandwidth.snapshot())
+
+@app.route('/api/cache/stats')
+def get_cache_stats():
+    """Get metadata cache hit/miss counters and lookup latency"""
+    return jsonify(metadata_cache.stats())
+
+@app.route('/api/cache/invalidate', methods=['POST'])
+def invalidate_cache():
+    """Drop cached metadata for the given URL(s), or everything with {"all": true}"""
+    data = request.get_json() or {}
+    if data.get('all'):
+        metadata_cache.clear()
+        return jsonify({'message': 'Metadata cache cleared', 'stats': metadata_cache.stats()})
+
+    urls = data.get('urls') or ([data['url']] if data.get('url') else [])
+    if not urls:
+        return jsonify({'error': 'URL or URLs are required'}), 400
+    removed = sum(metadata_cache.invalidate(url) for url in urls)
+    return jsonify({'message': f'Removed {removed} cached entries', 'removed': removed})
+
+@app.route('/api/thumb/<thumb_id>')
+def get_thumbnail(thumb_id):
+    """Serve a cached, pre-resized thumbnail (?size=small|medium)"""
+    size = request.args.get('size', 'medium')
+    if size not in THUMBNAIL_SIZES:
+        return jsonify({'error': f"size must be one of {', '.join(THUMBNAIL_SIZES)}"}), 400
+    try:
+        path, mimetype = thumbnail_cache.get(thumb_id, size)
+    except KeyError:
+        return jsonify({'error': 'Unknown thumbnail'}), 404
+    except Exception as e:
+        logger.warning(f"Failed to fetch thumbnail {thumb_id}: {e}")
+        return jsonify({'error': 'Thumbnail unavailable'}), 502
+    # Variants never change once written, so browsers may keep them and revalidate by ETag
+    return send_file(path, mimetype=mimetype, conditional=True, etag=True,
+                     max_age=config.get('thumbnail_max_age', 604800))
+
 @app.route('/api/metadata', methods=['POST'])
 def get_metadata_route():
     data = request.get_json()
     urls = data.get('urls', [])
+    refresh = bool(data.get('refresh'))
     
     if not urls:
         url = data.get('url')
@@ -191,31 +962,17 @@ def get_metadata_route():
         else:
             return jsonify({'error': 'URL or URLs are required'}), 400
     
+    urls = [url.strip() for url in urls if url and url.strip()]
+    
+    if data.get('stream') or 'application/x-ndjson' in request.headers.get('Accept', ''):
+        return Response(stream_metadata(urls, refresh), mimetype='application/x-ndjson')
+    
     try:
         metadata_list = []
         
-        for url in urls:
-            url = url.strip()
-            if not url:
-                continue
-                
-            try:
-                metadata = downloader.get_metadata(url)
-                for item in metadata:
-                    metadata_list.append(extract_video_metadata(item))
-                        
-            except Exception as e:
-                logger.error(f"Error extracting metadata for {url}: {str(e)}")
-                # Add error entry for failed URL
-                metadata_list.append({
-                    'title': f'Error: {url}',
-                    'duration': 0,
-                    'thumbnail': '',
-                    'url': url,
-                    'error': str(e),
-                    'view_count': 0,
-                    'description': f'Failed to extract metadata: {str(e)}'
-                })
+        # Resolve URLs concurrently but keep the response in request order
+        for videos in metadata_executor.map(lambda url: resolve_metadata(url, refresh), urls):
+            metadata_list.extend(videos)
                 
         return jsonify(metadata_list)
                 
@@ -223,12 +980,87 @@ def get_metadata_route():
         logger.error(f"General error in metadata extraction: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def stream_metadata(urls, refresh=False):
+    """Yield NDJSON lines of card metadata, chunked per URL, while playlists are still being listed"""
+    chunk_size = config.get('metadata_chunk_size', 50)
+    lines = queue.Queue(maxsize=config.get('metadata_stream_buffer', 64))
+    stop = threading.Event()
+
+    def publish(message):
+        # Blocks while the client is slow so buffered chunks stay bounded
+        while not stop.is_set():
+            try:
+                lines.put(message, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def resolve(index, url):
+        chunk = []
+        entries = downloader.stream_metadata(url, refresh=refresh)
+        try:
+            for entry in entries:
+                chunk.append(extract_video_metadata(entry))
+                if len(chunk) >= chunk_size:
+                    if not publish({'index': index, 'url': url, 'videos': chunk}):
+                        return
+                    chunk = []
+        except Exception as e:
+            logger.error(f"Error extracting metadata for {url}: {str(e)}")
+            chunk.append(metadata_error_entry(url, e))
+        finally:
+            entries.close()
+            publish({'index': index, 'url': url, 'videos': chunk, 'done': True})
+
+    futures = [metadata_executor.submit(resolve, index, url) for index, url in enumerate(urls)]
+    remaining = len(urls)
+    try:
+        while remaining:
+            message = lines.get()
+            if message.get('done'):
+                remaining -= 1
+            yield json.dumps(message) + '\n'
+    finally:
+        # Client went away: don't keep resolving URLs nobody will read
+        stop.set()
+        for future in futures:
+            future.cancel()
+
+def resolve_metadata(url, refresh=False):
+    """Return the card metadata for every video behind url, or a single error entry"""
+    try:
+        metadata = downloader.get_metadata(url, refresh=refresh)
+        return [extract_video_metadata(item) for item in metadata]
+    except Exception as e:
+        logger.error(f"Error extracting metadata for {url}: {str(e)}")
+        return [metadata_error_entry(url, e)]
+
+def metadata_error_entry(url, error):
+    """Card shown in place of a URL whose metadata could not be extracted"""
+    return {
+        'title': f'Error: {url}',
+        'duration': 0,
+        'thumbnail': '',
+        'url': url,
+        'error': str(error),
+        'view_count': 0,
+        'description': f'Failed to extract metadata: {str(error)}'
+    }
+
 def extract_video_metadata(info):
     """Extract comprehensive metadata from video info"""
+    thumbnail = info.get('thumbnail') or (info.get('thumbnails') or [{}])[-1].get('url', '')
+    thumb_id = None
+    if thumbnail:
+        thumb_id = thumbnail_id(info.get('id'), thumbnail)
+        thumbnail_cache.register(thumb_id, thumbnail)
     return {
+        'id': info.get('id'),
         'title': info.get('title', 'Unknown'),
         'duration': info.get('duration', 0),
-        'thumbnail': info.get('thumbnail', ''),
+        'thumbnail': thumbnail,
+        'thumbnail_proxy': f'/api/thumb/{thumb_id}' if thumb_id else None,
         'webpage_url': info.get('webpage_url') or info.get('url', ''),
         'url': info.get('webpage_url') or info.get('url', ''),
         'view_count': info.get('view_count', 0),
@@ -237,7 +1069,8 @@ def extract_video_metadata(info):
         'upload_date': info.get('upload_date', ''),
         'filesize': info.get('filesize') or info.get('filesize_approx'),
         'format_id': info.get('format_id', ''),
-        'ext': info.get('ext', 'mp4')
+        'ext': info.get('ext', 'mp4'),
+        'archived': download_archive is not None and download_archive.has_info(info)
     }
 
 # --- WebSocket Event Handlers ---
@@ -247,59 +1080,68 @@ def handle_connect():
 
 @app.route('/download')
 def download_video():
-    url = request.args.get('url')
-    quality = request.args.get('quality', 'best_mp4')
-    
-    if not url:
-        return jsonify({'error': 'URL is required'}), 400
+    """Queue a download and stream its progress as server-sent events.
+
+    The download runs in the scheduler; the stream only follows the job's
+    event log. Event ids are '<job id>:<seq>', so a client reconnecting with
+    Last-Event-ID (or ?job=<id>) picks the same job up where it left off.
+    """
+    job_id, _, seq = (request.headers.get('Last-Event-ID') or '').rpartition(':')
+    job_id = job_id or request.args.get('job')
+    after = int(seq) if job_id and seq.isdigit() else 0
     
-    def generate_progress():
-        download_id = f"download_{int(time.time() * 1000)}"
-        active_downloads[download_id] = {'url': url, 'quality': quality, 'status': 'starting'}
-        download_stats['active'] += 1
-        
-        try:
-            # Configure yt-dlp options based on quality
-            ydl_opts = get_download_options(quality, download_id)
-            
-            yield f"data: {json.dumps({'status': 'starting', 'message': 'Initializing download...'})}\n\n"
-            
-            try:
-                # Use the existing downloader backend
-                downloader.download(download_id, url, ydl_opts, None)
-                
-                # Download completed successfully
-                active_downloads[download_id]['status'] = 'completed'
-                download_stats['active'] -= 1
-                download_stats['completed'] += 1
-                
-                yield f"data: {json.dumps({'status': 'finished', 'message': 'Download completed successfully!'})}\n\n"
-                
-            except Exception as download_error:
-                logger.error(f"Download error for {url}: {str(download_error)}")
-                
-                active_downloads[download_id]['status'] = 'failed'
-                download_stats['active'] -= 1
-                download_stats['failed'] += 1
-                
-                yield f"data: {json.dumps({'status': 'error', 'message': str(download_error)})}\n\n"
-                
-        except Exception as e:
-            logger.error(f"General download error: {str(e)}")
-            
-            if download_id in active_downloads:
-                active_downloads[download_id]['status'] = 'failed'
-                download_stats['active'] -= 1
-                download_stats['failed'] += 1
-            
-            yield f"data: {json.dumps({'status': 'error', 'message': str(e)})}\n\n"
-        
-        finally:
-            # Clean up
-            if download_id in active_downloads:
-                del active_downloads[download_id]
+    if not job_id:
+        url = request.args.get('url')
+        if not url:
+            return jsonify({'error': 'URL is required'}), 400
+        job, _ = enqueue_download(url, request.args.get('quality', 'best_mp4'),
+                                  priority=request.args.get('priority', 'normal'),
+                                  size=request.args.get('filesize', type=int))
+        if job.status == 'skipped':
+            message = {'status': 'finished', 'message': 'Already downloaded'}
+            return Response(f"data: {json.dumps(message)}\n\n", mimetype='text/event-stream')
+        job_id = job.id
     
-    return Response(generate_progress(), mimetype='text/event-stream')
+    return Response(stream_job_events(job_id, after), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def stream_job_events(job_id, after=0):
+    """SSE frames for a job's events after sequence number after, until the job finishes"""
+    poll_interval = config.get('progress_interval', 0.25)
+    if after:
+        yield "retry: 3000\n\n"
+    else:
+        yield f"retry: 3000\ndata: {json.dumps({'status': 'starting', 'message': 'Initializing download...'})}\n\n"
+    last_write = time.monotonic()
+    while True:
+        events, finished = job_events.read(job_id, after)
+        if events is None:
+            yield f"data: {json.dumps({'status': 'error', 'message': 'Unknown or expired download job'})}\n\n"
+            return
+        for seq, event in events:
+            after = seq
+            yield f"id: {job_id}:{seq}\ndata: {json.dumps(sse_message(event))}\n\n"
+        if finished:
+            return
+        if events:
+            last_write = time.monotonic()
+        elif time.monotonic() - last_write > 15:
+            # Keeps proxies from closing an idle stream while the job is queued
+            yield ": keepalive\n\n"
+            last_write = time.monotonic()
+        # Cooperative under eventlet, so an open stream never holds up the server
+        socketio.sleep(poll_interval)
+
+def sse_message(event):
+    """Translate a job event into the /download stream's message format"""
+    if event.get('final'):
+        if event['success']:
+            return {'status': 'finished', 'message': 'Download completed successfully!'}
+        return {'status': 'error', 'message': event.get('message') or 'Download failed'}
+    if event.get('status') == 'Downloading' and 'progress' in event:
+        return {'status': 'downloading', 'percent': event['progress'], 'speed': event.get('speed'),
+                'eta': event.get('eta')}
+    return {'status': 'state', 'state': event.get('status'), 'message': event.get('message')}
 
 def get_download_options(quality, download_id):
     """Get yt-dlp options based on quality selection"""
@@ -312,53 +1154,89 @@ def get_download_options(quality, download_id):
         "mp3": "bestaudio/best"
     }
     
-    output_dir = os.path.join(os.path.expanduser('~'), 'Downloads', 'WebApp_Downloader')
-    os.makedirs(output_dir, exist_ok=True)
-    
     options = {
         'format_code': quality_map.get(quality, "best"),
-        'output_template': os.path.join(output_dir, '%(title)s - %(id)s.%(ext)s'),
         'extract_audio': quality == "mp3",
         'audio_format': 'mp3'
     }
+    options.update(download_paths(download_id))
     
     return options
 
+# Options naming files on the machine that runs the download
+PATH_OPTIONS = ('output_template', 'download_archive', 'scratch_dir', 'library_dir')
+
+def download_paths(download_id):
+    """Where a job writes on this machine (the PATH_OPTIONS entries of its options)"""
+    os.makedirs(download_dir, exist_ok=True)
+    # Each job gets its own scratch directory, so finished files are easy to pick out
+    output_dir = os.path.join(scratch_dir, download_id) if scratch_dir else download_dir
+    paths = {
+        'output_template': os.path.join(output_dir, '%(title)s - %(id)s.%(ext)s'),
+        'download_archive': download_archive.path if download_archive is not None else None
+    }
+    if scratch_dir:
+        paths['scratch_dir'] = output_dir
+        paths['library_dir'] = download_dir
+    return paths
+
 @socketio.on('start_download')
 def handle_start_download(data):
     job_id = data.get('id')
     url = data.get('url')
     quality = data.get('quality')
+    if not url:
+        progress_emitter.update(job_id, {'status': 'Error', 'message': 'URL is required'}, request.sid)
+        return
     
-    quality_map = {
-        "best_mp4": "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best",
-        "720p_mp4": "bestvideo[height<=720][ext=mp4]+bestaudio[ext=m4a]/best[height<=720][ext=mp4]/best",
-        "480p_mp4": "bestvideo[height<=480][ext=mp4]+bestaudio[ext=m4a]/best[height<=480][ext=mp4]/best",
-        "360p_mp4": "bestvideo[height<=360][ext=mp4]+bestaudio[ext=m4a]/best[height<=360][ext=mp4]/best",
-        "mp3": "bestaudio/best"
-    }
-    
-    output_dir = os.path.join(os.path.expanduser('~'), 'Downloads', 'WebApp_Downloader')
-    os.makedirs(output_dir, exist_ok=True)
-    
-    options = {
-        'format_code': quality_map.get(quality, "best"),
-        'output_template': os.path.join(output_dir, '%(title)s - %(id)s.%(ext)s'),
-        'extract_audio': quality == "mp3",
-        'audio_format': 'mp3'
-    }
-    
-    # Run each download in its own thread to not block the server
-    thread = threading.Thread(target=downloader.download, args=(job_id, url, options, request.sid))
-    thread.daemon = True
-    thread.start()
+    # Queue the job; the scheduler's worker pool bounds how many run at once
+    job, joined = enqueue_download(url, quality, client_id=job_id, room=request.sid,
+                                   priority=data.get('priority', 'normal'), size=data.get('filesize'))
+    announce_job(job_id, job, joined, request.sid)
+
+@socketio.on('start_playlist')
+def handle_start_playlist(data):
+    url = data.get('url')
+    if not url:
+        emit_event('playlist_entries', {'playlist_id': data.get('id'), 'videos': [], 'done': True,
+                                        'error': 'URL is required'}, room=request.sid)
+        return
+    start_playlist(url, data.get('quality'), playlist_id=data.get('id'), room=request.sid,
+                   priority=data.get('priority', 'normal'))
 
 @socketio.on('disconnect')
 def handle_disconnect():
     print(f'Client disconnected: {request.sid}')
 
 # --- Main Entry Point ---
+def main():
+    parser = argparse.ArgumentParser(description="YouTube Downloader Web App")
+    parser.add_argument('--worker', action='store_true',
+                        help="run downloads from the job broker instead of serving the web UI")
+    parser.add_argument('--worker-id', default=f"{socket.gethostname()}-{os.getpid()}")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    create_app(worker_mode=args.worker)
+    if args.worker and broker is None:
+        parser.error("--worker needs a job broker; set job_broker in advanced_config.json")
+
+    if isinstance(downloader, YtdlpEngineBackend):
+        print("Warming up yt-dlp engine workers...")
+        downloader.engine.warm_up()
+    if config.get('adaptive_concurrency', True):
+        concurrency_controller.start()
+    if args.worker:
+        print(f"Starting download worker {args.worker_id}...")
+        run_worker(args.worker_id)
+    else:
+        print("Starting YouTube Downloader Web App...")
+        if broker is not None:
+            # Cursor taken before recovery so results replayed for re-submitted jobs aren't missed
+            threading.Thread(target=relay_broker_events, args=(broker.last_event_id(),), daemon=True).start()
+        recover_jobs()
+        print("Open http://127.0.0.1:5000 in your browser.")
+        socketio.run(app, host='127.0.0.1', port=5000)
+
 if __name__ == '__main__':
-    print("Starting YouTube Downloader Web App...")
-    print("Open http://127.0.0.1:5000 in your browser.")
-    socketio.run(app, host='127.0.0.1', port=5000)
\ No newline at end of file
+    main()
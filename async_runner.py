@@ -0,0 +1,49 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class EventLoopThread:
+    """One asyncio event loop on a daemon thread, for driving many child processes at once.
+
+    Coroutines are handed over from any thread with submit(), which returns
+    a concurrent.futures.Future. On Linux, child exits are watched through
+    pidfds on the loop itself rather than with a waiting thread per process.
+    """
+
+    def __init__(self, name='asyncio-runner'):
+        self.loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self._install_child_watcher()
+        self._ready.set()
+        self.loop.run_forever()
+
+    def _install_child_watcher(self):
+        # Python 3.12+ already uses pidfds where available; before that the
+        # default watcher spends a thread per child
+        if sys.platform == 'win32' or sys.version_info >= (3, 12) or not hasattr(asyncio, 'PidfdChildWatcher'):
+            return
+        try:
+            # Needs Linux 5.3+
+            os.close(os.pidfd_open(os.getpid()))
+            watcher = asyncio.PidfdChildWatcher()
+            watcher.attach_loop(self.loop)
+            asyncio.set_child_watcher(watcher)
+        except (OSError, AttributeError) as e:
+            logger.info(f"pidfd child watcher unavailable, using the default: {e}")
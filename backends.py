@@ -0,0 +1,379 @@
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+
+from bandwidth import BandwidthGovernor
+from metrics import Gauge, Histogram
+from process_registry import ProcessRegistry, SUPPORTS_SIGNALS
+from progress_parser import PROGRESS_TEMPLATE, OUTPUT_FILE_PREFIX, parse_progress_line
+from ytdlp_engine import build_ydl_options
+
+logger = logging.getLogger(__name__)
+
+
+def needs_finalizing(options):
+    """Whether a job's finished files still need converting or moving after yt-dlp exits"""
+    return bool(options.get('defer_postprocess') or options.get('library_dir'))
+
+
+class DownloaderBackend:
+    """Runs the yt-dlp binary for every metadata listing and download.
+
+    Progress of a download goes to report_progress(job_id, data, sid). The
+    web app passes in its process registry (for pause/resume), bandwidth
+    governor and metrics; without them every download runs unthrottled and
+    is only measured by metrics nobody exports.
+    """
+    def __init__(self, ytdlp_path, metadata_cache=None, idle_timeout=30, cache_max_listing=2000,
+                 rebalance_threshold=0.25, report_progress=None, process_registry=None, bandwidth=None,
+                 metadata_latency=None, active_subprocesses=None):
+        self.ytdlp_path = ytdlp_path
+        self.metadata_cache = metadata_cache
+        self.idle_timeout = idle_timeout
+        self.cache_max_listing = cache_max_listing
+        self.rebalance_threshold = rebalance_threshold
+        self.report_progress = report_progress or (lambda job_id, data, sid: None)
+        self.process_registry = process_registry or ProcessRegistry()
+        self.bandwidth = bandwidth or BandwidthGovernor()
+        self.metadata_latency = metadata_latency or Histogram(
+            'ytdl_metadata_seconds', 'Time to list the metadata behind a URL', ['cache'])
+        self.active_subprocesses = active_subprocesses or Gauge(
+            'ytdl_active_subprocesses', 'yt-dlp processes (or engine workers) currently busy', ['kind'])
+        self._launch_rates = {}  # job_id -> --limit-rate the running process got
+        self.output_files = {}   # job_id -> files left for the post-processing stage
+        self.failures = {}       # job_id -> error of a failed run, not yet reported
+
+    def get_metadata(self, url, refresh=False):
+        return list(self.stream_metadata(url, refresh=refresh))
+
+    def stream_metadata(self, url, refresh=False):
+        """Yield metadata entries for url as they are listed, reading through the cache"""
+        cache = self.metadata_cache
+        start = time.perf_counter()
+        if cache is None:
+            yield from self.iter_metadata(url)
+            self.metadata_latency.observe(time.perf_counter() - start, cache='disabled')
+            return
+
+        cached = None if refresh else cache.get(url, namespace='flat-playlist')
+        if cached is not None:
+            cache.record_lookup(True, start)
+            yield from cached
+            self.metadata_latency.observe(time.perf_counter() - start, cache='hit')
+            return
+
+        # Huge channel listings are streamed but not cached, to keep memory bounded
+        collected = []
+        for entry in self.iter_metadata(url):
+            if collected is not None:
+                collected.append(entry)
+                if len(collected) > self.cache_max_listing:
+                    collected = None
+            yield entry
+        if collected is not None:
+            cache.put(url, collected, namespace='flat-playlist')
+        cache.record_lookup(False, start)
+        self.metadata_latency.observe(time.perf_counter() - start, cache='miss')
+
+    def iter_metadata(self, url):
+        """Run yt-dlp --flat-playlist and yield each JSON line as soon as it is printed"""
+        command = [
+            self.ytdlp_path,
+            '--dump-json',
+            '--flat-playlist',
+            '--no-warnings',
+            url
+        ]
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding='utf-8', bufsize=1, startupinfo=self._get_startup_info())
+        self.active_subprocesses.inc(kind='metadata')
+        stderr_tail = deque(maxlen=20)
+        # Only time spent waiting on yt-dlp counts towards the idle timeout, not
+        # time the consumer spends processing (or a slow client spends reading)
+        state = {'waiting_since': time.monotonic(), 'timed_out': False}
+        threading.Thread(target=lambda: stderr_tail.extend(process.stderr), daemon=True).start()
+        threading.Thread(target=self._watch_idle, args=(process, state), daemon=True).start()
+
+        try:
+            while True:
+                state['waiting_since'] = time.monotonic()
+                line = process.stdout.readline()
+                state['waiting_since'] = None
+                if not line:
+                    break
+                if line.strip():
+                    yield json.loads(line)
+
+            process.wait()
+            if state['timed_out']:
+                raise RuntimeError(f"yt-dlp error: no output for {self.idle_timeout} seconds")
+            if process.returncode != 0:
+                raise RuntimeError(f"yt-dlp error: {''.join(stderr_tail).strip()}")
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            self.active_subprocesses.dec(kind='metadata')
+
+    def _watch_idle(self, process, state):
+        while process.poll() is None:
+            time.sleep(1)
+            waiting_since = state['waiting_since']
+            if waiting_since is not None and time.monotonic() - waiting_since > self.idle_timeout:
+                state['timed_out'] = True
+                process.kill()
+                return
+
+    def download(self, job_id, url, options, sid):
+        registered = self.process_registry.register(job_id, sid)
+        self.bandwidth.add(job_id, options.get('priority'))
+        errors = deque(maxlen=5)
+        info_path = None
+        try:
+            self.report_progress(job_id, {'status': 'Downloading'}, sid)
+            info_path = self._write_info(job_id, options)
+
+            while True:
+                rate = self._launch_rates[job_id] = self.bandwidth.rate(job_id)
+                # A session of its own lets a pause freeze ffmpeg children too
+                process = subprocess.Popen(self._build_command(url, options, rate, info_path), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding='utf-8', bufsize=1, startupinfo=self._get_startup_info(), start_new_session=SUPPORTS_SIGNALS)
+                self.process_registry.attach(job_id, process, group=SUPPORTS_SIGNALS)
+                self.active_subprocesses.inc(kind='download')
+                try:
+                    for line in iter(process.stdout.readline, ''):
+                        self._handle_output(job_id, line, registered, errors, sid)
+                    
+                    process.wait()
+                finally:
+                    registered.downloading = False
+                    self.active_subprocesses.dec(kind='download')
+                # Stopped for a pause or a new bandwidth share: relaunch (once
+                # resumed), yt-dlp continues the .part file
+                if not self.process_registry.should_restart(job_id):
+                    break
+
+            return self._report_exit(job_id, process.returncode, errors, options, sid)
+        except Exception as e:
+            return self._fail(job_id, str(e))
+        finally:
+            self._launch_rates.pop(job_id, None)
+            self.bandwidth.remove(job_id)
+            self.process_registry.unregister(job_id)
+            self._remove_info(info_path)
+
+    def apply_rate(self, job_id, rate):
+        """Relaunch a running download whose bandwidth share moved by more than the threshold"""
+        launched = self._launch_rates.get(job_id)
+        if launched == rate:
+            return
+        if launched and rate and abs(rate - launched) / launched < self.rebalance_threshold:
+            return
+        if self.process_registry.restart(job_id):
+            logger.info(f"Restarting job {job_id} with a rate limit of {rate or 'unlimited'} B/s")
+
+    def _write_info(self, job_id, options):
+        """Save a job's already-extracted info for --load-info-json; returns the path, or None"""
+        if options.get('info') is None:
+            return None
+        directory = options.get('scratch_dir') or tempfile.gettempdir()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{job_id}.info.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(options['info'], f)
+        return path
+
+    def _remove_info(self, path):
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    def _build_command(self, url, options, rate=None, info_path=None):
+        command = [
+            self.ytdlp_path,
+            '--progress',
+            '--newline',
+            '--progress-template', PROGRESS_TEMPLATE,
+            '--no-warnings',
+            '--encoding', 'utf-8',
+            # Retries pick up where the .part file left off
+            '--continue',
+            '--output', options['output_template'],
+            '--format', options['format_code'],
+        ]
+        if needs_finalizing(options):
+            # Report finished files; the post-processing stage converts and/or moves them
+            command.extend(['--no-simulate', '--print', f'after_move:{OUTPUT_FILE_PREFIX}%(filepath)s'])
+        if options.get('extract_audio') and not options.get('defer_postprocess'):
+            command.extend(['--extract-audio', '--audio-format', options['audio_format']])
+        if options.get('download_archive'):
+            command.extend(['--download-archive', options['download_archive']])
+        if rate:
+            command.extend(['--limit-rate', str(int(rate))])
+        if info_path:
+            # Formats are selected from the saved info; nothing is extracted again
+            command.extend(['--load-info-json', info_path])
+        else:
+            command.append(url)
+        return command
+
+    def _handle_output(self, job_id, line, registered, errors, sid):
+        """Act on one line of a download's output"""
+        progress_data = parse_progress_line(line)
+        if progress_data:
+            registered.downloading = progress_data['status'] == 'Downloading'
+            self.report_progress(job_id, progress_data, sid)
+        elif line.startswith(OUTPUT_FILE_PREFIX):
+            self.output_files.setdefault(job_id, []).append(line[len(OUTPUT_FILE_PREFIX):].rstrip('\n'))
+        elif line.startswith('ERROR:'):
+            errors.append(line.strip())
+
+    def _report_exit(self, job_id, returncode, errors, options, sid):
+        if returncode == 0:
+            self.report_progress(job_id, self._finished_status(job_id, options), sid)
+            return True
+        return self._fail(job_id, errors[-1] if errors else None)
+
+    def _fail(self, job_id, message=None):
+        # Not reported here: complete_download first decides whether the job is retried
+        self.failures[job_id] = message
+        return False
+
+    def _finished_status(self, job_id, options):
+        # Files left for the post-processing stage: the job isn't done yet
+        if self.output_files.get(job_id):
+            return {'status': 'Processing', 'progress': 100.0}
+        return {'status': 'Completed', 'progress': 100.0}
+
+    def _get_startup_info(self):
+        if sys.platform == "win32":
+            startupinfo = subprocess.STARTUPINFO()
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+            startupinfo.wShowWindow = subprocess.SW_HIDE
+            return startupinfo
+        return None
+
+
+class YtdlpEngineBackend(DownloaderBackend):
+    """Same interface as DownloaderBackend, but drives yt_dlp.YoutubeDL in pre-warmed worker processes"""
+    def __init__(self, engine, **kwargs):
+        super().__init__(None, **kwargs)
+        self.engine = engine
+        self.engine.on_progress = self._on_progress
+        self._rooms = {}
+
+    def iter_metadata(self, url):
+        return iter(self.engine.extract(url))
+
+    def download(self, job_id, url, options, sid):
+        self._rooms[job_id] = sid
+        # Workers run many jobs, so a pause holds this job's progress hook rather than stopping the process
+        self.process_registry.register(job_id, sid, set_paused=lambda paused: self.engine.set_paused(job_id, paused))
+        rate = self.bandwidth.add(job_id, options.get('priority'))
+        self.active_subprocesses.inc(kind='engine')
+        try:
+            self.report_progress(job_id, {'status': 'Downloading'}, sid)
+            files = self.engine.download(job_id, url, build_ydl_options(options), rate, options.get('info'))
+            if files is not None:
+                if files and needs_finalizing(options):
+                    self.output_files[job_id] = files
+                self.report_progress(job_id, self._finished_status(job_id, options), sid)
+                return True
+            return self._fail(job_id)
+        except Exception as e:
+            return self._fail(job_id, str(e))
+        finally:
+            self._rooms.pop(job_id, None)
+            self.bandwidth.remove(job_id)
+            self.process_registry.unregister(job_id)
+            self.active_subprocesses.dec(kind='engine')
+
+    def apply_rate(self, job_id, rate):
+        # Worker processes throttle with a token bucket, so no restart is needed
+        self.engine.set_rate(job_id, rate)
+
+    def _on_progress(self, job_id, progress_data):
+        # Late messages for a job that already finished are dropped
+        if job_id not in self._rooms:
+            return
+        self.report_progress(job_id, progress_data, self._rooms[job_id])
+
+
+class AsyncDownloaderBackend(DownloaderBackend):
+    """Same yt-dlp commands as DownloaderBackend, with every download process driven from one event loop.
+
+    download_async() returns a future instead of tying up a thread for the
+    whole transfer; pipes, exits and idle timeouts are all handled by the
+    loop, so thousands of running jobs cost a handful of threads.
+    """
+    def __init__(self, ytdlp_path, runner, download_idle_timeout=600, **kwargs):
+        super().__init__(ytdlp_path, **kwargs)
+        self.runner = runner
+        self.download_idle_timeout = download_idle_timeout
+
+    def download(self, job_id, url, options, sid):
+        return self.download_async(job_id, url, options, sid).result()
+
+    def download_async(self, job_id, url, options, sid):
+        return self.runner.submit(self._download(job_id, url, options, sid))
+
+    async def _download(self, job_id, url, options, sid):
+        registered = self.process_registry.register(job_id, sid)
+        self.bandwidth.add(job_id, options.get('priority'))
+        errors = deque(maxlen=5)
+        info_path = None
+        try:
+            self.report_progress(job_id, {'status': 'Downloading'}, sid)
+            info_path = self._write_info(job_id, options)
+
+            while True:
+                rate = self._launch_rates[job_id] = self.bandwidth.rate(job_id)
+                process = await asyncio.create_subprocess_exec(
+                    *self._build_command(url, options, rate, info_path), stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.STDOUT, limit=2 ** 20, startupinfo=self._get_startup_info(),
+                    start_new_session=SUPPORTS_SIGNALS)
+                self.process_registry.attach(job_id, process, group=SUPPORTS_SIGNALS)
+                self.active_subprocesses.inc(kind='download')
+                try:
+                    await self._read_output(job_id, process, registered, errors, sid)
+                    await process.wait()
+                finally:
+                    registered.downloading = False
+                    self.active_subprocesses.dec(kind='download')
+                    if process.returncode is None:
+                        process.kill()
+                        await process.wait()
+                # Same relaunch as DownloaderBackend, waiting without blocking the loop
+                if not registered.stopped:
+                    break
+                while not registered.resumed.is_set():
+                    await asyncio.sleep(0.5)
+                registered.stopped = False
+
+            return self._report_exit(job_id, process.returncode, errors, options, sid)
+        except Exception as e:
+            return self._fail(job_id, str(e))
+        finally:
+            self._launch_rates.pop(job_id, None)
+            self.bandwidth.remove(job_id)
+            self.process_registry.unregister(job_id)
+            self._remove_info(info_path)
+
+    async def _read_output(self, job_id, process, registered, errors, sid):
+        while True:
+            try:
+                raw = await asyncio.wait_for(process.stdout.readline(), self.download_idle_timeout or None)
+            except asyncio.TimeoutError:
+                if registered.paused:
+                    continue
+                # Reads as a network error, so the job is retried
+                errors.append(f'ERROR: no output for {self.download_idle_timeout} seconds, connection timed out')
+                process.kill()
+                return
+            if not raw:
+                return
+            self._handle_output(job_id, raw.decode('utf-8', errors='replace'), registered, errors, sid)
@@ -0,0 +1,118 @@
+import re
+import threading
+import time
+
+RATE_RE = re.compile(r'^\s*([\d.]+)\s*([KMG]?)(?:i?B)?(?:/s)?\s*$', re.IGNORECASE)
+RATE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+DEFAULT_WEIGHTS = {'high': 4, 'normal': 2, 'low': 1}
+
+
+def parse_rate(value):
+    """Bytes/sec from a number or a yt-dlp style rate such as '500K' or '4.2M'; None means unlimited"""
+    if value in (None, '', 0):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = RATE_RE.match(str(value))
+    if match is None:
+        raise ValueError(f"Invalid rate: {value!r}")
+    return float(match.group(1)) * RATE_UNITS[match.group(2).upper()]
+
+
+class BandwidthGovernor:
+    """Splits a total download rate across the running jobs in proportion to their priority weights.
+
+    Shares are recomputed whenever a job starts or finishes (or the total
+    changes), and on_change(job_id, rate) is called for every job whose
+    share moved, so its backend can apply the new limit.
+    """
+
+    def __init__(self, total_rate=None, weights=None, on_change=None):
+        self._lock = threading.Lock()
+        self.total_rate = parse_rate(total_rate)
+        self.weights = dict(weights or DEFAULT_WEIGHTS)
+        self.on_change = on_change
+        self._jobs = {}   # job_id -> weight
+        self._rates = {}  # job_id -> current share in bytes/sec
+
+    def add(self, job_id, priority='normal'):
+        """Register a starting job and return its share (None when unlimited)"""
+        weight = self.weights.get(priority or 'normal', self.weights.get('normal', 1))
+        with self._lock:
+            self._jobs[job_id] = max(weight, 0.01)
+            changed = self._rebalance()
+        self._notify(changed, skip=job_id)
+        return self.rate(job_id)
+
+    def remove(self, job_id):
+        with self._lock:
+            if self._jobs.pop(job_id, None) is None:
+                return
+            self._rates.pop(job_id, None)
+            changed = self._rebalance()
+        self._notify(changed)
+
+    def rate(self, job_id):
+        with self._lock:
+            return self._rates.get(job_id)
+
+    def set_total_rate(self, total_rate):
+        rate = parse_rate(total_rate)
+        with self._lock:
+            self.total_rate = rate
+            changed = self._rebalance()
+        self._notify(changed)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'total_rate': self.total_rate,
+                'weights': dict(self.weights),
+                'jobs': {job_id: {'weight': weight, 'rate': self._rates.get(job_id)}
+                         for job_id, weight in self._jobs.items()}
+            }
+
+    def _rebalance(self):
+        if self.total_rate is None:
+            rates = dict.fromkeys(self._jobs)
+        else:
+            total_weight = sum(self._jobs.values())
+            rates = {job_id: self.total_rate * weight / total_weight for job_id, weight in self._jobs.items()}
+        changed = [(job_id, rate) for job_id, rate in rates.items() if self._rates.get(job_id) != rate]
+        self._rates = rates
+        return changed
+
+    def _notify(self, changed, skip=None):
+        if self.on_change is None:
+            return
+        for job_id, rate in changed:
+            if job_id != skip:
+                self.on_change(job_id, rate)
+
+
+class TokenBucket:
+    """Blocking rate limiter: consume(n) sleeps until n bytes fit in the configured rate"""
+
+    def __init__(self, rate=None, burst=1.0):
+        self.burst = burst
+        self.rate = None
+        self.set_rate(rate)
+        self._last = time.monotonic()
+
+    def set_rate(self, rate):
+        self.rate = rate
+        self._capacity = rate * self.burst if rate else 0
+        self._tokens = self._capacity
+
+    def consume(self, amount):
+        if not self.rate:
+            return
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        self._tokens -= amount
+        if self._tokens < 0:
+            time.sleep(-self._tokens / self.rate)
+            self._last = time.monotonic()
+            self._tokens = 0
@@ -0,0 +1,87 @@
+"""Compare jobs/sec of the subprocess and in-process yt-dlp backends.
+
+Usage:
+    python benchmarks/bench_backends.py URL [URL ...] [--jobs 20] [--concurrency 4] [--download]
+
+By default every job is a metadata extraction (what /api/metadata does).
+With --download each job downloads the smallest format into a temporary
+directory instead. The metadata cache is disabled so every job does real work.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends import DownloaderBackend, YtdlpEngineBackend  # noqa: E402
+from ytdlp_engine import YtdlpEngine  # noqa: E402
+
+
+def run_jobs(backend, urls, jobs, concurrency, download, output_dir):
+    def job(n):
+        url = urls[n % len(urls)]
+        # A distinct file per job, otherwise yt-dlp skips repeats as already downloaded
+        options = {
+            'format_code': 'worst',
+            'output_template': os.path.join(output_dir, f'{n}-%(id)s.%(ext)s'),
+            'extract_audio': False,
+            'audio_format': 'mp3'
+        }
+        start = time.perf_counter()
+        if download:
+            ok = backend.download(f'bench-{n}', url, options, None)
+        else:
+            ok = bool(backend.get_metadata(url))
+        return ok, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(job, range(jobs)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for _, latency in results]
+    return {
+        'jobs_per_sec': jobs / elapsed,
+        'failed': sum(1 for ok, _ in results if not ok),
+        'p50_ms': statistics.median(latencies) * 1000,
+        'max_ms': max(latencies) * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('urls', nargs='+')
+    parser.add_argument('--jobs', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--download', action='store_true', help='download instead of extracting metadata')
+    args = parser.parse_args()
+
+    output_dir = tempfile.mkdtemp(prefix='bench_backends_')
+    try:
+        subprocess_backend = DownloaderBackend(shutil.which('yt-dlp'))
+
+        start = time.perf_counter()
+        engine = YtdlpEngine(download_workers=args.concurrency, metadata_workers=args.concurrency)
+        engine.warm_up()
+        warm_up = time.perf_counter() - start
+        engine_backend = YtdlpEngineBackend(engine)
+
+        print(f"{args.jobs} {'download' if args.download else 'metadata'} jobs, concurrency {args.concurrency}")
+        print(f"engine warm-up: {warm_up:.2f}s (paid once at server start)\n")
+        print(f"{'backend':<12} {'jobs/sec':>10} {'p50 ms':>10} {'max ms':>10} {'failed':>8}")
+        for name, backend in (('subprocess', subprocess_backend), ('inprocess', engine_backend)):
+            result = run_jobs(backend, args.urls, args.jobs, args.concurrency, args.download, output_dir)
+            print(f"{name:<12} {result['jobs_per_sec']:>10.2f} {result['p50_ms']:>10.0f} "
+                  f"{result['max_ms']:>10.0f} {result['failed']:>8}")
+        engine.shutdown()
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Measure progress-line parsing throughput before and after --progress-template.
+
+Usage:
+    python benchmarks/bench_progress_parser.py [--repeat 200]
+
+"before" is the old heuristic parser run over yt-dlp's default progress
+output (data/progress_legacy.log); "after" is progress_parser.parse_progress_line
+run over the same download printed with PROGRESS_TEMPLATE (data/progress_template.log).
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from progress_parser import parse_progress_line  # noqa: E402
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def legacy_parse_progress(line):
+    """DownloaderBackend._parse_progress as it was before the progress template"""
+    if line.strip().startswith('[download]'):
+        parts = line.split()
+        try:
+            percent_str = next((p for p in parts if '%' in p), None)
+            if percent_str:
+                progress = float(percent_str.replace('%', ''))
+                size_str = next((p for p in parts if 'iB' in p), None)
+                speed_str = next((p for p in parts if 'iB/s' in p), None)
+                eta_str = next((p for p in parts if ':' in p and len(p) > 4), None)
+                return {'status': 'Downloading', 'progress': progress, 'size': size_str, 'speed': speed_str, 'eta': eta_str}
+        except (ValueError, IndexError):
+            pass
+    return None
+
+
+def bench(parse, lines, repeat):
+    parsed = sum(1 for line in lines if parse(line))
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for line in lines:
+            parse(line)
+    elapsed = time.perf_counter() - start
+    return len(lines) * repeat / elapsed, parsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    runs = (
+        ('before', legacy_parse_progress, 'progress_legacy.log'),
+        ('after', parse_progress_line, 'progress_template.log'),
+    )
+    print(f"{'parser':<8} {'lines/sec':>12} {'progress lines':>15}")
+    for name, parse, log_name in runs:
+        with open(os.path.join(DATA_DIR, log_name), encoding='utf-8') as f:
+            lines = f.readlines()
+        lines_per_sec, parsed = bench(parse, lines, args.repeat)
+        print(f"{name:<8} {lines_per_sec:>12,.0f} {parsed:>15}")
+
+
+if __name__ == '__main__':
+    main()
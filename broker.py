@@ -0,0 +1,201 @@
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+TERMINAL_STATES = ('completed', 'failed')
+
+
+class Broker(ABC):
+    """Hands download jobs from the web tier to worker processes and carries their events back.
+
+    The web tier submits jobs and reads events; workers (`python app.py
+    --worker`) claim jobs, publish progress and report results. Events are
+    (seq, job_id, kind, data) tuples with kind one of 'started', 'progress'
+    (data is a progress_batch frame) or 'finished' (data has 'success' and
+    'error'). Implement this interface to put the queue somewhere other than
+    a shared SQLite file.
+    """
+
+    @abstractmethod
+    def submit(self, job_id, url, options):
+        """Queue a job unless the broker already has it; returns the job's broker status"""
+
+    @abstractmethod
+    def claim(self, worker_id):
+        """Take the oldest queued job as (job_id, url, options), or None"""
+
+    @abstractmethod
+    def publish(self, job_id, kind, data=None):
+        """Append an event for the web tier; progress frames are published with job_id None"""
+
+    @abstractmethod
+    def finish(self, job_id, success, error=None):
+        """Mark a claimed job finished and publish its 'finished' event"""
+
+    @abstractmethod
+    def events(self, after=0, limit=500):
+        """Up to limit events with a sequence number above after, oldest first"""
+
+    @abstractmethod
+    def last_event_id(self):
+        """Sequence number of the newest event, or 0"""
+
+    @abstractmethod
+    def heartbeat(self, worker_id):
+        """Record that a worker is alive"""
+
+    @abstractmethod
+    def requeue_stale(self, timeout):
+        """Put jobs of workers silent for timeout seconds back in the queue"""
+
+    @abstractmethod
+    def prune(self, max_age):
+        """Forget events and finished jobs older than max_age seconds"""
+
+    @abstractmethod
+    def stats(self, timeout=60):
+        """Queued and running job counts, and how many workers were seen within timeout seconds"""
+
+
+class SQLiteBroker(Broker):
+    """Broker on a SQLite database (WAL mode) shared by every process on one machine or network share"""
+
+    def __init__(self, path='broker.db'):
+        self.path = path
+        self._lock = threading.Lock()
+        # Autocommit; multi-statement changes use explicit BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS broker_jobs (
+            id TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            options TEXT NOT NULL,
+            status TEXT NOT NULL,
+            worker TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL)''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS broker_jobs_status ON broker_jobs (status, created_at)')
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS broker_events (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id TEXT,
+            kind TEXT NOT NULL,
+            data TEXT,
+            created_at REAL NOT NULL)''')
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS broker_workers (
+            id TEXT PRIMARY KEY,
+            heartbeat REAL NOT NULL)''')
+
+    def submit(self, job_id, url, options):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.execute('INSERT OR IGNORE INTO broker_jobs (id, url, options, status, created_at) '
+                                   'VALUES (?, ?, ?, ?, ?)', (job_id, url, json.dumps(options), 'queued', time.time()))
+                status, error = self._conn.execute('SELECT status, error FROM broker_jobs WHERE id = ?',
+                                                   (job_id,)).fetchone()
+                if status in TERMINAL_STATES:
+                    # Finished while the web tier was away: replay the result
+                    self._insert_event(job_id, 'finished', {'success': status == 'completed', 'error': error})
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+        return status
+
+    def claim(self, worker_id):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute("SELECT id, url, options FROM broker_jobs WHERE status = 'queued' "
+                                         "ORDER BY created_at LIMIT 1").fetchone()
+                if row is not None:
+                    self._conn.execute("UPDATE broker_jobs SET status = 'running', worker = ?, started_at = ? "
+                                       "WHERE id = ?", (worker_id, time.time(), row[0]))
+                    self._insert_event(row[0], 'started', {'worker': worker_id})
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+        if row is None:
+            return None
+        return row[0], row[1], json.loads(row[2])
+
+    def publish(self, job_id, kind, data=None):
+        with self._lock:
+            self._insert_event(job_id, kind, data)
+
+    def finish(self, job_id, success, error=None):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.execute('UPDATE broker_jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?',
+                                   ('completed' if success else 'failed', error, time.time(), job_id))
+                self._insert_event(job_id, 'finished', {'success': success, 'error': error})
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def events(self, after=0, limit=500):
+        with self._lock:
+            rows = self._conn.execute('SELECT seq, job_id, kind, data FROM broker_events WHERE seq > ? '
+                                      'ORDER BY seq LIMIT ?', (after, limit)).fetchall()
+        return [(seq, job_id, kind, json.loads(data) if data else None) for seq, job_id, kind, data in rows]
+
+    def last_event_id(self):
+        with self._lock:
+            return self._conn.execute('SELECT COALESCE(MAX(seq), 0) FROM broker_events').fetchone()[0]
+
+    def heartbeat(self, worker_id):
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO broker_workers (id, heartbeat) VALUES (?, ?)',
+                               (worker_id, time.time()))
+
+    def requeue_stale(self, timeout):
+        cutoff = time.time() - timeout
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE broker_jobs SET status = 'queued', worker = NULL, started_at = NULL "
+                "WHERE status = 'running' AND worker IN (SELECT id FROM broker_workers WHERE heartbeat < ?)",
+                (cutoff,))
+            self._conn.execute('DELETE FROM broker_workers WHERE heartbeat < ?', (cutoff,))
+            return cursor.rowcount
+
+    def prune(self, max_age):
+        cutoff = time.time() - max_age
+        placeholders = ', '.join('?' * len(TERMINAL_STATES))
+        with self._lock:
+            self._conn.execute('DELETE FROM broker_events WHERE created_at < ?', (cutoff,))
+            self._conn.execute(f'DELETE FROM broker_jobs WHERE status IN ({placeholders}) AND finished_at < ?',
+                               TERMINAL_STATES + (cutoff,))
+
+    def stats(self, timeout=60):
+        with self._lock:
+            counts = dict(self._conn.execute('SELECT status, COUNT(*) FROM broker_jobs GROUP BY status').fetchall())
+            workers = self._conn.execute('SELECT COUNT(*) FROM broker_workers WHERE heartbeat >= ?',
+                                         (time.time() - timeout,)).fetchone()[0]
+        return {
+            'queued': counts.get('queued', 0),
+            'running': counts.get('running', 0),
+            'workers': workers
+        }
+
+    def _insert_event(self, job_id, kind, data):
+        self._conn.execute('INSERT INTO broker_events (job_id, kind, data, created_at) VALUES (?, ?, ?, ?)',
+                           (job_id, kind, json.dumps(data) if data is not None else None, time.time()))
+
+
+BROKERS = {'sqlite': SQLiteBroker}
+
+
+def create_broker(kind, path):
+    """Return the broker named by the job_broker config key, or None to download in-process"""
+    if not kind:
+        return None
+    if kind not in BROKERS:
+        raise ValueError(f"Unknown job broker: {kind}")
+    return BROKERS[kind](path)
@@ -0,0 +1,140 @@
+import logging
+import threading
+import time
+from collections import deque
+
+from retry import classify_failure
+
+logger = logging.getLogger(__name__)
+
+
+class HostWindow:
+    def __init__(self):
+        self.bytes = 0
+        self.successes = 0
+        self.failures = 0
+        self.throttled = 0
+
+
+class HostState:
+    def __init__(self):
+        self.throughput = None  # bytes/sec in the previous window
+        self.increased = False  # last decision was an increase still being judged
+        self.cooldown = 0       # windows to hold after backing off
+
+
+class AIMDController:
+    """Tunes each host's concurrency limit in the scheduler from measured throughput.
+
+    Every interval, per host: throttling (HTTP 429) or a majority of failed
+    jobs halves the limit (multiplicative decrease); otherwise, if jobs are
+    waiting on the limit, it grows by one (additive increase). An increase
+    that didn't raise throughput by at least min_gain is undone and the host
+    is left alone for a few windows, so the limit settles where extra
+    parallel downloads stop paying off.
+    """
+
+    def __init__(self, scheduler, min_limit=1, max_limit=6, interval=10, min_gain=0.1,
+                 decrease_factor=0.5, cooldown=3, history=100):
+        self.scheduler = scheduler
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.interval = interval
+        self.min_gain = min_gain
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._windows = {}  # host -> HostWindow being filled
+        self._states = {}   # host -> HostState
+        self.decisions = deque(maxlen=history)
+        self._stopped = False
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def stop(self):
+        self._stopped = True
+
+    def record_bytes(self, host, amount):
+        with self._lock:
+            self._windows.setdefault(host, HostWindow()).bytes += amount
+
+    def record_result(self, host, success, error=None):
+        with self._lock:
+            window = self._windows.setdefault(host, HostWindow())
+            if success:
+                window.successes += 1
+            else:
+                window.failures += 1
+                if classify_failure(error) == 'throttled':
+                    window.throttled += 1
+
+    def evaluate(self):
+        """Close the current window and adjust every host that saw activity"""
+        with self._lock:
+            windows, self._windows = self._windows, {}
+        hosts = self.scheduler.host_stats()
+        for host, window in windows.items():
+            self._evaluate_host(host, window, hosts.get(host, {'active': 0, 'queued': 0}))
+
+    def snapshot(self):
+        with self._lock:
+            states = {host: {'throughput': state.throughput, 'cooldown': state.cooldown}
+                      for host, state in self._states.items()}
+        for host, state in states.items():
+            state['limit'] = self.scheduler.host_limit(host)
+        return {
+            'min_limit': self.min_limit,
+            'max_limit': self.max_limit,
+            'interval': self.interval,
+            'hosts': states,
+            'decisions': list(self.decisions)
+        }
+
+    def _evaluate_host(self, host, window, load):
+        with self._lock:
+            state = self._states.setdefault(host, HostState())
+        limit = self.scheduler.host_limit(host)
+        throughput = window.bytes / self.interval
+        new_limit, reason = limit, None
+
+        if window.throttled:
+            new_limit, reason = int(limit * self.decrease_factor), f'throttled ({window.throttled} jobs)'
+        elif window.failures >= 2 and window.failures > window.successes:
+            new_limit, reason = int(limit * self.decrease_factor), f'{window.failures} failed jobs'
+        elif state.increased and state.throughput and throughput < state.throughput * (1 + self.min_gain):
+            new_limit, reason = limit - 1, 'no throughput gain'
+        elif state.cooldown:
+            state.cooldown -= 1
+        elif load['queued'] and load['active'] >= limit:
+            new_limit, reason = limit + 1, f"{load['queued']} jobs waiting"
+
+        new_limit = max(self.min_limit, min(self.max_limit, new_limit))
+        state.increased = new_limit > limit
+        if new_limit < limit:
+            state.cooldown = self.cooldown
+        state.throughput = throughput
+        if new_limit == limit:
+            return
+
+        self.scheduler.set_host_limit(host, new_limit)
+        decision = {
+            'time': time.time(),
+            'host': host,
+            'from': limit,
+            'to': new_limit,
+            'reason': reason,
+            'throughput': throughput,
+            'failures': window.failures,
+            'throttled': window.throttled
+        }
+        self.decisions.append(decision)
+        logger.info(f"Concurrency for {host}: {limit} -> {new_limit} ({reason}, {throughput / 1024:.0f} KiB/s)")
+
+    def _run(self):
+        while not self._stopped:
+            time.sleep(self.interval)
+            try:
+                self.evaluate()
+            except Exception:
+                logger.exception("Concurrency controller evaluation failed")
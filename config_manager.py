@@ -0,0 +1,89 @@
+import json
+
+
+# Configuration manager for advanced settings
+class ConfigManager:
+    def __init__(self):
+        self.config_file = 'advanced_config.json'
+        self.default_config = {
+            'max_concurrent_downloads': 3,
+            'max_concurrent_per_host': 2,
+            'retry_attempts': 3,
+            'timeout_seconds': 30,
+            'temp_directory': None,
+            'proxy_settings': None,
+            'custom_headers': {},
+            'rate_limit': None,
+            'preferred_codec': 'auto',
+            'subtitle_languages': ['en'],
+            'thumbnail_quality': 'maxresdefault',
+            'audio_bitrate': '192',
+            'video_quality_priority': ['1080p', '720p', '480p'],
+            'naming_template': '%(title)s.%(ext)s',
+            'auto_update_ytdlp': True,
+            'metadata_cache_path': 'metadata_cache.db',
+            'metadata_cache_ttl': 3600,
+            'metadata_cache_max_entries': 5000,
+            'metadata_fanout': 8,
+            'metadata_chunk_size': 50,
+            'metadata_stream_buffer': 64,
+            'metadata_cache_max_listing': 2000,
+            'download_backend': 'subprocess',
+            'progress_interval': 0.25,
+            'engine_download_workers': 5,
+            'engine_metadata_workers': 2,
+            'job_store_path': 'jobs.db',
+            'job_store_flush_interval': 0.5,
+            'download_archive': 'download_archive.txt',
+            'job_broker': None,
+            'broker_path': 'broker.db',
+            'broker_poll_interval': 1.0,
+            'broker_heartbeat_timeout': 60,
+            'broker_retention': 86400,
+            'bandwidth_weights': {'high': 4, 'normal': 2, 'low': 1},
+            'bandwidth_rebalance_threshold': 0.25,
+            'adaptive_concurrency': True,
+            'adaptive_min_per_host': 1,
+            'adaptive_max_per_host': 6,
+            'adaptive_interval': 10,
+            'retry_base_delay': 2,
+            'retry_max_delay': 300,
+            'thumbnail_cache_dir': 'thumbnail_cache',
+            'thumbnail_cache_max_files': 20000,
+            'thumbnail_max_age': 604800,
+            'separate_postprocessing': True,
+            'postprocess_workers': None,
+            'disk_admission': True,
+            'min_free_space': 1073741824,
+            'sse_event_buffer': 256,
+            'sse_retention': 300,
+            'sse_idle_timeout': 3600,
+            'scheduler_threads': 4,
+            'download_idle_timeout': 600,
+            'reuse_extracted_info': True,
+            'info_expiry_margin': 300,
+            'gui_page_size': 200
+        }
+        self.config = self.load_config()
+
+    def load_config(self):
+        try:
+            with open(self.config_file, 'r') as f:
+                loaded_config = json.load(f)
+                # Merge with defaults
+                config = self.default_config.copy()
+                config.update(loaded_config)
+                return config
+        except FileNotFoundError:
+            return self.default_config.copy()
+
+    def save_config(self):
+        with open(self.config_file, 'w') as f:
+            json.dump(self.config, f, indent=4)
+
+    def get(self, key, default=None):
+        return self.config.get(key, default)
+
+    def set(self, key, value):
+        self.config[key] = value
+        self.save_config()
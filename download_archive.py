@@ -0,0 +1,93 @@
+import os
+import threading
+
+from metadata_cache import normalize_url
+
+
+def archive_key(info):
+    """yt-dlp's archive id for an extracted (or flat-playlist) entry, e.g. 'youtube dQw4w9WgXcQ'"""
+    extractor = info.get('extractor_key') or info.get('ie_key')
+    video_id = info.get('id')
+    if not extractor or not video_id:
+        return None
+    return f'{extractor.lower()} {video_id}'
+
+
+def archive_key_for_url(url):
+    """Archive id of a URL we can recognize without a network request, else None"""
+    key = normalize_url(url)
+    # A video opened in a playlist (watch?v=X&list=...) downloads the playlist;
+    # yt-dlp's --download-archive skips its finished entries one by one
+    if key.startswith('youtube:') and not key.startswith('youtube:playlist:') and '?list=' not in key:
+        return f"youtube {key.split(':', 1)[1]}"
+    return None
+
+
+class DownloadArchive:
+    """In-memory index of a yt-dlp --download-archive file.
+
+    yt-dlp (run by the web app, the GUI or by hand) appends one
+    '<extractor> <id>' line per finished download. Lookups are set
+    membership tests; before each one only the lines appended since the last
+    read are loaded, so the index follows other writers without re-reading
+    the whole file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = set()
+        self._offset = 0
+        self._inode = None
+
+    def __contains__(self, key):
+        if not key:
+            return False
+        with self._lock:
+            self._sync()
+            return key in self._entries
+
+    def has_url(self, url):
+        return archive_key_for_url(url) in self
+
+    def has_info(self, info):
+        return archive_key(info) in self
+
+    def add(self, key):
+        with self._lock:
+            self._sync()
+            if key in self._entries:
+                return
+            # Terminate a last line that was written without its newline
+            unterminated = os.path.exists(self.path) and os.path.getsize(self.path) > self._offset
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(('\n' if unterminated else '') + key + '\n')
+            self._entries.add(key)
+
+    def __len__(self):
+        with self._lock:
+            self._sync()
+            return len(self._entries)
+
+    def _sync(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            # Replaced or truncated: start over
+            self._entries.clear()
+            self._offset = 0
+            self._inode = stat.st_ino
+        if stat.st_size == self._offset:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        # A writer may be mid-line; leave the partial line for next time
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].decode('utf-8', errors='replace').splitlines():
+            line = line.strip()
+            if line:
+                self._entries.add(line)
+        self._offset += end
@@ -0,0 +1,431 @@
+import threading
+import time
+import logging
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Hosts that are served by the same backend and should share one per-host limit
+HOST_ALIASES = {
+    'youtu.be': 'youtube.com',
+    'm.youtube.com': 'youtube.com',
+    'music.youtube.com': 'youtube.com',
+    'youtube-nocookie.com': 'youtube.com',
+}
+
+
+def get_host(url):
+    """Return the normalized host a URL will be downloaded from"""
+    try:
+        host = (urlparse(url).hostname or '').lower()
+    except ValueError:
+        host = ''
+    if host.startswith('www.'):
+        host = host[4:]
+    return HOST_ALIASES.get(host, host)
+
+
+class RetryLater(Exception):
+    """Raised by a job's target to run it again after delay seconds instead of finishing it"""
+
+    def __init__(self, delay, reason=''):
+        super().__init__(reason)
+        self.delay = delay
+
+
+class Pending:
+    """Returned by a job's target when its work goes on elsewhere, e.g. on an event loop.
+
+    The job keeps its slot without holding a worker thread. Once future is
+    done a worker calls then(result) (re-raising the future's exception
+    instead, if any) and treats the outcome as the target's own result.
+    """
+
+    def __init__(self, future, then=None):
+        self.future = future
+        self.then = then
+
+
+class DownloadJob:
+    def __init__(self, job_id, url, target, args=(), kwargs=None, size=None):
+        self.id = job_id
+        self.url = url
+        self.size = size
+        self.host = get_host(url)
+        self.target = target
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.attempts = 0
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'url': self.url,
+            'host': self.host,
+            'size': self.size,
+            'status': self.status,
+            'error': self.error,
+            'attempts': self.attempts,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class DownloadScheduler:
+    """Job queue feeding a bounded pool of download workers.
+
+    Jobs are queued per host and handed out round-robin, so a long playlist
+    from one site cannot starve everything else, and no host ever has more
+    than its per-host limit of downloads running at once. A target that
+    returns a Future hands the rest of the job to another stage: its slot
+    is freed at once and the job finishes when the future does.
+
+    An optional admission object (admit(job_id, size) / release(job_id),
+    e.g. a storage.DiskSpaceGuard) can hold jobs back; held jobs are
+    re-checked every admission_interval seconds, and jobs behind a held one
+    (up to admission_lookahead per host) may start ahead of it. An admit()
+    that raises refuses the job for good: it is failed with the error and
+    handed to on_reject(job). A job keeps its reservation until it is
+    completely finished, including a deferred post-processing stage.
+
+    max_workers is the number of jobs that may run at once. By default each
+    gets a thread of its own; with targets that return Pending, a fixed
+    number of threads can drive any number of slots.
+    """
+
+    def __init__(self, max_workers=3, max_per_host=2, admission=None, admission_interval=5, threads=None,
+                 admission_lookahead=16, on_reject=None):
+        self._cond = threading.Condition()
+        self._queues = OrderedDict()  # host -> deque of queued jobs
+        self._jobs = {}               # job_id -> queued or running job
+        self._host_active = {}        # host -> number of running jobs
+        self._host_limits = {}        # host -> per-host override
+        self._workers = 0
+        self._running = 0
+        self._completions = deque()   # (job, Pending) whose future is done
+        self.threads = threads
+        self._shutdown = False
+        self._held = False
+        self.admission = admission
+        self.admission_interval = admission_interval
+        self.admission_lookahead = admission_lookahead
+        self.on_reject = on_reject
+        self._rejected = []           # jobs refused by admission, reported outside the lock
+        self.paused = False
+        self.max_workers = max(1, int(max_workers))
+        self.max_per_host = max(1, int(max_per_host))
+        with self._cond:
+            self._spawn_workers()
+
+    def submit(self, job_id, url, target, args=(), kwargs=None, size=None):
+        """Queue a download of an expected size in bytes; target(*args, **kwargs) runs on a worker thread"""
+        job = DownloadJob(job_id, url, target, args, kwargs, size)
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("Scheduler is shut down")
+            self._jobs[job_id] = job
+            self._queues.setdefault(job.host, deque()).append(job)
+            self._cond.notify()
+        return job
+
+    def cancel(self, job_id):
+        """Drop a job that has not started yet. Returns True if it was removed."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if not job or job.status not in ('queued', 'retrying'):
+                return False
+            host_queue = self._queues.get(job.host)
+            if host_queue is not None and job in host_queue:
+                host_queue.remove(job)
+                if not host_queue:
+                    del self._queues[job.host]
+            del self._jobs[job_id]
+            # Under the lock, so a back-off timer firing now won't requeue it
+            job.status = 'cancelled'
+            job.finished_at = time.time()
+        if self.admission is not None:
+            self.admission.release(job_id)
+        job.done.set()
+        return True
+
+    def get(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def set_max_workers(self, max_workers):
+        """Resize the pool; surplus workers exit after their current job"""
+        with self._cond:
+            self.max_workers = max(1, int(max_workers))
+            self._spawn_workers()
+            self._cond.notify_all()
+
+    def set_host_limit(self, host, limit):
+        with self._cond:
+            if limit is None:
+                self._host_limits.pop(host, None)
+            else:
+                self._host_limits[host] = max(1, int(limit))
+            self._cond.notify_all()
+
+    def host_limit(self, host):
+        return self._host_limits.get(host, self.max_per_host)
+
+    def host_stats(self):
+        """Running and queued job counts, and the current limit, for every busy host"""
+        with self._cond:
+            hosts = set(self._host_active) | set(self._queues)
+            return {host: {'active': self._host_active.get(host, 0),
+                           'queued': len(self._queues.get(host, ())),
+                           'limit': self.host_limit(host)}
+                    for host in hosts}
+
+    def snapshot(self):
+        with self._cond:
+            jobs = [job.to_dict() for job in self._jobs.values()]
+            queued = sum(len(q) for q in self._queues.values())
+            return {
+                'paused': self.paused,
+                'max_workers': self.max_workers,
+                'max_per_host': self.max_per_host,
+                'queued': queued,
+                'running': self._running,
+                'retrying': sum(1 for job in jobs if job['status'] == 'retrying'),
+                'postprocessing': sum(1 for job in jobs if job['status'] == 'postprocessing'),
+                'hosts': dict(self._host_active),
+                'jobs': jobs
+            }
+
+    def pause(self):
+        """Stop handing out queued jobs; running ones are left alone"""
+        with self._cond:
+            self.paused = True
+
+    def resume(self):
+        with self._cond:
+            self.paused = False
+            self._cond.notify_all()
+
+    def shutdown(self):
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+
+    # --- Worker internals (call with self._cond held) ---
+    def _thread_count(self):
+        return self.threads or self.max_workers
+
+    def _spawn_workers(self):
+        while self._workers < self._thread_count():
+            self._workers += 1
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def _next_job(self):
+        self._held = False
+        if self.paused or self._running >= self.max_workers:
+            return None
+        for host, host_queue in list(self._queues.items()):
+            if self._host_active.get(host, 0) >= self.host_limit(host):
+                continue
+            job = self._admitted_job(host_queue)
+            if not host_queue:
+                del self._queues[host]
+            if job is None:
+                continue
+            if host_queue:
+                # Rotate so the next pick starts with a different host
+                self._queues.move_to_end(host)
+            return job
+        return None
+
+    def _admitted_job(self, host_queue):
+        """Take the first job of a host queue that admission lets start, or None"""
+        if self.admission is None:
+            return host_queue.popleft()
+        for job in list(host_queue)[:self.admission_lookahead]:
+            try:
+                admitted = self.admission.admit(job.id, job.size)
+            except Exception as e:
+                host_queue.remove(job)
+                self._reject(job, str(e))
+                continue
+            if admitted:
+                host_queue.remove(job)
+                return job
+            # Held, but smaller jobs behind it may still fit
+            self._held = True
+        return None
+
+    def _reject(self, job, error):
+        logger.warning(f"Job {job.id} refused by admission: {error}")
+        self._jobs.pop(job.id, None)
+        job.status = 'failed'
+        job.error = error
+        job.finished_at = time.time()
+        self._rejected.append(job)
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = pending = None
+                while job is None:
+                    if self._shutdown or self._workers > self._thread_count():
+                        self._workers -= 1
+                        return
+                    if self._completions:
+                        job, pending = self._completions.popleft()
+                        break
+                    job = self._next_job()
+                    if self._rejected:
+                        break
+                    if job is None:
+                        # Held jobs get another chance once disk space may have been freed
+                        self._cond.wait(self.admission_interval if self._held else None)
+                rejected, self._rejected = self._rejected, []
+                if job is not None and pending is None:
+                    self._running += 1
+                    self._host_active[job.host] = self._host_active.get(job.host, 0) + 1
+                    job.status = 'running'
+                    job.started_at = time.time()
+            for refused in rejected:
+                if self.on_reject is not None:
+                    try:
+                        self.on_reject(refused)
+                    except Exception:
+                        logger.exception(f"on_reject failed for job {refused.id}")
+                refused.done.set()
+            if job is not None:
+                self._run(job, pending)
+
+    def _run(self, job, pending=None):
+        retry = deferred = None
+        try:
+            if pending is None:
+                result = job.target(*job.args, **job.kwargs)
+            else:
+                result = pending.future.result()
+                if pending.then is not None:
+                    result = pending.then(result)
+            if isinstance(result, Pending):
+                # Still running elsewhere: keep the slot, free this thread
+                result.future.add_done_callback(lambda future, job=job, pending=result: self._complete(job, pending))
+                return
+            job.result = result
+            if isinstance(job.result, Future):
+                deferred, job.result = job.result, None
+                job.status = 'postprocessing'
+            else:
+                job.status = 'failed' if job.result is False else 'completed'
+        except RetryLater as e:
+            retry = e
+        except Exception as e:
+            logger.exception(f"Download job {job.id} crashed")
+            job.status = 'failed'
+            job.error = str(e)
+
+        if self.admission is not None and deferred is None:
+            # The job's bytes are on disk by now, so free space reflects them
+            self.admission.release(job.id)
+        with self._cond:
+            self._running -= 1
+            remaining = self._host_active.get(job.host, 1) - 1
+            if remaining:
+                self._host_active[job.host] = remaining
+            else:
+                self._host_active.pop(job.host, None)
+            if retry is not None:
+                # Keep the job (and anyone waiting on it) but free the slot while backing off
+                job.status = 'retrying'
+                job.attempts += 1
+                job.error = str(retry) or None
+                timer = threading.Timer(retry.delay, self._requeue, args=(job,))
+                timer.daemon = True
+                timer.start()
+            elif deferred is None:
+                job.finished_at = time.time()
+                self._jobs.pop(job.id, None)
+            self._cond.notify_all()
+        if deferred is not None:
+            deferred.add_done_callback(lambda future, job=job: self._finish_deferred(job, future))
+        elif retry is None:
+            job.done.set()
+
+    def _complete(self, job, pending):
+        # Called wherever the future finished (e.g. the event loop thread); a worker takes it from here
+        with self._cond:
+            self._completions.append((job, pending))
+            self._cond.notify()
+
+    def _finish_deferred(self, job, future):
+        try:
+            job.result = future.result()
+            job.status = 'failed' if job.result is False else 'completed'
+        except Exception as e:
+            logger.exception(f"Post-processing of job {job.id} crashed")
+            job.status = 'failed'
+            job.error = str(e)
+        if self.admission is not None:
+            # Converted and moved into the library: only now is its space accounted for
+            self.admission.release(job.id)
+        with self._cond:
+            job.finished_at = time.time()
+            self._jobs.pop(job.id, None)
+        job.done.set()
+
+    def _requeue(self, job):
+        with self._cond:
+            if job.status != 'retrying' or self._shutdown:
+                return
+            job.status = 'queued'
+            self._queues.setdefault(job.host, deque()).append(job)
+            self._cond.notify()
+
+
+class SingleFlight:
+    """Lets identical submissions share one job instead of downloading the same bytes twice.
+
+    The first submission for a key starts the job; later ones become
+    followers of it until it is released, and get its progress and result.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}  # key -> flight
+        self._by_job = {}   # job_id -> flight
+
+    def join(self, key, start, follower=None):
+        """Return (job, joined): the job in flight for key, or a new one from start()"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                if follower is not None:
+                    flight['followers'].append(follower)
+                return flight['job'], True
+            # Started under the lock so the job can't be released before it is registered
+            job = start()
+            flight = {'key': key, 'job': job, 'followers': []}
+            self._flights[key] = self._by_job[job.id] = flight
+            return job, False
+
+    def followers(self, job_id):
+        with self._lock:
+            flight = self._by_job.get(job_id)
+            return list(flight['followers']) if flight else []
+
+    def release(self, job_id):
+        """Forget a finished job; returns its followers"""
+        with self._lock:
+            flight = self._by_job.pop(job_id, None)
+            if flight is None:
+                return []
+            self._flights.pop(flight['key'], None)
+            return flight['followers']
@@ -0,0 +1,83 @@
+import threading
+import time
+from collections import deque
+
+
+class JobLog:
+    def __init__(self, size):
+        self.events = deque(maxlen=size)  # (seq, event)
+        self.seq = 0
+        self.closed_at = None
+        self.updated_at = time.monotonic()
+
+
+class JobEventLog:
+    """Per-job ring buffers of numbered progress events, for streams that follow a job.
+
+    Publishing and reading never block, so a reader (an SSE response) can
+    poll from any kind of green or OS thread. Consecutive progress updates
+    replace each other, so the buffer holds state changes rather than every
+    tick; a reader that fell behind skips straight to the newest state. Logs
+    of finished jobs are kept for retention seconds, so a client that
+    reconnects just after the end still gets the result. Logs nothing has
+    written to for idle_timeout seconds (jobs that died without being
+    closed) are dropped too.
+    """
+
+    def __init__(self, size=256, retention=300, idle_timeout=3600):
+        self.size = size
+        self.retention = retention
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._logs = {}  # job_id -> JobLog
+
+    def open(self, job_id):
+        with self._lock:
+            self._expire(time.monotonic())
+            self._logs.setdefault(job_id, JobLog(self.size))
+
+    def publish(self, job_id, event, coalesce=False):
+        """Append an event and return its sequence number; with coalesce it replaces a coalesced predecessor"""
+        with self._lock:
+            log = self._logs.get(job_id)
+            if log is None or log.closed_at is not None:
+                return None
+            log.seq += 1
+            log.updated_at = time.monotonic()
+            if coalesce and log.events and log.events[-1][1].get('_coalesce'):
+                log.events.pop()
+            log.events.append((log.seq, dict(event, _coalesce=True) if coalesce else event))
+            return log.seq
+
+    def close(self, job_id, event=None):
+        """Publish a final event and mark the job's log finished"""
+        if event is not None:
+            self.publish(job_id, event)
+        now = time.monotonic()
+        with self._lock:
+            log = self._logs.get(job_id)
+            if log is not None and log.closed_at is None:
+                log.closed_at = now
+            self._expire(now)
+
+    def read(self, job_id, after=0):
+        """Events newer than sequence number after, and whether the log is finished; (None, True) if unknown"""
+        with self._lock:
+            log = self._logs.get(job_id)
+            if log is None:
+                return None, True
+            events = [(seq, {key: value for key, value in event.items() if key != '_coalesce'})
+                      for seq, event in log.events if seq > after]
+            return events, log.closed_at is not None
+
+    def _expire(self, now):
+        # Forget logs nobody can still be reconnecting to, and logs of jobs that never finished
+        expired = [key for key, log in self._logs.items()
+                   if (log.closed_at is not None and now - log.closed_at > self.retention)
+                   or (log.closed_at is None and now - log.updated_at > self.idle_timeout)]
+        for key in expired:
+            del self._logs[key]
+
+    def __contains__(self, job_id):
+        with self._lock:
+            return job_id in self._logs
@@ -0,0 +1,167 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATES = ('queued', 'running', 'paused')
+TERMINAL_STATES = ('completed', 'failed', 'cancelled')
+
+COLUMNS = ('id', 'client_id', 'room', 'url', 'quality', 'options', 'status',
+           'progress', 'error', 'attempts', 'created_at', 'updated_at')
+
+
+class JobStore:
+    """Durable record of download jobs in SQLite (WAL mode).
+
+    Unfinished jobs are mirrored in memory, so reads never touch the
+    database. Changes are coalesced per job and written by a background
+    thread in one transaction every flush_interval seconds, so hundreds of
+    progress updates a second cost a handful of row writes. Jobs still
+    queued, running or paused when the process died are loaded back on
+    startup for recovery.
+    """
+
+    def __init__(self, path='jobs.db', flush_interval=0.5):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            client_id TEXT,
+            room TEXT,
+            url TEXT NOT NULL,
+            quality TEXT,
+            options TEXT,
+            status TEXT NOT NULL,
+            progress REAL NOT NULL DEFAULT 0,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL)''')
+        existing = {row[1] for row in self._conn.execute('PRAGMA table_info(jobs)')}
+        if 'attempts' not in existing:
+            # Databases created before retries were tracked
+            self._conn.execute('ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)')
+        self._conn.commit()
+
+        self._active = {}  # job_id -> row of every unfinished job
+        self._dirty = {}   # job_id -> row waiting to be written
+        self._counts = dict.fromkeys(TERMINAL_STATES, 0)
+        placeholders = ', '.join('?' * len(ACTIVE_STATES))
+        cursor = self._conn.execute(
+            f'SELECT {", ".join(COLUMNS)} FROM jobs WHERE status IN ({placeholders}) ORDER BY created_at',
+            ACTIVE_STATES)
+        for values in cursor:
+            row = dict(zip(COLUMNS, values))
+            row['options'] = json.loads(row['options']) if row['options'] else {}
+            self._active[row['id']] = row
+        for status, count in self._conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status'):
+            if status in self._counts:
+                self._counts[status] = count
+
+        self._wakeup = threading.Event()
+        self._closed = False
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def add(self, job_id, url, quality=None, options=None, client_id=None, room=None):
+        now = time.time()
+        row = {
+            'id': job_id,
+            'client_id': client_id,
+            'room': room,
+            'url': url,
+            'quality': quality,
+            'options': options or {},
+            'status': 'queued',
+            'progress': 0.0,
+            'error': None,
+            'attempts': 0,
+            'created_at': now,
+            'updated_at': now
+        }
+        with self._lock:
+            self._active[job_id] = row
+            self._dirty[job_id] = row
+        return dict(row)
+
+    def update(self, job_id, **fields):
+        """Merge fields into an unfinished job; a terminal status retires it from memory"""
+        with self._lock:
+            row = self._active.get(job_id)
+            if row is None:
+                return False
+            row.update(fields)
+            row['updated_at'] = time.time()
+            if row['status'] in TERMINAL_STATES:
+                del self._active[job_id]
+                self._counts[row['status']] += 1
+            self._dirty[job_id] = row
+            return True
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._active.get(job_id)
+            return dict(row) if row is not None else None
+
+    def active(self):
+        """Every queued, running or paused job, oldest first"""
+        with self._lock:
+            return [dict(row) for row in self._active.values()]
+
+    def stats(self):
+        with self._lock:
+            active = len(self._active)
+            return {
+                'total': active + sum(self._counts.values()),
+                'completed': self._counts['completed'],
+                'failed': self._counts['failed'],
+                'active': active
+            }
+
+    def clear_finished(self):
+        """Forget completed, failed and cancelled jobs"""
+        self.flush()
+        placeholders = ', '.join('?' * len(TERMINAL_STATES))
+        with self._db_lock:
+            self._conn.execute(f'DELETE FROM jobs WHERE status IN ({placeholders})', TERMINAL_STATES)
+            self._conn.commit()
+        with self._lock:
+            self._counts = dict.fromkeys(TERMINAL_STATES, 0)
+
+    def flush(self):
+        """Write every pending change in a single transaction"""
+        with self._db_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                rows = [self._encode(row) for row in self._dirty.values()]
+                self._dirty = {}
+            try:
+                self._conn.executemany(
+                    f'INSERT OR REPLACE INTO jobs ({", ".join(COLUMNS)}) '
+                    f'VALUES ({", ".join("?" * len(COLUMNS))})', rows)
+                self._conn.commit()
+            except sqlite3.Error:
+                logger.exception(f"Failed to write {len(rows)} job updates")
+
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+        self.flush()
+
+    def _encode(self, row):
+        return tuple(json.dumps(row['options']) if column == 'options' else row[column]
+                     for column in COLUMNS)
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self.flush()
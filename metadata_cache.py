@@ -0,0 +1,198 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse, parse_qsl, urlencode
+
+# Query parameters that never change what a URL points at
+TRACKING_PARAMS = {'utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content',
+                   'fbclid', 'gclid', 'si', 'feature', 'pp'}
+
+YOUTUBE_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+
+# Signed media URLs carry their expiry as ?expire=<unix time> or /expire/<unix time>/
+EXPIRE_RE = re.compile(r'[?&/]expire[=/](\d+)')
+
+
+def normalize_url(url):
+    """Reduce a URL to a stable cache key (the video/playlist id where we can tell)"""
+    url = url.strip()
+    try:
+        parsed = urlparse(url)
+    except ValueError:
+        return url
+    host = (parsed.hostname or '').lower()
+    if host.startswith('www.') or host.startswith('m.'):
+        host = host.split('.', 1)[1]
+    query = dict(parse_qsl(parsed.query))
+
+    # A video opened inside a playlist downloads the playlist, so it must never share the bare video's key
+    playlist = f"?list={query['list']}" if query.get('list') else ''
+    if host == 'youtu.be':
+        video_id = parsed.path.lstrip('/').split('/')[0]
+        if YOUTUBE_ID_RE.match(video_id):
+            return f'youtube:{video_id}{playlist}'
+    elif host in ('youtube.com', 'music.youtube.com', 'youtube-nocookie.com'):
+        if parsed.path == '/watch' and YOUTUBE_ID_RE.match(query.get('v', '')):
+            return f"youtube:{query['v']}{playlist}"
+        if parsed.path == '/playlist' and query.get('list'):
+            return f"youtube:playlist:{query['list']}"
+        parts = parsed.path.strip('/').split('/')
+        if len(parts) == 2 and parts[0] in ('shorts', 'embed', 'live', 'v') and YOUTUBE_ID_RE.match(parts[1]):
+            return f'youtube:{parts[1]}'
+
+    query = {k: v for k, v in query.items() if k not in TRACKING_PARAMS}
+    path = parsed.path.rstrip('/') or '/'
+    normalized = f'{host}{path}'
+    if query:
+        normalized += '?' + urlencode(sorted(query.items()))
+    return normalized
+
+
+def playlist_param(url):
+    """The playlist a URL opens through its list= parameter, or None"""
+    try:
+        return dict(parse_qsl(urlparse(url.strip()).query)).get('list') or None
+    except ValueError:
+        return None
+
+
+def is_single_video(url, info):
+    """Whether info is a full extraction of the single video url asks for, fit to download from"""
+    return not playlist_param(url) and info.get('_type', 'video') == 'video' and bool(info.get('formats'))
+
+
+def media_url_expiry(info):
+    """Earliest expiry (unix time) of the signed media URLs in an extracted info dict, or None"""
+    expiries = []
+    for fmt in info.get('requested_formats') or info.get('formats') or [info]:
+        match = EXPIRE_RE.search(fmt.get('url') or '')
+        if match:
+            expiries.append(int(match.group(1)))
+    return min(expiries) if expiries else None
+
+
+def info_expired(info, margin=300):
+    """Whether an extracted info dict's media URLs expire within margin seconds and need extracting again"""
+    expiry = media_url_expiry(info)
+    return expiry is not None and expiry - margin < time.time()
+
+
+class MetadataCache:
+    """SQLite-backed cache of yt-dlp metadata with a TTL and an LRU size bound.
+
+    Entries are keyed by normalized URL plus a namespace, since the web app
+    caches `--dump-json --flat-playlist` listings while the GUI caches full
+    `extract_info` results for the same URL.
+    """
+
+    def __init__(self, path='metadata_cache.db', ttl=3600, max_entries=5000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS metadata (
+            key TEXT NOT NULL,
+            namespace TEXT NOT NULL,
+            value TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            accessed_at REAL NOT NULL,
+            PRIMARY KEY (key, namespace))''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS metadata_accessed ON metadata (accessed_at)')
+        self._conn.commit()
+        self._size = self._conn.execute('SELECT COUNT(*) FROM metadata').fetchone()[0]
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0,
+                       'hit_time': 0.0, 'miss_time': 0.0}
+
+    def get(self, url, namespace='default'):
+        key = normalize_url(url)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute('SELECT value, created_at FROM metadata WHERE key = ? AND namespace = ?',
+                                     (key, namespace)).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if self.ttl and now - created_at > self.ttl:
+                self._conn.execute('DELETE FROM metadata WHERE key = ? AND namespace = ?', (key, namespace))
+                self._conn.commit()
+                self._size -= 1
+                self._stats['expired'] += 1
+                return None
+            self._conn.execute('UPDATE metadata SET accessed_at = ? WHERE key = ? AND namespace = ?',
+                               (now, key, namespace))
+            self._conn.commit()
+        return json.loads(value)
+
+    def put(self, url, value, namespace='default'):
+        key = normalize_url(url)
+        now = time.time()
+        payload = json.dumps(value)
+        with self._lock:
+            exists = self._conn.execute('SELECT 1 FROM metadata WHERE key = ? AND namespace = ?',
+                                        (key, namespace)).fetchone()
+            self._conn.execute('INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?)',
+                               (key, namespace, payload, now, now))
+            if not exists:
+                self._size += 1
+            if self.max_entries and self._size > self.max_entries:
+                self._evict()
+            self._conn.commit()
+
+    def get_or_fetch(self, url, fetch, namespace='default', refresh=False):
+        """Return cached metadata for url, calling fetch() and storing the result on a miss"""
+        start = time.perf_counter()
+        value = None if refresh else self.get(url, namespace)
+        if value is not None:
+            self.record_lookup(True, start)
+            return value
+        value = fetch()
+        self.put(url, value, namespace)
+        self.record_lookup(False, start)
+        return value
+
+    def invalidate(self, url):
+        """Drop every cached variant of url. Returns the number of entries removed."""
+        key = normalize_url(url)
+        with self._lock:
+            removed = self._conn.execute('DELETE FROM metadata WHERE key = ?', (key,)).rowcount
+            self._conn.commit()
+            self._size -= removed
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM metadata')
+            self._conn.commit()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = self._size
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        hit_time, miss_time = stats.pop('hit_time'), stats.pop('miss_time')
+        stats['avg_hit_ms'] = hit_time * 1000 / stats['hits'] if stats['hits'] else 0.0
+        stats['avg_miss_ms'] = miss_time * 1000 / stats['misses'] if stats['misses'] else 0.0
+        stats['max_entries'] = self.max_entries
+        stats['ttl'] = self.ttl
+        return stats
+
+    def record_lookup(self, hit, start):
+        """Count a lookup that began at perf_counter() time start, for callers not using get_or_fetch"""
+        counter, timer = ('hits', 'hit_time') if hit else ('misses', 'miss_time')
+        with self._lock:
+            self._stats[counter] += 1
+            self._stats[timer] += time.perf_counter() - start
+
+    def _evict(self):
+        overflow = self._size - self.max_entries
+        removed = self._conn.execute(
+            'DELETE FROM metadata WHERE rowid IN (SELECT rowid FROM metadata ORDER BY accessed_at LIMIT ?)',
+            (overflow,)).rowcount
+        self._size -= removed
+        self._stats['evictions'] += removed
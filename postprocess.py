@@ -0,0 +1,81 @@
+import logging
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# audio format -> (ffmpeg codec, file extension, lossy)
+AUDIO_CODECS = {
+    'mp3': ('libmp3lame', 'mp3', True),
+    'm4a': ('aac', 'm4a', True),
+    'aac': ('aac', 'm4a', True),
+    'opus': ('libopus', 'opus', True),
+    'vorbis': ('libvorbis', 'ogg', True),
+    'flac': ('flac', 'flac', False),
+    'wav': ('pcm_s16le', 'wav', False),
+}
+
+
+def extract_audio(ffmpeg_path, source, audio_format='mp3', bitrate=None):
+    """Transcode a downloaded file to audio_format next to it and remove the source; returns the new path"""
+    codec, ext, lossy = AUDIO_CODECS[audio_format]
+    base = os.path.splitext(source)[0]
+    target = f'{base}.{ext}'
+    if target == source:
+        return source
+    # ffmpeg picks the muxer from the extension, so keep it last
+    tmp_path = f'{base}.temp.{ext}'
+    command = [ffmpeg_path, '-y', '-nostdin', '-loglevel', 'error', '-i', source, '-vn', '-c:a', codec]
+    if lossy and bitrate:
+        command.extend(['-b:a', f'{bitrate}k'])
+    command.append(tmp_path)
+    result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            text=True, encoding='utf-8', errors='replace')
+    if result.returncode != 0:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        lines = result.stderr.strip().splitlines()
+        raise RuntimeError(f"ffmpeg audio conversion failed: {lines[-1] if lines else result.returncode}")
+    os.replace(tmp_path, target)
+    os.remove(source)
+    return target
+
+
+class PostProcessPool:
+    """Bounded pool for CPU-bound ffmpeg work, separate from the download workers.
+
+    Sized to the number of cores by default. Each task drives one ffmpeg
+    process, so at most `workers` transcodes run at once while download
+    slots go straight back to fetching the next job.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 2
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='postprocess')
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+
+    def submit(self, fn, *args):
+        with self._lock:
+            self._queued += 1
+        return self._executor.submit(self._run, fn, *args)
+
+    def stats(self):
+        with self._lock:
+            return {'workers': self.workers, 'queued': self._queued, 'running': self._running}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, fn, *args):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
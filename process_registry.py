@@ -0,0 +1,147 @@
+import os
+import signal
+import threading
+
+# POSIX can freeze a process in place; elsewhere a paused download is stopped
+# and relaunched later, and yt-dlp picks up from its .part file
+SUPPORTS_SIGNALS = hasattr(signal, 'SIGSTOP')
+
+
+class RegisteredJob:
+    def __init__(self, job_id, room=None):
+        self.job_id = job_id
+        self.room = room
+        self.process = None
+        self.pid = None
+        self.group = False
+        # Pauses the job cooperatively instead of by signal, for jobs that share their process
+        self.set_paused = None
+        self.paused = False
+        self.stopped = False
+        # Set by the backend while bytes are being transferred (not merging/converting)
+        self.downloading = False
+        self.resumed = threading.Event()
+        self.resumed.set()
+
+
+class ProcessRegistry:
+    """Tracks the process behind every running download so it can be paused and resumed"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def register(self, job_id, room=None, set_paused=None):
+        """set_paused(bool), if given, pauses and resumes the job in place of process signals"""
+        with self._lock:
+            job = self._jobs[job_id] = RegisteredJob(job_id, room)
+            job.set_paused = set_paused
+            return job
+
+    def attach(self, job_id, process=None, pid=None, group=False):
+        """Record the process now running job_id; group means signal its whole process group"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.process = process
+            job.pid = pid if pid is not None else process.pid
+            job.group = group
+            if job.paused and SUPPORTS_SIGNALS:
+                # Paused while the process was being started
+                self._signal(job, signal.SIGSTOP)
+
+    def unregister(self, job_id):
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+            if job is not None and job.paused:
+                # Never leave a process behind stopped, e.g. one that is reused for other jobs
+                self._continue(job)
+        if job is not None:
+            job.resumed.set()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def job_ids(self):
+        with self._lock:
+            return list(self._jobs)
+
+    def pause(self, job_id):
+        """Suspend a running download. Returns False if it isn't running or already paused."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.paused:
+                return False
+            if job.set_paused is not None:
+                job.set_paused(True)
+            elif SUPPORTS_SIGNALS:
+                if job.pid is not None:
+                    self._signal(job, signal.SIGSTOP)
+            elif job.process is not None:
+                job.stopped = True
+                job.process.terminate()
+            else:
+                # No child we can stop (e.g. an engine worker on Windows)
+                return False
+            job.paused = True
+            job.resumed.clear()
+            return True
+
+    def resume(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not job.paused:
+                return False
+            job.paused = False
+            self._continue(job)
+            job.resumed.set()
+            return True
+
+    def restart(self, job_id):
+        """Stop a transferring download so it is relaunched (with fresh options) from its .part file"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.paused or job.process is None or not job.downloading:
+                return False
+            job.stopped = True
+            if job.group and SUPPORTS_SIGNALS:
+                # Take helpers (e.g. ffmpeg fetching HLS) down with it
+                self._signal(job, signal.SIGTERM)
+            else:
+                job.process.terminate()
+            return True
+
+    def pause_all(self):
+        return [job_id for job_id in self.job_ids() if self.pause(job_id)]
+
+    def resume_all(self):
+        return [job_id for job_id in self.job_ids() if self.resume(job_id)]
+
+    def should_restart(self, job_id):
+        """After a process exits: True if it was stopped for a pause or restart and must be relaunched.
+
+        Blocks until the job is resumed.
+        """
+        job = self.get(job_id)
+        if job is None or not job.stopped:
+            return False
+        job.resumed.wait()
+        job.stopped = False
+        return True
+
+    def _continue(self, job):
+        if job.set_paused is not None:
+            job.set_paused(False)
+        elif SUPPORTS_SIGNALS and job.pid is not None:
+            self._signal(job, signal.SIGCONT)
+
+    def _signal(self, job, sig):
+        try:
+            if job.group:
+                os.killpg(os.getpgid(job.pid), sig)
+            else:
+                os.kill(job.pid, sig)
+        except ProcessLookupError:
+            pass
@@ -0,0 +1,64 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = {'Completed', 'Error', 'Cancelled', 'Skipped'}
+
+
+class ProgressEmitter:
+    """Coalesces per-job progress and sends one batched frame per room per tick.
+
+    yt-dlp can report progress dozens of times a second per job. Only the
+    latest state of each job is kept between ticks, and every room (socket.io
+    client) gets a single 'progress_batch' event with all of its changed jobs.
+    Terminal states skip the wait and are flushed straight away.
+    """
+
+    def __init__(self, emit, interval=0.25, event='progress_batch'):
+        self.emit = emit
+        self.interval = interval
+        self.event = event
+        self._lock = threading.Lock()
+        # Held while a frame is being sent so a terminal flush can never
+        # overtake an older tick for the same job
+        self._send_lock = threading.Lock()
+        self._pending = {}  # room -> {job_id: latest state}
+        self._wakeup = threading.Event()
+        self._stopped = False
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def update(self, job_id, data, room=None):
+        with self._lock:
+            jobs = self._pending.setdefault(room, {})
+            state = jobs.setdefault(job_id, {'id': job_id})
+            state.update(data)
+            terminal = data.get('status') in TERMINAL_STATUSES
+        if terminal:
+            self.flush(room)
+
+    def flush(self, room=None):
+        with self._send_lock:
+            with self._lock:
+                jobs = self._pending.pop(room, None)
+            if jobs:
+                self._send(room, jobs)
+
+    def stop(self):
+        self._stopped = True
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.interval)
+            with self._send_lock:
+                with self._lock:
+                    pending, self._pending = self._pending, {}
+                for room, jobs in pending.items():
+                    self._send(room, jobs)
+
+    def _send(self, room, jobs):
+        try:
+            self.emit(self.event, {'updates': list(jobs.values())}, room)
+        except Exception:
+            logger.exception("Failed to emit progress")
@@ -0,0 +1,40 @@
+import re
+
+# Passed to yt-dlp as --progress-template (with --newline) so every progress
+# report is one machine-readable line of raw numbers; missing values print as NA
+PROGRESS_TEMPLATE = ('download:[progress] %(progress.status)s %(progress.downloaded_bytes)s '
+                     '%(progress.total_bytes)s %(progress.total_bytes_estimate)s '
+                     '%(progress.speed)s %(progress.eta)s')
+
+# Printed (via --print after_move:) before the path of each finished file
+# whose post-processing is left to the server
+OUTPUT_FILE_PREFIX = '[output] '
+
+PROGRESS_RE = re.compile(
+    r'\[progress\] (\w+) ([\d.]+|NA) ([\d.]+|NA) ([\d.]+|NA) ([\d.e+-]+|NA) ([\d.]+|NA)\s*$'
+)
+
+STATUS_NAMES = {'downloading': 'Downloading', 'finished': 'Processing'}
+
+
+def parse_progress_line(line):
+    """Parse one PROGRESS_TEMPLATE line into numeric progress, or None for any other output"""
+    match = PROGRESS_RE.match(line)
+    if match is None:
+        return None
+    status, downloaded, total, estimate, speed, eta = match.groups()
+    downloaded = int(float(downloaded)) if downloaded != 'NA' else 0
+    if total != 'NA':
+        total = int(float(total))
+    elif estimate != 'NA':
+        total = int(float(estimate))
+    else:
+        total = None
+    return {
+        'status': STATUS_NAMES.get(status, status),
+        'progress': downloaded * 100.0 / total if total else 0.0,
+        'downloaded_bytes': downloaded,
+        'total_bytes': total,
+        'speed': float(speed) if speed != 'NA' else None,
+        'eta': int(float(eta)) if eta != 'NA' else None
+    }
@@ -0,0 +1,60 @@
+import random
+import re
+
+# Checked in order; the first match names the failure
+FAILURE_PATTERNS = (
+    ('throttled', re.compile(r'HTTP Error 429|Too Many Requests|rate.?limit', re.IGNORECASE)),
+    ('extractor', re.compile(r'Unsupported URL|Video unavailable|Private video|Sign in to confirm|'
+                             r'members-only|not available in your country|has been removed|'
+                             r'HTTP Error 40[14]|Requested format is not available|Unable to extract',
+                             re.IGNORECASE)),
+    ('ffmpeg', re.compile(r'ffmpeg|ffprobe|Postprocessing|Conversion failed|merg', re.IGNORECASE)),
+    ('network', re.compile(r'timed? ?out|Connection (?:reset|refused|aborted)|Network is unreachable|'
+                           r'Name or service not known|name resolution|getaddrinfo|IncompleteRead|'
+                           r'Remote end closed|SSL|EOF occurred|HTTP Error 5\d\d|Unable to download|'
+                           r'giving up after', re.IGNORECASE)),
+)
+
+# Failure kinds worth another attempt
+RETRYABLE = {'network', 'throttled', 'ffmpeg', 'unknown'}
+
+
+def classify_failure(error):
+    """Name the kind of a yt-dlp failure: network, throttled, extractor, ffmpeg or unknown"""
+    if not error:
+        return 'unknown'
+    for kind, pattern in FAILURE_PATTERNS:
+        if pattern.search(error):
+            return kind
+    return 'unknown'
+
+
+class RetryPolicy:
+    """Which failures to retry, and how long to back off before each attempt.
+
+    Network errors and throttling are retried up to max_attempts times;
+    ffmpeg and unrecognised failures get a single retry (the download itself
+    is usually on disk by then); extractor errors such as a private or
+    removed video are final. Delays grow exponentially from base_delay, are
+    capped at max_delay and randomized over the upper half of the range so
+    failed jobs don't all come back at once. Throttled jobs wait four times longer.
+    """
+
+    def __init__(self, max_attempts=3, base_delay=2.0, max_delay=300.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, kind, attempt):
+        """attempt is the number of retries already made"""
+        if kind not in RETRYABLE:
+            return False
+        limit = self.max_attempts if kind in ('network', 'throttled') else min(1, self.max_attempts)
+        return attempt < limit
+
+    def delay(self, kind, attempt):
+        ceiling = self.base_delay * 2 ** attempt
+        if kind == 'throttled':
+            ceiling *= 4
+        ceiling = min(self.max_delay, ceiling)
+        return random.uniform(ceiling / 2, ceiling)
@@ -0,0 +1,120 @@
+import errno
+import logging
+import os
+import shutil
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def expected_size(info):
+    """Bytes a download of an extracted video is expected to take, or None if unknown"""
+    size = info.get('filesize') or info.get('filesize_approx')
+    formats = info.get('requested_formats')
+    if not size and formats:
+        # Separate video and audio streams that get merged
+        sizes = [f.get('filesize') or f.get('filesize_approx') for f in formats]
+        if all(sizes):
+            size = sum(sizes)
+    return int(size) if size else None
+
+
+def free_space(path):
+    """Free bytes on the filesystem holding path, or its nearest existing parent"""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return shutil.disk_usage(path).free
+
+
+def move_into(path, directory):
+    """Move a finished file into directory so it only ever appears there complete; returns the new path"""
+    os.makedirs(directory, exist_ok=True)
+    target = os.path.join(directory, os.path.basename(path))
+    try:
+        os.replace(path, target)
+        return target
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    # Another filesystem: copy next to the target under a hidden name, then rename it into place
+    tmp_path = os.path.join(directory, f'.{os.path.basename(path)}.{os.getpid()}.tmp')
+    try:
+        shutil.copyfile(path, tmp_path)
+        shutil.copystat(path, tmp_path)
+        with open(tmp_path, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.remove(path)
+    return target
+
+
+class InsufficientSpace(Exception):
+    """A job can never be admitted: it does not fit even with nothing else reserved"""
+
+
+class DiskSpaceGuard:
+    """Admission check that keeps a batch of downloads from filling the disk.
+
+    A job is admitted only if every directory it writes to (the scratch
+    directory and the library) has room for its expected size, on top of
+    the sizes reserved by jobs already admitted and min_free bytes of
+    headroom. Jobs of unknown size only need the headroom. A job that does
+    not fit while nothing else is reserved raises InsufficientSpace, since
+    waiting would never free the space it needs.
+    """
+
+    def __init__(self, directories, min_free=1024 ** 3):
+        self.directories = []
+        self.min_free = min_free
+        self._lock = threading.Lock()
+        self._reserved = {}  # job_id -> expected bytes
+        self._blocked = set()
+        self.set_directories(directories)
+
+    def set_directories(self, directories):
+        """Check these directories from now on, e.g. after the download folder changed"""
+        with self._lock:
+            self.directories = [d for d in dict.fromkeys(directories) if d]
+
+    def admit(self, job_id, size=None):
+        with self._lock:
+            if job_id in self._reserved:
+                return True
+            needed = (size or 0) + sum(self._reserved.values()) + self.min_free
+            for directory in self.directories:
+                available = free_space(directory)
+                if available < needed:
+                    if not self._reserved:
+                        self._blocked.discard(job_id)
+                        raise InsufficientSpace(f"{directory} has {available / 1024 ** 3:.1f} GiB free, "
+                                                f"{needed / 1024 ** 3:.1f} GiB needed")
+                    if job_id not in self._blocked:
+                        self._blocked.add(job_id)
+                        logger.warning(f"Holding job {job_id}: {directory} has {available / 1024 ** 3:.1f} GiB "
+                                       f"free, {needed / 1024 ** 3:.1f} GiB needed")
+                    return False
+            self._blocked.discard(job_id)
+            self._reserved[job_id] = size or 0
+            return True
+
+    def release(self, job_id):
+        with self._lock:
+            self._reserved.pop(job_id, None)
+            self._blocked.discard(job_id)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'directories': {directory: free_space(directory) for directory in self.directories},
+                'min_free': self.min_free,
+                'reserved': sum(self._reserved.values()),
+                'waiting': len(self._blocked)
+            }
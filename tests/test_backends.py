@@ -0,0 +1,112 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends import DownloaderBackend
+from metadata_cache import MetadataCache
+
+URL = 'https://www.youtube.com/playlist?list=PL123'
+
+
+class ListingBackend(DownloaderBackend):
+    """Lists a fixed set of entries instead of running yt-dlp, counting how far each listing got"""
+
+    def __init__(self, entries, **kwargs):
+        super().__init__(None, **kwargs)
+        self.entries = entries
+        self.listed = 0
+        self.listings = 0
+
+    def iter_metadata(self, url):
+        self.listings += 1
+        for entry in self.entries:
+            self.listed += 1
+            yield entry
+
+
+class StreamMetadataTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = MetadataCache(path=os.path.join(self.directory, 'cache.db'))
+        self.entries = [{'id': str(n), 'title': f'Video {n}'} for n in range(5)]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_entries_arrive_while_listing(self):
+        backend = ListingBackend(self.entries, metadata_cache=self.cache)
+        stream = backend.stream_metadata(URL)
+        self.assertEqual(next(stream), self.entries[0])
+        self.assertEqual(backend.listed, 1)
+        self.assertEqual(list(stream), self.entries[1:])
+
+    def test_second_listing_comes_from_the_cache(self):
+        backend = ListingBackend(self.entries, metadata_cache=self.cache)
+        self.assertEqual(backend.get_metadata(URL), self.entries)
+        self.assertEqual(backend.get_metadata(URL), self.entries)
+        self.assertEqual(backend.listings, 1)
+        self.assertEqual(backend.get_metadata(URL, refresh=True), self.entries)
+        self.assertEqual(backend.listings, 2)
+
+    def test_huge_listings_are_not_cached(self):
+        backend = ListingBackend(self.entries, metadata_cache=self.cache, cache_max_listing=3)
+        self.assertEqual(backend.get_metadata(URL), self.entries)
+        self.assertIsNone(self.cache.get(URL, namespace='flat-playlist'))
+
+    def test_abandoned_listing_is_not_cached(self):
+        backend = ListingBackend(self.entries, metadata_cache=self.cache)
+        stream = backend.stream_metadata(URL)
+        next(stream)
+        stream.close()
+        self.assertIsNone(self.cache.get(URL, namespace='flat-playlist'))
+
+    def test_without_cache(self):
+        backend = ListingBackend(self.entries)
+        self.assertEqual(backend.get_metadata(URL), self.entries)
+        self.assertEqual(backend.get_metadata(URL), self.entries)
+        self.assertEqual(backend.listings, 2)
+
+
+@unittest.skipIf(sys.platform == 'win32', 'needs an executable script')
+class IterMetadataTest(unittest.TestCase):
+    """iter_metadata against a stand-in for the yt-dlp binary"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def fake_ytdlp(self, lines, exit_code=0, stderr=''):
+        path = os.path.join(self.directory, 'yt-dlp')
+        with open(path, 'w') as f:
+            f.write(f'#!{sys.executable}\n'
+                    'import sys\n'
+                    f'for line in {lines!r}:\n'
+                    '    print(line, flush=True)\n'
+                    f'sys.stderr.write({stderr!r})\n'
+                    f'sys.exit({exit_code})\n')
+        os.chmod(path, 0o755)
+        return path
+
+    def test_yields_each_json_line(self):
+        entries = [{'id': 'a'}, {'id': 'b'}]
+        backend = DownloaderBackend(self.fake_ytdlp([json.dumps(entry) for entry in entries] + ['']))
+        self.assertEqual(list(backend.iter_metadata(URL)), entries)
+
+    def test_failure_raises_with_stderr(self):
+        backend = DownloaderBackend(self.fake_ytdlp([json.dumps({'id': 'a'})], exit_code=1,
+                                                    stderr='ERROR: Private video'))
+        stream = backend.iter_metadata(URL)
+        self.assertEqual(next(stream), {'id': 'a'})
+        with self.assertRaisesRegex(RuntimeError, 'Private video'):
+            next(stream)
+
+
+if __name__ == '__main__':
+    unittest.main()
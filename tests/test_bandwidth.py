@@ -0,0 +1,127 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bandwidth import BandwidthGovernor, TokenBucket, parse_rate
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class ParseRateTest(unittest.TestCase):
+    def test_units(self):
+        self.assertEqual(parse_rate('500K'), 500 * 1024)
+        self.assertEqual(parse_rate('4.5M'), 4.5 * 1024 ** 2)
+        self.assertEqual(parse_rate('1GiB/s'), 1024 ** 3)
+        self.assertEqual(parse_rate(2048), 2048.0)
+
+    def test_unlimited(self):
+        for value in (None, '', 0):
+            self.assertIsNone(parse_rate(value))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            parse_rate('fast')
+
+
+class BandwidthGovernorTest(unittest.TestCase):
+    def setUp(self):
+        self.changes = []
+        self.governor = BandwidthGovernor(
+            total_rate=900, on_change=lambda job_id, rate: self.changes.append((job_id, rate)))
+
+    def test_shares_follow_weights(self):
+        self.assertEqual(self.governor.add('a', 'normal'), 900)
+        self.assertEqual(self.governor.add('b', 'low'), 300)
+        self.assertEqual(self.governor.rate('a'), 600)
+        self.assertEqual(self.governor.add('c', 'high'), 900 * 4 / 7)
+        self.assertAlmostEqual(sum(self.governor.rate(job_id) for job_id in 'abc'), 900)
+
+    def test_changed_shares_are_reported(self):
+        self.governor.add('a')
+        self.assertEqual(self.changes, [])
+        self.governor.add('b')
+        # The new job gets its share from add(); only the running one is told
+        self.assertEqual(self.changes, [('a', 450)])
+        self.changes.clear()
+        self.governor.remove('b')
+        self.assertEqual(self.changes, [('a', 900)])
+        self.assertIsNone(self.governor.rate('b'))
+
+    def test_removing_unknown_job(self):
+        self.governor.remove('missing')
+        self.assertEqual(self.changes, [])
+
+    def test_unlimited(self):
+        governor = BandwidthGovernor()
+        self.assertIsNone(governor.add('a'))
+        self.assertIsNone(governor.add('b', 'high'))
+
+    def test_total_rate_change(self):
+        self.governor.add('a')
+        self.governor.add('b')
+        self.changes.clear()
+        self.governor.set_total_rate('2K')
+        self.assertEqual(sorted(self.changes), [('a', 1024), ('b', 1024)])
+        self.changes.clear()
+        self.governor.set_total_rate(None)
+        self.assertEqual(sorted(self.changes), [('a', None), ('b', None)])
+
+    def test_unknown_priority_counts_as_normal(self):
+        self.governor.add('a', 'urgent')
+        self.governor.add('b', None)
+        self.assertEqual(self.governor.rate('a'), self.governor.rate('b'))
+
+
+class TokenBucketTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch('bandwidth.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst_is_free_then_rate_limited(self):
+        bucket = TokenBucket(rate=1000)
+        bucket.consume(1000)
+        self.assertEqual(self.clock.slept, [])
+        bucket.consume(500)
+        self.assertEqual(self.clock.slept, [0.5])
+
+    def test_tokens_refill_over_time(self):
+        bucket = TokenBucket(rate=1000)
+        bucket.consume(1000)
+        self.clock.now += 0.25
+        bucket.consume(250)
+        self.assertEqual(self.clock.slept, [])
+
+    def test_sustained_rate(self):
+        bucket = TokenBucket(rate=1000)
+        start = self.clock.now
+        for _ in range(50):
+            bucket.consume(100)
+        # 5000 bytes at 1000 B/s, the first 1000 from the initial burst
+        self.assertAlmostEqual(self.clock.now - start, 4.0)
+
+    def test_unlimited_never_sleeps(self):
+        bucket = TokenBucket()
+        bucket.consume(10 ** 9)
+        bucket.set_rate(None)
+        bucket.consume(10 ** 9)
+        self.assertEqual(self.clock.slept, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from concurrency_controller import AIMDController
+
+
+class FakeScheduler:
+    """Just the scheduler surface the controller reads and tunes"""
+
+    def __init__(self, limit=2):
+        self.default_limit = limit
+        self.limits = {}
+        self.load = {}
+
+    def host_limit(self, host):
+        return self.limits.get(host, self.default_limit)
+
+    def set_host_limit(self, host, limit):
+        self.limits[host] = limit
+
+    def host_stats(self):
+        return self.load
+
+
+class AIMDControllerTest(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = FakeScheduler(limit=2)
+        self.controller = AIMDController(self.scheduler, min_limit=1, max_limit=4, interval=1, cooldown=2)
+
+    def window(self, host='a.example', received=0, successes=0, failures=(), queued=0, active=None):
+        self.controller.record_bytes(host, received)
+        for _ in range(successes):
+            self.controller.record_result(host, True)
+        for error in failures:
+            self.controller.record_result(host, False, error)
+        limit = self.scheduler.host_limit(host)
+        self.scheduler.load[host] = {'active': limit if active is None else active, 'queued': queued}
+        self.controller.evaluate()
+        return self.scheduler.host_limit(host)
+
+    def test_increases_while_jobs_wait(self):
+        self.assertEqual(self.window(received=1000, queued=3), 3)
+        self.assertEqual(self.window(received=2000, queued=3), 4)
+        decision = self.controller.decisions[0]
+        self.assertEqual((decision['from'], decision['to'], decision['reason']), (2, 3, '3 jobs waiting'))
+
+    def test_no_increase_without_waiting_jobs(self):
+        self.assertEqual(self.window(received=1000), 2)
+        self.assertEqual(self.window(received=1000, queued=2, active=1), 2)
+        self.assertEqual(list(self.controller.decisions), [])
+
+    def test_increase_without_gain_is_undone(self):
+        self.assertEqual(self.window(received=1000, queued=3), 3)
+        self.assertEqual(self.window(received=1050, queued=3), 2)
+        self.assertEqual(self.controller.decisions[-1]['reason'], 'no throughput gain')
+        # Backing off starts a cooldown before the next increase
+        self.assertEqual(self.window(received=1000, queued=3), 2)
+        self.assertEqual(self.window(received=1000, queued=3), 2)
+        self.assertEqual(self.window(received=1000, queued=3), 3)
+
+    def test_throttling_halves_the_limit(self):
+        self.scheduler.set_host_limit('a.example', 4)
+        self.assertEqual(self.window(successes=3, failures=['HTTP Error 429: Too Many Requests']), 2)
+        self.assertEqual(self.controller.decisions[-1]['throttled'], 1)
+
+    def test_majority_of_failures_halves_the_limit(self):
+        self.scheduler.set_host_limit('a.example', 4)
+        self.assertEqual(self.window(successes=1, failures=['Connection reset by peer'] * 2), 2)
+        self.assertEqual(self.controller.decisions[-1]['reason'], '2 failed jobs')
+
+    def test_single_failure_is_tolerated(self):
+        self.assertEqual(self.window(failures=['Connection reset by peer']), 2)
+
+    def test_limits_are_clamped(self):
+        self.scheduler.set_host_limit('a.example', 1)
+        self.assertEqual(self.window(failures=['HTTP Error 429']), 1)
+        self.scheduler.set_host_limit('a.example', 4)
+        self.controller._states.clear()
+        self.assertEqual(self.window(received=1000, queued=5), 4)
+        self.assertEqual(self.controller.snapshot()['hosts']['a.example']['limit'], 4)
+
+    def test_hosts_are_tuned_independently(self):
+        self.controller.record_result('b.example', False, 'HTTP Error 429')
+        self.scheduler.load['b.example'] = {'active': 2, 'queued': 0}
+        self.assertEqual(self.window('a.example', received=1000, queued=1), 3)
+        self.assertEqual(self.scheduler.host_limit('b.example'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
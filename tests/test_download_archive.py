@@ -0,0 +1,20 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from download_archive import archive_key_for_url
+
+
+class ArchiveKeyForUrlTest(unittest.TestCase):
+    def test_single_video(self):
+        self.assertEqual(archive_key_for_url('https://youtu.be/dQw4w9WgXcQ'), 'youtube dQw4w9WgXcQ')
+
+    def test_video_in_playlist_is_left_to_yt_dlp(self):
+        self.assertIsNone(archive_key_for_url('https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PL123'))
+        self.assertIsNone(archive_key_for_url('https://www.youtube.com/playlist?list=PL123'))
+
+
+if __name__ == '__main__':
+    unittest.main()
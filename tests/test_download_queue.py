@@ -0,0 +1,398 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures import Future
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from download_queue import DownloadJob, DownloadScheduler, Pending, RetryLater, SingleFlight, get_host
+from storage import DiskSpaceGuard
+
+TIMEOUT = 5
+GiB = 1024 ** 3
+
+
+def wait_until(predicate):
+    deadline = time.monotonic() + TIMEOUT
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class Recorder:
+    """Job target that records the order jobs started in and blocks until released"""
+
+    def __init__(self, block=False):
+        self.started = []
+        self.release = threading.Event()
+        if not block:
+            self.release.set()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def __call__(self, name):
+        with self._changed:
+            self.started.append(name)
+            self._changed.notify_all()
+        self.release.wait(TIMEOUT)
+        return True
+
+    def wait_started(self, count):
+        with self._changed:
+            return self._changed.wait_for(lambda: len(self.started) >= count, TIMEOUT)
+
+
+class GetHostTest(unittest.TestCase):
+    def test_aliases_share_a_host(self):
+        self.assertEqual(get_host('https://youtu.be/abc'), 'youtube.com')
+        self.assertEqual(get_host('https://www.youtube.com/watch?v=abc'), 'youtube.com')
+        self.assertEqual(get_host('https://music.youtube.com/watch?v=abc'), 'youtube.com')
+
+    def test_invalid_url(self):
+        self.assertEqual(get_host('http://[bad'), '')
+
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = None
+
+    def tearDown(self):
+        if self.scheduler is not None:
+            self.scheduler.shutdown()
+
+    def make(self, **kwargs):
+        self.scheduler = DownloadScheduler(**kwargs)
+        return self.scheduler
+
+    def submit(self, target, job_id, url, **kwargs):
+        return self.scheduler.submit(job_id, url, target, args=(job_id,), **kwargs)
+
+    def test_round_robin_across_hosts(self):
+        scheduler = self.make(max_workers=1, max_per_host=1)
+        target = Recorder()
+        scheduler.pause()
+        jobs = [self.submit(target, name, url) for name, url in [
+            ('a1', 'https://a.example/1'), ('a2', 'https://a.example/2'), ('a3', 'https://a.example/3'),
+            ('b1', 'https://b.example/1'), ('b2', 'https://b.example/2'), ('c1', 'https://c.example/1')]]
+        scheduler.resume()
+        for job in jobs:
+            self.assertTrue(job.done.wait(TIMEOUT))
+        self.assertEqual(target.started, ['a1', 'b1', 'c1', 'a2', 'b2', 'a3'])
+        self.assertTrue(all(job.status == 'completed' for job in jobs))
+
+    def test_per_host_limit(self):
+        scheduler = self.make(max_workers=4, max_per_host=2)
+        target = Recorder(block=True)
+        for n in range(4):
+            self.submit(target, f'a{n}', f'https://a.example/{n}')
+        self.submit(target, 'b0', 'https://b.example/0')
+        self.assertTrue(target.wait_started(3))
+        snapshot = scheduler.snapshot()
+        self.assertEqual(snapshot['running'], 3)
+        self.assertEqual(snapshot['hosts'], {'a.example': 2, 'b.example': 1})
+        self.assertEqual(scheduler.host_stats()['a.example'], {'active': 2, 'queued': 2, 'limit': 2})
+        target.release.set()
+
+    def test_host_limit_override(self):
+        scheduler = self.make(max_workers=4, max_per_host=2)
+        scheduler.set_host_limit('a.example', 1)
+        target = Recorder(block=True)
+        for n in range(3):
+            self.submit(target, f'a{n}', f'https://a.example/{n}')
+        self.assertTrue(target.wait_started(1))
+        self.assertEqual(scheduler.snapshot()['running'], 1)
+        scheduler.set_host_limit('a.example', None)
+        self.assertTrue(target.wait_started(2))
+        self.assertEqual(scheduler.host_limit('a.example'), 2)
+        target.release.set()
+
+    def test_max_workers(self):
+        scheduler = self.make(max_workers=2, max_per_host=10)
+        target = Recorder(block=True)
+        jobs = [self.submit(target, f'a{n}', f'https://a.example/{n}') for n in range(5)]
+        self.assertTrue(target.wait_started(2))
+        self.assertEqual(scheduler.snapshot()['queued'], 3)
+        scheduler.set_max_workers(5)
+        self.assertTrue(target.wait_started(5))
+        target.release.set()
+        for job in jobs:
+            self.assertTrue(job.done.wait(TIMEOUT))
+
+    def test_crashed_target_fails_the_job(self):
+        self.make(max_workers=1)
+
+        def crash(name):
+            raise ValueError('boom')
+
+        job = self.submit(crash, 'a', 'https://a.example/')
+        self.assertTrue(job.done.wait(TIMEOUT))
+        self.assertEqual((job.status, job.error), ('failed', 'boom'))
+        self.assertIsNone(self.scheduler.get('a'))
+
+    def test_cancel_queued_job(self):
+        scheduler = self.make(max_workers=1)
+        scheduler.pause()
+        job = self.submit(Recorder(), 'a', 'https://a.example/')
+        self.assertTrue(scheduler.cancel('a'))
+        self.assertEqual(job.status, 'cancelled')
+        self.assertTrue(job.done.is_set())
+        self.assertFalse(scheduler.cancel('a'))
+        self.assertEqual(scheduler.snapshot()['queued'], 0)
+
+    def test_retry_later_requeues_the_job(self):
+        self.make(max_workers=1)
+        calls = []
+
+        def flaky(name):
+            calls.append(name)
+            if len(calls) < 3:
+                raise RetryLater(0.01, 'HTTP Error 503')
+            return True
+
+        job = self.submit(flaky, 'a', 'https://a.example/')
+        self.assertTrue(job.done.wait(TIMEOUT))
+        self.assertEqual(len(calls), 3)
+        self.assertEqual((job.status, job.attempts), ('completed', 2))
+
+    def test_retrying_job_frees_its_slot(self):
+        scheduler = self.make(max_workers=1)
+        target = Recorder()
+
+        def throttled(name):
+            raise RetryLater(TIMEOUT * 2, 'HTTP Error 429')
+
+        retrying = self.submit(throttled, 'a', 'https://a.example/')
+        other = self.submit(target, 'b', 'https://b.example/')
+        self.assertTrue(other.done.wait(TIMEOUT))
+        self.assertEqual((retrying.status, retrying.error), ('retrying', 'HTTP Error 429'))
+        self.assertFalse(retrying.done.is_set())
+        self.assertIs(scheduler.get('a'), retrying)
+
+    def test_cancel_retrying_job(self):
+        scheduler = self.make(max_workers=1)
+        calls = []
+
+        def throttled(name):
+            calls.append(name)
+            raise RetryLater(0.2)
+
+        job = self.submit(throttled, 'a', 'https://a.example/')
+        self.assertTrue(wait_until(lambda: job.status == 'retrying'))
+        self.assertTrue(scheduler.cancel('a'))
+        self.assertTrue(job.done.wait(TIMEOUT))
+        self.assertEqual(job.status, 'cancelled')
+        self.assertIsNone(scheduler.get('a'))
+        # The back-off timer firing later must not bring the job back
+        time.sleep(0.3)
+        self.assertEqual((job.status, calls), ('cancelled', ['a']))
+
+
+class PendingTest(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = DownloadScheduler(max_workers=3, max_per_host=3, threads=1)
+        self.addCleanup(self.scheduler.shutdown)
+        self.futures = {}
+
+    def submit(self, job_id, then=None):
+        def start(name):
+            self.futures[name] = Future()
+            return Pending(self.futures[name], then)
+        return self.scheduler.submit(job_id, f'https://a.example/{job_id}', start, args=(job_id,))
+
+    def test_one_thread_drives_every_slot(self):
+        jobs = [self.submit(name) for name in 'abcd']
+        self.assertTrue(wait_until(lambda: len(self.futures) == 3))
+        self.assertEqual(self.scheduler.snapshot()['running'], 3)
+        self.assertEqual(self.scheduler.snapshot()['queued'], 1)
+        self.futures['b'].set_result(True)
+        self.assertTrue(jobs[1].done.wait(TIMEOUT))
+        self.assertEqual(jobs[1].status, 'completed')
+        self.assertTrue(wait_until(lambda: 'd' in self.futures))
+        for name in 'acd':
+            self.futures[name].set_result(False)
+        for job in jobs:
+            self.assertTrue(job.done.wait(TIMEOUT))
+        self.assertEqual([job.status for job in jobs], ['failed', 'completed', 'failed', 'failed'])
+
+    def test_then_gets_the_result(self):
+        job = self.submit('a', then=lambda result: result == 'ok')
+        self.assertTrue(wait_until(lambda: 'a' in self.futures))
+        self.futures['a'].set_result('ok')
+        self.assertTrue(job.done.wait(TIMEOUT))
+        self.assertEqual((job.status, job.result), ('completed', True))
+
+    def test_future_exception_fails_the_job(self):
+        job = self.submit('a', then=lambda result: self.fail('then called after an error'))
+        self.assertTrue(wait_until(lambda: 'a' in self.futures))
+        self.futures['a'].set_exception(ConnectionError('connection reset'))
+        self.assertTrue(job.done.wait(TIMEOUT))
+        self.assertEqual((job.status, job.error), ('failed', 'connection reset'))
+        self.assertEqual(self.scheduler.snapshot()['running'], 0)
+
+    def test_then_may_retry(self):
+        attempts = []
+
+        def then(result):
+            attempts.append(result)
+            if len(attempts) == 1:
+                raise RetryLater(0.01, 'HTTP Error 503')
+            return True
+
+        job = self.submit('a', then=then)
+        self.assertTrue(wait_until(lambda: 'a' in self.futures))
+        self.futures['a'].set_result(None)
+        self.assertTrue(wait_until(lambda: job.status == 'running' and not self.futures['a'].done()))
+        self.futures['a'].set_result(None)
+        self.assertTrue(job.done.wait(TIMEOUT))
+        self.assertEqual((job.status, job.attempts), ('completed', 1))
+
+
+class DeferredTest(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = DownloadScheduler(max_workers=1)
+        self.addCleanup(self.scheduler.shutdown)
+
+    def test_slot_is_freed_while_deferred_work_runs(self):
+        postprocessing = Future()
+        target = Recorder()
+        deferred = self.scheduler.submit('a', 'https://a.example/', lambda: postprocessing)
+        other = self.scheduler.submit('b', 'https://b.example/', target, args=('b',))
+        self.assertTrue(other.done.wait(TIMEOUT))
+        self.assertEqual(deferred.status, 'postprocessing')
+        self.assertFalse(deferred.done.is_set())
+        self.assertIs(self.scheduler.get('a'), deferred)
+        postprocessing.set_result('/library/video.mp3')
+        self.assertTrue(deferred.done.wait(TIMEOUT))
+        self.assertEqual((deferred.status, deferred.result), ('completed', '/library/video.mp3'))
+        self.assertIsNone(self.scheduler.get('a'))
+
+    def test_failed_deferred_work_fails_the_job(self):
+        postprocessing = Future()
+        job = self.scheduler.submit('a', 'https://a.example/', lambda: postprocessing)
+        self.assertTrue(wait_until(lambda: job.status == 'postprocessing'))
+        with self.assertLogs('download_queue', level='ERROR'):
+            postprocessing.set_exception(RuntimeError('Conversion failed'))
+        self.assertTrue(job.done.wait(TIMEOUT))
+        self.assertEqual((job.status, job.error), ('failed', 'Conversion failed'))
+
+
+class AdmissionTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch('storage.free_space', lambda path: 10 * GiB)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.guard = DiskSpaceGuard(['/downloads'], min_free=GiB)
+        self.rejected = []
+        self.scheduler = DownloadScheduler(max_workers=4, max_per_host=4, admission=self.guard,
+                                           admission_interval=0.05, on_reject=self.rejected.append)
+        self.addCleanup(self.scheduler.shutdown)
+        self.target = Recorder(block=True)
+        self.addCleanup(self.target.release.set)
+
+    def submit(self, job_id, size, target=None):
+        return self.scheduler.submit(job_id, f'https://a.example/{job_id}', target or self.target,
+                                     args=(job_id,), size=size)
+
+    def test_job_is_held_until_space_is_released(self):
+        self.submit('a', 6 * GiB)
+        self.assertTrue(self.target.wait_started(1))
+        with self.assertLogs('storage', level='WARNING'):
+            held = self.submit('b', 6 * GiB)
+            self.assertTrue(wait_until(lambda: self.guard.snapshot()['waiting'] == 1))
+        self.assertEqual(held.status, 'queued')
+        self.target.release.set()
+        self.assertTrue(held.done.wait(TIMEOUT))
+        self.assertEqual(self.target.started, ['a', 'b'])
+        self.assertEqual(self.guard.snapshot()['reserved'], 0)
+
+    def test_smaller_jobs_pass_a_held_one(self):
+        self.submit('a', 6 * GiB)
+        self.assertTrue(self.target.wait_started(1))
+        with self.assertLogs('storage', level='WARNING'):
+            held = self.submit('b', 6 * GiB)
+            self.submit('c', GiB)
+            self.assertTrue(self.target.wait_started(2))
+        self.assertEqual(self.target.started, ['a', 'c'])
+        self.assertEqual(held.status, 'queued')
+
+    def test_job_that_can_never_fit_is_rejected(self):
+        job = self.submit('a', 20 * GiB)
+        self.assertTrue(job.done.wait(TIMEOUT))
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('GiB needed', job.error)
+        self.assertEqual(self.rejected, [job])
+        self.assertEqual(self.target.started, [])
+        self.assertIsNone(self.scheduler.get('a'))
+
+    def test_reservation_lasts_until_deferred_work_finishes(self):
+        postprocessing = Future()
+        job = self.submit('a', 4 * GiB, target=lambda name: postprocessing)
+        self.assertTrue(wait_until(lambda: job.status == 'postprocessing'))
+        self.assertEqual(self.scheduler.snapshot()['running'], 0)
+        self.assertEqual(self.guard.snapshot()['reserved'], 4 * GiB)
+        postprocessing.set_result(True)
+        self.assertTrue(job.done.wait(TIMEOUT))
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual(self.guard.snapshot()['reserved'], 0)
+
+    def test_cancelled_job_gives_back_its_reservation(self):
+        self.scheduler.pause()
+        self.assertTrue(self.guard.admit('a', 4 * GiB))
+        self.submit('a', 4 * GiB)
+        self.assertTrue(self.scheduler.cancel('a'))
+        self.assertEqual(self.guard.snapshot()['reserved'], 0)
+
+
+class SingleFlightTest(unittest.TestCase):
+    def setUp(self):
+        self.flights = SingleFlight()
+        self.started = []
+
+    def start(self, job_id):
+        def start():
+            self.started.append(job_id)
+            return DownloadJob(job_id, 'https://example.com/v', None)
+        return start
+
+    def test_identical_submissions_share_a_job(self):
+        job, joined = self.flights.join('key', self.start('a'), ('client1', 'room1'))
+        self.assertFalse(joined)
+        same, joined = self.flights.join('key', self.start('b'), ('client2', 'room2'))
+        self.assertTrue(joined)
+        self.assertIs(same, job)
+        self.assertEqual(self.started, ['a'])
+        # The first submitter owns the job; only later ones follow it
+        self.assertEqual(self.flights.followers('a'), [('client2', 'room2')])
+
+    def test_release_returns_followers_and_frees_the_key(self):
+        self.flights.join('key', self.start('a'))
+        self.flights.join('key', self.start('b'), ('client2', 'room2'))
+        self.assertEqual(self.flights.release('a'), [('client2', 'room2')])
+        self.assertEqual(self.flights.release('a'), [])
+        job, joined = self.flights.join('key', self.start('c'))
+        self.assertFalse(joined)
+        self.assertEqual(job.id, 'c')
+
+    def test_different_keys_run_separately(self):
+        self.flights.join('video-best', self.start('a'))
+        job, joined = self.flights.join('video-mp3', self.start('b'))
+        self.assertFalse(joined)
+        self.assertEqual(self.started, ['a', 'b'])
+
+    def test_failed_start_registers_nothing(self):
+        def start():
+            raise RuntimeError('job store unavailable')
+
+        with self.assertRaises(RuntimeError):
+            self.flights.join('key', start)
+        job, joined = self.flights.join('key', self.start('a'))
+        self.assertFalse(joined)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from job_events import JobEventLog
+
+
+class JobEventLogTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('job_events.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.log = JobEventLog(size=4, retention=60, idle_timeout=600)
+        self.log.open('a')
+
+    def test_replay_after_a_sequence_number(self):
+        for status in ('Queued', 'Starting', 'Downloading'):
+            self.log.publish('a', {'status': status})
+        events, finished = self.log.read('a')
+        self.assertEqual(events, [(1, {'status': 'Queued'}), (2, {'status': 'Starting'}),
+                                  (3, {'status': 'Downloading'})])
+        self.assertFalse(finished)
+        self.assertEqual(self.log.read('a', after=2), ([(3, {'status': 'Downloading'})], False))
+        self.assertEqual(self.log.read('a', after=3), ([], False))
+
+    def test_progress_updates_are_coalesced(self):
+        self.log.publish('a', {'status': 'Starting'})
+        for progress in range(10):
+            seq = self.log.publish('a', {'status': 'Downloading', 'progress': progress}, coalesce=True)
+        self.assertEqual(seq, 11)
+        events, _ = self.log.read('a')
+        # The reader sees the newest progress under its newest number; the marker stays internal
+        self.assertEqual(events, [(1, {'status': 'Starting'}), (11, {'status': 'Downloading', 'progress': 9})])
+        self.log.publish('a', {'status': 'Processing'})
+        self.log.publish('a', {'status': 'Downloading', 'progress': 100}, coalesce=True)
+        self.assertEqual(len(self.log.read('a')[0]), 4)
+
+    def test_buffer_keeps_the_newest_events(self):
+        for n in range(10):
+            self.log.publish('a', {'n': n})
+        self.assertEqual([seq for seq, _ in self.log.read('a')[0]], [7, 8, 9, 10])
+
+    def test_closed_log_is_replayed_then_expires(self):
+        self.log.publish('a', {'status': 'Downloading'})
+        self.log.close('a', {'status': 'Completed'})
+        self.assertIsNone(self.log.publish('a', {'status': 'Downloading'}))
+        events, finished = self.log.read('a', after=1)
+        self.assertEqual((events, finished), ([(2, {'status': 'Completed'})], True))
+        self.now += 61
+        self.log.open('b')
+        self.assertNotIn('a', self.log)
+        self.assertEqual(self.log.read('a'), (None, True))
+
+    def test_idle_unclosed_log_expires(self):
+        self.log.open('b')
+        self.now += 500
+        self.log.publish('b', {'status': 'Downloading'})
+        self.now += 200
+        self.log.open('c')
+        self.assertNotIn('a', self.log)
+        self.assertIn('b', self.log)
+
+    def test_unknown_job(self):
+        self.assertEqual(self.log.read('missing'), (None, True))
+        self.assertIsNone(self.log.publish('missing', {'status': 'Downloading'}))
+        self.log.close('missing')
+        self.assertNotIn('missing', self.log)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from job_store import JobStore
+
+
+class JobStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'jobs.db')
+        self.stores = []
+
+    def tearDown(self):
+        for store in self.stores:
+            store.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def open(self):
+        # Long flush interval: tests flush explicitly, the background thread stays idle
+        store = JobStore(self.path, flush_interval=60)
+        self.stores.append(store)
+        return store
+
+    def rows(self):
+        with sqlite3.connect(self.path) as conn:
+            return dict(conn.execute('SELECT id, status FROM jobs'))
+
+    def test_unfinished_jobs_are_recovered(self):
+        store = self.open()
+        store.add('a', 'https://example.com/a', quality='best', options={'format_code': 'best'}, client_id='c1')
+        store.add('b', 'https://example.com/b')
+        store.add('c', 'https://example.com/c')
+        store.update('a', status='running', progress=42.0, attempts=1)
+        store.update('b', status='completed', progress=100.0)
+        store.update('c', status='paused')
+        store.close()
+
+        recovered = self.open()
+        self.assertEqual([job['id'] for job in recovered.active()], ['a', 'c'])
+        job = recovered.get('a')
+        self.assertEqual((job['status'], job['progress'], job['attempts']), ('running', 42.0, 1))
+        self.assertEqual(job['options'], {'format_code': 'best'})
+        self.assertEqual(job['client_id'], 'c1')
+        self.assertEqual(recovered.stats(), {'total': 3, 'completed': 1, 'failed': 0, 'active': 2})
+
+    def test_nothing_is_written_before_a_flush(self):
+        store = self.open()
+        store.add('a', 'https://example.com/a')
+        self.assertEqual(self.rows(), {})
+        store.flush()
+        self.assertEqual(self.rows(), {'a': 'queued'})
+
+    def test_updates_are_coalesced(self):
+        store = self.open()
+        store.add('a', 'https://example.com/a')
+        for progress in range(100):
+            store.update('a', status='running', progress=float(progress))
+        self.assertEqual(len(store._dirty), 1)
+        store.flush()
+        self.assertEqual(store._dirty, {})
+        self.assertEqual(self.rows(), {'a': 'running'})
+
+    def test_terminal_status_retires_the_job(self):
+        store = self.open()
+        store.add('a', 'https://example.com/a')
+        self.assertTrue(store.update('a', status='failed', error='HTTP Error 404'))
+        self.assertIsNone(store.get('a'))
+        self.assertFalse(store.update('a', progress=50.0))
+        store.flush()
+        self.assertEqual(self.rows(), {'a': 'failed'})
+
+    def test_clear_finished(self):
+        store = self.open()
+        store.add('a', 'https://example.com/a')
+        store.add('b', 'https://example.com/b')
+        store.update('a', status='completed')
+        store.clear_finished()
+        self.assertEqual(self.rows(), {'b': 'queued'})
+        self.assertEqual(store.stats()['total'], 1)
+
+    def test_failed_write_is_logged_not_raised(self):
+        store = self.open()
+        store.add('a', 'https://example.com/a')
+        store._conn.execute('DROP TABLE jobs')
+        with self.assertLogs('job_store', level='ERROR'):
+            store.flush()
+        self.assertEqual(store.get('a')['status'], 'queued')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metadata_cache import normalize_url, is_single_video
+
+
+class NormalizeUrlTest(unittest.TestCase):
+    def test_video_variants_share_a_key(self):
+        key = normalize_url('https://www.youtube.com/watch?v=dQw4w9WgXcQ')
+        self.assertEqual(key, 'youtube:dQw4w9WgXcQ')
+        self.assertEqual(normalize_url('https://youtu.be/dQw4w9WgXcQ?si=abc'), key)
+        self.assertEqual(normalize_url('https://m.youtube.com/watch?v=dQw4w9WgXcQ&feature=share'), key)
+
+    def test_watch_url_with_playlist_keeps_the_list(self):
+        video = normalize_url('https://www.youtube.com/watch?v=dQw4w9WgXcQ')
+        in_playlist = normalize_url('https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PL123')
+        self.assertNotEqual(in_playlist, video)
+        self.assertIn('PL123', in_playlist)
+        self.assertEqual(normalize_url('https://youtu.be/dQw4w9WgXcQ?list=PL123'), in_playlist)
+
+    def test_playlist_url(self):
+        self.assertEqual(normalize_url('https://www.youtube.com/playlist?list=PL123'), 'youtube:playlist:PL123')
+
+
+class IsSingleVideoTest(unittest.TestCase):
+    info = {'_type': 'video', 'id': 'dQw4w9WgXcQ', 'formats': [{'url': 'https://example.com/v.mp4'}]}
+
+    def test_full_video_info(self):
+        self.assertTrue(is_single_video('https://youtu.be/dQw4w9WgXcQ', self.info))
+
+    def test_playlist_url_never_reuses_video_info(self):
+        self.assertFalse(is_single_video('https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PL123', self.info))
+
+    def test_flat_entry(self):
+        self.assertFalse(is_single_video('https://youtu.be/dQw4w9WgXcQ', {'_type': 'url', 'id': 'dQw4w9WgXcQ'}))
+
+
+if __name__ == '__main__':
+    unittest.main()
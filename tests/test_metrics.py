@@ -0,0 +1,74 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import MetricsRegistry
+
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def lines(self):
+        return self.registry.render().splitlines()
+
+    def test_counter(self):
+        counter = self.registry.counter('jobs_total', 'Jobs', ['status'])
+        counter.inc(status='completed')
+        counter.inc(2, status='completed')
+        counter.inc(status='failed')
+        self.assertEqual(self.lines(), [
+            '# HELP jobs_total Jobs',
+            '# TYPE jobs_total counter',
+            'jobs_total{status="completed"} 3',
+            'jobs_total{status="failed"} 1'
+        ])
+
+    def test_gauge(self):
+        gauge = self.registry.gauge('busy', 'Busy processes', ['kind'])
+        gauge.inc(kind='download')
+        gauge.inc(kind='download')
+        gauge.dec(kind='download')
+        gauge.set(0.5, kind='ffmpeg')
+        self.assertEqual(self.lines()[2:], ['busy{kind="download"} 1', 'busy{kind="ffmpeg"} 0.5'])
+
+    def test_gauge_function_is_read_at_render(self):
+        queue = []
+        self.registry.gauge('queued', 'Queued jobs', function=lambda: len(queue))
+        queue.extend('abc')
+        self.assertEqual(self.lines()[2:], ['queued 3'])
+
+    def test_histogram(self):
+        histogram = self.registry.histogram('wait_seconds', 'Wait', buckets=(1, 5))
+        for value in (0.5, 1, 3, 10):
+            histogram.observe(value)
+        self.assertEqual(self.lines()[2:], [
+            'wait_seconds_bucket{le="1"} 2',
+            'wait_seconds_bucket{le="5"} 3',
+            'wait_seconds_bucket{le="+Inf"} 4',
+            'wait_seconds_sum 14.5',
+            'wait_seconds_count 4'
+        ])
+
+    def test_label_values_are_escaped(self):
+        counter = self.registry.counter('errors_total', 'Errors', ['kind'])
+        counter.inc(kind='say "hi"\n')
+        self.assertEqual(self.lines()[2], 'errors_total{kind="say \\"hi\\"\\n"} 1')
+
+    def test_wrong_labels(self):
+        counter = self.registry.counter('jobs_total', 'Jobs', ['status'])
+        with self.assertRaises(ValueError):
+            counter.inc(kind='completed')
+        with self.assertRaises(ValueError):
+            counter.inc()
+
+    def test_duplicate_name(self):
+        self.registry.counter('jobs_total', 'Jobs')
+        with self.assertRaises(ValueError):
+            self.registry.gauge('jobs_total', 'Jobs')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from progress_emitter import ProgressEmitter
+
+
+class Frames:
+    def __init__(self):
+        self.frames = []
+        self.arrived = threading.Event()
+
+    def __call__(self, event, data, room):
+        self.frames.append((event, room, data['updates']))
+        self.arrived.set()
+
+
+class ProgressEmitterTest(unittest.TestCase):
+    def make(self, interval=60):
+        # A long interval keeps the background tick out of the way unless a test waits for it
+        frames = Frames()
+        emitter = ProgressEmitter(frames, interval=interval)
+        self.addCleanup(emitter.stop)
+        return emitter, frames
+
+    def test_updates_coalesce_into_latest_state(self):
+        emitter, frames = self.make()
+        emitter.update('a', {'status': 'Downloading', 'progress': 10.0}, 'room1')
+        emitter.update('a', {'progress': 20.0, 'speed': 1000}, 'room1')
+        emitter.flush('room1')
+        self.assertEqual(frames.frames, [('progress_batch', 'room1', [
+            {'id': 'a', 'status': 'Downloading', 'progress': 20.0, 'speed': 1000}])])
+
+    def test_one_frame_per_room(self):
+        emitter, frames = self.make()
+        emitter.update('a', {'progress': 1.0}, 'room1')
+        emitter.update('b', {'progress': 2.0}, 'room1')
+        emitter.update('c', {'progress': 3.0}, 'room2')
+        emitter.flush('room1')
+        emitter.flush('room2')
+        self.assertEqual([(room, [job['id'] for job in jobs]) for _, room, jobs in frames.frames],
+                         [('room1', ['a', 'b']), ('room2', ['c'])])
+
+    def test_terminal_status_is_sent_at_once(self):
+        emitter, frames = self.make()
+        emitter.update('a', {'status': 'Downloading', 'progress': 50.0}, 'room1')
+        self.assertEqual(frames.frames, [])
+        emitter.update('a', {'status': 'Completed', 'progress': 100.0}, 'room1')
+        self.assertEqual(frames.frames, [('progress_batch', 'room1', [
+            {'id': 'a', 'status': 'Completed', 'progress': 100.0}])])
+
+    def test_tick_sends_pending_updates(self):
+        emitter, frames = self.make(interval=0.05)
+        emitter.update('a', {'progress': 5.0}, 'room1')
+        self.assertTrue(frames.arrived.wait(5))
+        self.assertEqual(frames.frames[0][2], [{'id': 'a', 'progress': 5.0}])
+
+    def test_emit_failure_is_contained(self):
+        def broken(event, data, room):
+            raise ConnectionError('client gone')
+
+        emitter = ProgressEmitter(broken, interval=60)
+        self.addCleanup(emitter.stop)
+        emitter.update('a', {'status': 'Error'}, 'room1')
+        emitter.flush('room1')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from progress_parser import parse_progress_line
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'data')
+
+
+class ParseProgressLineTest(unittest.TestCase):
+    def test_downloading(self):
+        self.assertEqual(parse_progress_line('[progress] downloading 5242880 20971520 NA 1048576.5 15\n'), {
+            'status': 'Downloading',
+            'progress': 25.0,
+            'downloaded_bytes': 5242880,
+            'total_bytes': 20971520,
+            'speed': 1048576.5,
+            'eta': 15
+        })
+
+    def test_estimated_total(self):
+        progress = parse_progress_line('[progress] downloading 1000 NA 4000.0 NA NA')
+        self.assertEqual(progress['total_bytes'], 4000)
+        self.assertEqual(progress['progress'], 25.0)
+        self.assertIsNone(progress['speed'])
+        self.assertIsNone(progress['eta'])
+
+    def test_unknown_total(self):
+        progress = parse_progress_line('[progress] downloading 1000 NA NA 250.0 NA')
+        self.assertIsNone(progress['total_bytes'])
+        self.assertEqual(progress['progress'], 0.0)
+
+    def test_finished_is_processing(self):
+        progress = parse_progress_line('[progress] finished 20971520 20971520 NA NA NA')
+        self.assertEqual(progress['status'], 'Processing')
+        self.assertEqual(progress['progress'], 100.0)
+
+    def test_scientific_speed(self):
+        self.assertEqual(parse_progress_line('[progress] downloading 1 2 NA 1.5e+06 1')['speed'], 1.5e6)
+
+    def test_other_output(self):
+        for line in ['[download] Destination: video.mp4', 'ERROR: Private video', '',
+                     '[download]  45.2% of 10.00MiB at  1.00MiB/s ETA 00:05', '[progress] downloading']:
+            self.assertIsNone(parse_progress_line(line), line)
+
+    def test_benchmark_sample(self):
+        with open(os.path.join(DATA_DIR, 'progress_template.log'), encoding='utf-8') as f:
+            parsed = [progress for progress in map(parse_progress_line, f) if progress]
+        self.assertTrue(parsed)
+        for progress in parsed:
+            self.assertIn(progress['status'], ('Downloading', 'Processing'))
+            self.assertTrue(0.0 <= progress['progress'] <= 100.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
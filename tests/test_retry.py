@@ -0,0 +1,67 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from retry import RetryPolicy, classify_failure
+
+
+class ClassifyFailureTest(unittest.TestCase):
+    def test_kinds(self):
+        for error, kind in [
+            ('ERROR: unable to download video data: HTTP Error 429: Too Many Requests', 'throttled'),
+            ('ERROR: [youtube] abc: Private video. Sign in if you have been granted access', 'extractor'),
+            ('ERROR: Unsupported URL: https://example.com/', 'extractor'),
+            ('ERROR: Postprocessing: Conversion failed!', 'ffmpeg'),
+            ('ERROR: Unable to download webpage: <urlopen error [Errno 110] Connection timed out>', 'network'),
+            ('ERROR: unable to download video data: HTTP Error 503: Service Unavailable', 'network'),
+            ('Something unexpected', 'unknown'),
+        ]:
+            self.assertEqual(classify_failure(error), kind, error)
+
+    def test_throttling_wins_over_network(self):
+        # "Unable to download" alone would read as a network error
+        self.assertEqual(classify_failure('Unable to download: HTTP Error 429'), 'throttled')
+
+    def test_no_error(self):
+        self.assertEqual(classify_failure(None), 'unknown')
+        self.assertEqual(classify_failure(''), 'unknown')
+
+
+class RetryPolicyTest(unittest.TestCase):
+    def setUp(self):
+        self.policy = RetryPolicy(max_attempts=3, base_delay=2.0, max_delay=60.0)
+
+    def test_network_and_throttling_retry_up_to_max_attempts(self):
+        for kind in ('network', 'throttled'):
+            self.assertEqual([self.policy.should_retry(kind, attempt) for attempt in range(4)],
+                             [True, True, True, False], kind)
+
+    def test_ffmpeg_and_unknown_retry_once(self):
+        for kind in ('ffmpeg', 'unknown'):
+            self.assertTrue(self.policy.should_retry(kind, 0))
+            self.assertFalse(self.policy.should_retry(kind, 1))
+
+    def test_extractor_errors_are_final(self):
+        self.assertFalse(self.policy.should_retry('extractor', 0))
+
+    def test_no_retries(self):
+        policy = RetryPolicy(max_attempts=0)
+        self.assertFalse(policy.should_retry('network', 0))
+        self.assertFalse(policy.should_retry('unknown', 0))
+
+    def test_delay_backs_off_exponentially(self):
+        for attempt, ceiling in [(0, 2.0), (1, 4.0), (3, 16.0)]:
+            for _ in range(20):
+                delay = self.policy.delay('network', attempt)
+                self.assertTrue(ceiling / 2 <= delay <= ceiling, (attempt, delay))
+
+    def test_throttled_waits_longer_and_delay_is_capped(self):
+        for _ in range(20):
+            self.assertTrue(4.0 <= self.policy.delay('throttled', 0) <= 8.0)
+            self.assertTrue(30.0 <= self.policy.delay('network', 10) <= 60.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import errno
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage
+from storage import DiskSpaceGuard, InsufficientSpace, expected_size, move_into
+
+GiB = 1024 ** 3
+
+
+class ExpectedSizeTest(unittest.TestCase):
+    def test_sizes(self):
+        self.assertEqual(expected_size({'filesize': 100}), 100)
+        self.assertEqual(expected_size({'filesize_approx': 99.5}), 99)
+        self.assertEqual(expected_size({'requested_formats': [{'filesize': 70}, {'filesize_approx': 30}]}), 100)
+
+    def test_unknown(self):
+        self.assertIsNone(expected_size({}))
+        self.assertIsNone(expected_size({'requested_formats': [{'filesize': 70}, {}]}))
+
+
+class MoveIntoTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.source = os.path.join(self.directory, 'scratch', 'video.mp4')
+        os.makedirs(os.path.dirname(self.source))
+        with open(self.source, 'wb') as f:
+            f.write(b'data')
+        self.library = os.path.join(self.directory, 'library')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def assertMoved(self, target):
+        self.assertEqual(target, os.path.join(self.library, 'video.mp4'))
+        self.assertFalse(os.path.exists(self.source))
+        with open(target, 'rb') as f:
+            self.assertEqual(f.read(), b'data')
+        self.assertEqual(os.listdir(self.library), ['video.mp4'])
+
+    def test_same_filesystem(self):
+        self.assertMoved(move_into(self.source, self.library))
+
+    def test_across_filesystems(self):
+        replace = os.replace
+
+        def cross_device(src, dst):
+            if src == self.source:
+                raise OSError(errno.EXDEV, 'Invalid cross-device link')
+            return replace(src, dst)
+
+        with mock.patch('storage.os.replace', cross_device):
+            self.assertMoved(move_into(self.source, self.library))
+
+    def test_failed_copy_leaves_no_partial_file(self):
+        with mock.patch('storage.os.replace', side_effect=OSError(errno.EXDEV, 'Invalid cross-device link')), \
+                mock.patch('storage.shutil.copystat', side_effect=OSError(errno.ENOSPC, 'No space left')):
+            with self.assertRaises(OSError):
+                move_into(self.source, self.library)
+        self.assertTrue(os.path.exists(self.source))
+        self.assertEqual(os.listdir(self.library), [])
+
+
+class DiskSpaceGuardTest(unittest.TestCase):
+    def setUp(self):
+        self.free = {'/scratch': 10 * GiB, '/library': 10 * GiB}
+        patcher = mock.patch('storage.free_space', lambda path: self.free[path])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.guard = DiskSpaceGuard(['/scratch', '/library', '/scratch', ''], min_free=GiB)
+
+    def test_directories_are_deduplicated(self):
+        self.assertEqual(self.guard.directories, ['/scratch', '/library'])
+
+    def test_reservations_add_up(self):
+        self.assertTrue(self.guard.admit('a', 4 * GiB))
+        self.assertTrue(self.guard.admit('b', 4 * GiB))
+        with self.assertLogs('storage', level='WARNING'):
+            self.assertFalse(self.guard.admit('c', 2 * GiB))
+        self.assertEqual(self.guard.snapshot()['waiting'], 1)
+        self.guard.release('a')
+        self.assertTrue(self.guard.admit('c', 2 * GiB))
+        self.assertEqual(self.guard.snapshot()['reserved'], 6 * GiB)
+        self.assertEqual(self.guard.snapshot()['waiting'], 0)
+
+    def test_admitting_twice_reserves_once(self):
+        self.assertTrue(self.guard.admit('a', 8 * GiB))
+        self.assertTrue(self.guard.admit('a', 8 * GiB))
+        self.assertEqual(self.guard.snapshot()['reserved'], 8 * GiB)
+
+    def test_every_directory_must_fit(self):
+        self.free['/library'] = 3 * GiB
+        self.assertTrue(self.guard.admit('a', GiB))
+        self.assertFalse(self.guard.admit('b', 2 * GiB))
+
+    def test_unknown_size_only_needs_headroom(self):
+        self.free['/scratch'] = GiB
+        self.assertTrue(self.guard.admit('a'))
+
+    def test_job_that_can_never_fit(self):
+        with self.assertRaises(InsufficientSpace):
+            self.guard.admit('a', 20 * GiB)
+        self.assertEqual(self.guard.snapshot()['reserved'], 0)
+
+    def test_set_directories(self):
+        self.free['/new'] = 2 * GiB
+        self.guard.set_directories(['/new'])
+        with self.assertRaises(InsufficientSpace):
+            self.guard.admit('a', 4 * GiB)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional for the web server; originals are served unresized
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZES = {'small': (160, 90), 'medium': (320, 180)}
+
+SAFE_ID_RE = re.compile(r'[^A-Za-z0-9_-]')
+
+
+def thumbnail_id(video_id=None, url=None):
+    """Stable cache id for a video's thumbnail: its video id, or a hash of the thumbnail URL"""
+    if video_id:
+        return SAFE_ID_RE.sub('_', str(video_id))[:64]
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]
+
+
+def _sniff_mimetype(data):
+    if data.startswith(b'\x89PNG'):
+        return 'image/png'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'image/jpeg'
+
+
+class ThumbnailCache:
+    """On-disk cache of thumbnails, fetched once and stored pre-resized per size.
+
+    Each thumbnail id maps to a remote URL (registered as metadata is
+    extracted). The original is downloaded once through a pooled session and
+    every requested size is cut from it and kept as its own file, so
+    repeated playlist views are served straight from disk.
+    """
+
+    def __init__(self, directory='thumbnail_cache', max_files=20000, max_urls=50000, pool_size=16):
+        self.directory = directory
+        self.max_files = max_files
+        self.max_urls = max_urls
+        os.makedirs(directory, exist_ok=True)
+        self._urls = OrderedDict()  # thumbnail id -> remote URL, LRU bounded
+        self._urls_lock = threading.Lock()
+        # Concurrent requests for the same thumbnail wait for one fetch
+        self._locks = [threading.Lock() for _ in range(64)]
+        self._writes = 0
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def register(self, thumb_id, url):
+        if not url:
+            return
+        with self._urls_lock:
+            self._urls[thumb_id] = url
+            self._urls.move_to_end(thumb_id)
+            while len(self._urls) > self.max_urls:
+                self._urls.popitem(last=False)
+
+    def get(self, thumb_id, size='medium', url=None):
+        """Return (path, mimetype) of the thumbnail at size, fetching it if needed.
+
+        Raises KeyError for an id that was never registered and isn't on disk.
+        """
+        if url:
+            self.register(thumb_id, url)
+        variant = self._path(thumb_id, size)
+        if os.path.exists(variant):
+            return variant, self._mimetype(variant)
+
+        with self._locks[hash(thumb_id) % len(self._locks)]:
+            if os.path.exists(variant):
+                return variant, self._mimetype(variant)
+            original = self._path(thumb_id, 'orig')
+            if os.path.exists(original):
+                with open(original, 'rb') as f:
+                    data = f.read()
+            else:
+                data = self._fetch(thumb_id)
+                self._write(original, data)
+            self._write(variant, self._resize(data, THUMBNAIL_SIZES[size]))
+        self._maybe_prune()
+        return variant, self._mimetype(variant)
+
+    def _fetch(self, thumb_id):
+        with self._urls_lock:
+            url = self._urls.get(thumb_id)
+        if url is None:
+            raise KeyError(thumb_id)
+        response = self.session.get(url, timeout=10)
+        response.raise_for_status()
+        return response.content
+
+    def _resize(self, data, size):
+        if Image is None:
+            return data
+        image = Image.open(BytesIO(data)).convert('RGB')
+        # Crop to the target aspect ratio instead of squashing letterboxed thumbnails
+        image = ImageOps.fit(image, size, Image.LANCZOS)
+        out = BytesIO()
+        image.save(out, 'JPEG', quality=85, optimize=True)
+        return out.getvalue()
+
+    def _mimetype(self, path):
+        if Image is not None:
+            return 'image/jpeg'
+        with open(path, 'rb') as f:
+            return _sniff_mimetype(f.read(12))
+
+    def _path(self, thumb_id, size):
+        # Two-level fan-out keeps directories small for big libraries
+        subdir = hashlib.sha1(thumb_id.encode('utf-8')).hexdigest()[:2]
+        return os.path.join(self.directory, subdir, f'{thumb_id}.{size}')
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._writes += 1
+
+    def _maybe_prune(self):
+        if self._writes < 500:
+            return
+        self._writes = 0
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    files.append((os.path.getmtime(path), path))
+                except OSError:
+                    continue
+        if len(files) <= self.max_files:
+            return
+        files.sort()
+        for _, path in files[:len(files) - self.max_files]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        logger.info(f"Pruned {len(files) - self.max_files} cached thumbnails")
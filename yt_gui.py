@@ -2,7 +2,6 @@ import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, scrolledtext
 from PIL import Image, ImageTk
 import requests
-from io import BytesIO
 import threading
 import yt_dlp
 import os
@@ -14,13 +13,29 @@ import sys
 import queue
 from urllib.parse import urlparse
 import re
+import shutil
+import uuid
 import webbrowser
+from collections import deque
+from concurrent.futures import Future
+
+from config_manager import ConfigManager
+from metadata_cache import MetadataCache, is_single_video, info_expired
+from download_archive import DownloadArchive
+from bandwidth import BandwidthGovernor
+from retry import RetryPolicy, classify_failure
+from thumbnail_cache import ThumbnailCache, thumbnail_id
+from storage import DiskSpaceGuard, expected_size, move_into
+from download_queue import DownloadScheduler, RetryLater
+from postprocess import PostProcessPool, extract_audio
 
 
 class DownloadManager:
     def __init__(self):
-        self.download_queue = []
-        self.active_downloads = {}
+        # Items waiting for Start; handed to the scheduler once started
+        self.download_queue = deque()
+        self.active_downloads = {}  # item id -> item submitted to the scheduler
+        self.lock = threading.Lock()
         self.history = []
         self.settings = self.load_settings()
         
@@ -51,6 +66,57 @@ class DownloadManager:
         })
 
 
+class PagedTree:
+    """Keeps a Treeview in step with a list of items, one page at a time.
+
+    Rows have stable ids, so a refresh only inserts, deletes or rewrites the
+    rows that changed, and only the current page is ever in the widget.
+    """
+
+    def __init__(self, tree, page_size=200):
+        self.tree = tree
+        self.page_size = max(1, int(page_size))
+        self.page = 0
+        self.total = 0
+        self.label = None
+        self._rendered = {}  # iid -> values currently shown
+
+    def turn(self, delta):
+        self.page = max(0, self.page + delta)
+
+    def show(self, items, row):
+        """Display items; row(item) returns its (iid, values)"""
+        self.total = len(items)
+        pages = max(1, -(-self.total // self.page_size))
+        self.page = min(self.page, pages - 1)
+        start = self.page * self.page_size
+        rows = [row(item) for item in items[start:start + self.page_size]]
+
+        wanted = {iid for iid, _ in rows}
+        stale = [iid for iid in self._rendered if iid not in wanted]
+        if stale:
+            self.tree.delete(*stale)
+            for iid in stale:
+                del self._rendered[iid]
+        for index, (iid, values) in enumerate(rows):
+            if iid not in self._rendered:
+                self.tree.insert('', index, iid=iid, values=values)
+            elif self._rendered[iid] != values:
+                self.tree.item(iid, values=values)
+            self._rendered[iid] = values
+        order = tuple(iid for iid, _ in rows)
+        if self.tree.get_children() != order:
+            for index, iid in enumerate(order):
+                self.tree.move(iid, '', index)
+
+        if self.label is not None:
+            if self.total:
+                end = min(start + self.page_size, self.total)
+                self.label.config(text=f"{start + 1}-{end} of {self.total}")
+            else:
+                self.label.config(text="No items")
+
+
 class YouTubeDownloaderApp:
     def __init__(self, root):
         self.root = root
@@ -73,8 +139,58 @@ class YouTubeDownloaderApp:
         self.root.configure(bg=self.colors['bg'])
         
         self.download_manager = DownloadManager()
+        self.config = ConfigManager()
+        self.metadata_cache = MetadataCache(
+            path=self.config.get('metadata_cache_path', 'metadata_cache.db'),
+            ttl=self.config.get('metadata_cache_ttl', 3600),
+            max_entries=self.config.get('metadata_cache_max_entries', 5000)
+        )
+        # Same yt-dlp archive file as the web app, so neither re-downloads the other's videos
+        archive_path = self.config.get('download_archive')
+        self.download_archive = DownloadArchive(archive_path) if archive_path else None
+        # Downloads wait while the scratch or download disk is short of space
+        self.disk_guard = None
+        if self.config.get('disk_admission', True):
+            self.disk_guard = DiskSpaceGuard(
+                [self.config.get('temp_directory'), self.download_manager.settings['download_path']],
+                min_free=self.config.get('min_free_space', 1024 ** 3))
+        self.thumbnail_cache = ThumbnailCache(
+            directory=self.config.get('thumbnail_cache_dir', 'thumbnail_cache'),
+            max_files=self.config.get('thumbnail_cache_max_files', 20000)
+        )
+        self.retry_policy = RetryPolicy(
+            max_attempts=self.config.get('retry_attempts', 3),
+            base_delay=self.config.get('retry_base_delay', 2),
+            max_delay=self.config.get('retry_max_delay', 300)
+        )
+        # Started items run on a fixed pool of workers, round-robin across hosts
+        # Items only start while the disks they write to have room for them
+        self.scheduler = DownloadScheduler(
+            max_workers=self.config.get('max_concurrent_downloads', 3),
+            max_per_host=self.config.get('max_concurrent_per_host', 2),
+            admission=self.disk_guard,
+            on_reject=self.reject_queue_item
+        )
+        # rate_limit is one budget shared by every running download, as in the web app
+        self.bandwidth = BandwidthGovernor(
+            total_rate=self.config.get('rate_limit'),
+            weights=self.config.get('bandwidth_weights'),
+            on_change=self.apply_rate
+        )
+        self._transfer_params = {}  # item id -> params of the YoutubeDL transferring it
+        # MP3 conversions run here, after the item has given its download slot back
+        self.ffmpeg_path = shutil.which('ffmpeg')
+        self.postprocessor = None
+        if self.ffmpeg_path and self.config.get('separate_postprocessing', True):
+            self.postprocessor = PostProcessPool(workers=self.config.get('postprocess_workers'))
         self.clipboard_content = ""
         
+        self._queue_refresh_pending = False
+        
+        # Cleared while downloads are paused; progress hooks block on it
+        self.downloads_resumed = threading.Event()
+        self.downloads_resumed.set()
+        
         # Download tracking
         self.download_queue = []
         self.current_downloads = {}
@@ -383,6 +499,8 @@ class YouTubeDownloaderApp:
                   command=self.add_to_queue, style='Success.TButton').pack(side='left', padx=5)
         ttk.Button(download_btn_frame, text="⏸️ Pause All", 
                   command=self.pause_all_downloads, style='Warning.TButton').pack(side='left', padx=5)
+        ttk.Button(download_btn_frame, text="▶️ Resume All", 
+                  command=self.resume_all_downloads, style='Success.TButton').pack(side='left', padx=5)
         
         # Progress section
         progress_frame = ttk.LabelFrame(download_frame, text="Progress", padding=10)
@@ -411,6 +529,8 @@ class YouTubeDownloaderApp:
                   style='Success.TButton').pack(side=tk.LEFT, padx=(0, 5))
         ttk.Button(controls_frame, text="⏸️ Pause All", command=self.pause_all_downloads,
                   style='Warning.TButton').pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(controls_frame, text="▶️ Resume All", command=self.resume_all_downloads,
+                  style='Success.TButton').pack(side=tk.LEFT, padx=(0, 5))
         ttk.Button(controls_frame, text="🗑️ Clear Queue", command=self.clear_queue,
                   style='Warning.TButton').pack(side=tk.LEFT, padx=(0, 5))
         
@@ -419,17 +539,19 @@ class YouTubeDownloaderApp:
         queue_list_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
         # Create treeview for queue
-        columns = ('Title', 'URL', 'Quality', 'Status', 'Progress')
+        columns = ('Title', 'URL', 'Quality', 'Status', 'Progress', 'Speed', 'ETA')
         self.queue_tree = ttk.Treeview(queue_list_frame, columns=columns, show='headings', height=15)
         
         for col in columns:
             self.queue_tree.heading(col, text=col)
-            self.queue_tree.column(col, width=150)
+            self.queue_tree.column(col, width=120)
         
         # Scrollbar for queue
         queue_scrollbar = ttk.Scrollbar(queue_list_frame, orient=tk.VERTICAL, command=self.queue_tree.yview)
         self.queue_tree.configure(yscrollcommand=queue_scrollbar.set)
         
+        self.queue_view = PagedTree(self.queue_tree, self.config.get('gui_page_size', 200))
+        self.create_pager(queue_list_frame, self.queue_view, self.update_queue_display)
         self.queue_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         queue_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
     
@@ -467,11 +589,27 @@ class YouTubeDownloaderApp:
         history_scrollbar = ttk.Scrollbar(history_list_frame, orient=tk.VERTICAL, command=self.history_tree.yview)
         self.history_tree.configure(yscrollcommand=history_scrollbar.set)
         
+        self.history_view = PagedTree(self.history_tree, self.config.get('gui_page_size', 200))
+        self.create_pager(history_list_frame, self.history_view, self.refresh_history)
         self.history_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         history_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
         self.refresh_history()
     
+    def create_pager(self, parent, view, refresh):
+        """Previous/next page buttons under a PagedTree"""
+        pager = ttk.Frame(parent)
+        pager.pack(side=tk.BOTTOM, fill=tk.X, pady=(5, 0))
+        
+        def turn(delta):
+            view.turn(delta)
+            refresh()
+        
+        ttk.Button(pager, text="◀ Prev", command=lambda: turn(-1)).pack(side=tk.LEFT)
+        ttk.Button(pager, text="Next ▶", command=lambda: turn(1)).pack(side=tk.RIGHT)
+        view.label = ttk.Label(pager, text="No items", style='Body.TLabel')
+        view.label.pack(side=tk.LEFT, expand=True)
+    
     def create_settings_tab(self):
         """Create the settings and preferences tab"""
         settings_frame = ttk.Frame(self.notebook)
@@ -520,8 +658,9 @@ class YouTubeDownloaderApp:
         concurrent_frame.pack(fill=tk.X, pady=(0, 10))
         ttk.Label(concurrent_frame, text="Max Concurrent Downloads:", style='Body.TLabel').pack(side=tk.LEFT)
         
-        self.concurrent_var = tk.IntVar(value=2)
-        concurrent_spin = ttk.Spinbox(concurrent_frame, from_=1, to=5, textvariable=self.concurrent_var, width=10)
+        self.concurrent_var = tk.IntVar(value=self.scheduler.max_workers)
+        concurrent_spin = ttk.Spinbox(concurrent_frame, from_=1, to=10, textvariable=self.concurrent_var, width=10,
+                                      command=self.set_concurrency)
         concurrent_spin.pack(side=tk.RIGHT)
         
         self.auto_organize_var = tk.BooleanVar(value=self.download_manager.settings.get('auto_organize', True))
@@ -600,18 +739,26 @@ class YouTubeDownloaderApp:
         def fetch_thread():
             try:
                 url = urls[0]  # Get metadata for first URL
-                ydl_opts = {"quiet": True, "no_warnings": True}
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    info = ydl.extract_info(url, download=False)
+                info = self.metadata_cache.get_or_fetch(url, lambda: self.extract_info(url), namespace='info')
+                stats = self.metadata_cache.stats()
                 
                 # Update UI in main thread
                 self.root.after(0, lambda: self.update_metadata_ui(info))
+                self.root.after(0, lambda: self.status_bar_label.config(
+                    text=f"Metadata cache: {stats['hits']} hits / {stats['misses']} misses "
+                         f"(hit {stats['avg_hit_ms']:.0f} ms, miss {stats['avg_miss_ms']:.0f} ms)"))
                 
             except Exception as e:
                 self.root.after(0, lambda: messagebox.showerror("Error", str(e)))
         
         threading.Thread(target=fetch_thread, daemon=True).start()
     
+    def extract_info(self, url):
+        ydl_opts = {"quiet": True, "no_warnings": True}
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            # sanitize_info makes the result JSON-serializable for the cache
+            return ydl.sanitize_info(ydl.extract_info(url, download=False))
+    
     def update_metadata_ui(self, info):
         self.title_label.config(text=f"Title: {info.get('title', 'Unknown')}")
         self.duration_label.config(text=f"Duration: {self.format_duration(info.get('duration', 0))}")
@@ -625,14 +772,15 @@ class YouTubeDownloaderApp:
         # Load thumbnail
         thumbnail_url = info.get("thumbnail")
         if thumbnail_url:
-            threading.Thread(target=lambda: self.load_thumbnail(thumbnail_url), daemon=True).start()
+            thumb_id = thumbnail_id(info.get("id"), thumbnail_url)
+            threading.Thread(target=lambda: self.load_thumbnail(thumbnail_url, thumb_id), daemon=True).start()
     
-    def load_thumbnail(self, thumbnail_url):
+    def load_thumbnail(self, thumbnail_url, thumb_id=None):
         try:
-            response = requests.get(thumbnail_url, timeout=10)
-            img_data = response.content
-            img = Image.open(BytesIO(img_data))
-            img = img.resize((160, 90))  # 16:9 ratio
+            # Pre-resized 160x90 copy from the on-disk cache shared with the web app
+            path, _ = self.thumbnail_cache.get(
+                thumb_id or thumbnail_id(url=thumbnail_url), 'small', url=thumbnail_url)
+            img = Image.open(path)
             tk_img = ImageTk.PhotoImage(img)
             
             self.root.after(0, lambda: self.update_thumbnail(tk_img))
@@ -682,6 +830,7 @@ class YouTubeDownloaderApp:
     
     def add_to_download_queue(self, url, format_type):
         download_item = {
+            'id': uuid.uuid4().hex,
             'url': url,
             'format': format_type,
             'status': 'Queued',
@@ -694,21 +843,68 @@ class YouTubeDownloaderApp:
         self.update_queue_display()
     
     def process_download_queue(self):
-        if not self.download_manager.download_queue:
+        """Hand every waiting item to the scheduler; at most max_concurrent_downloads run at once"""
+        manager = self.download_manager
+        while True:
+            try:
+                item = manager.download_queue.popleft()
+            except IndexError:
+                break
+            with manager.lock:
+                manager.active_downloads[item['id']] = item
+            # The size "Fetch Info" saw, if any, is what disk admission reserves
+            info = self.metadata_cache.get(item['url'], namespace='info')
+            size = expected_size(info) if info and is_single_video(item['url'], info) else None
+            self.scheduler.submit(item['id'], item['url'], self.run_queue_item, args=(item,), size=size)
+        self.update_queue_display()
+    
+    def run_queue_item(self, item):
+        retrying = deferred = False
+        try:
+            result = self.download_single_item(item)
+            # A conversion still running finishes the item itself
+            deferred = isinstance(result, Future)
+            return result
+        except RetryLater:
+            # Still an active item, waiting in the scheduler for its next attempt
+            retrying = True
+            raise
+        finally:
+            if not (retrying or deferred):
+                with self.download_manager.lock:
+                    self.download_manager.active_downloads.pop(item['id'], None)
+            self.request_queue_refresh()
+    
+    def reject_queue_item(self, job):
+        # The item can never fit on disk, so it fails instead of waiting in the queue
+        item = job.args[0]
+        item['status'] = f'Error: {job.error}'
+        with self.download_manager.lock:
+            self.download_manager.active_downloads.pop(item['id'], None)
+        self.request_queue_refresh()
+    
+    def apply_rate(self, item_id, rate):
+        # yt-dlp reads ratelimit from its params on every block, so a running transfer picks up its new share
+        params = self._transfer_params.get(item_id)
+        if params is not None:
+            params['ratelimit'] = rate
+    
+    def set_concurrency(self):
+        try:
+            max_workers = int(self.concurrent_var.get())
+        except (tk.TclError, ValueError):
             return
-        
-        def download_worker():
-            while self.download_manager.download_queue:
-                item = self.download_manager.download_queue.pop(0)
-                self.download_single_item(item)
-                self.root.after(0, self.update_queue_display)
-        
-        threading.Thread(target=download_worker, daemon=True).start()
+        self.scheduler.set_max_workers(max_workers)
+        self.config.set('max_concurrent_downloads', self.scheduler.max_workers)
     
     def download_single_item(self, item):
         url = item['url']
         format_type = item['format']
         
+        if self.download_archive is not None and self.download_archive.has_url(url):
+            item['status'] = 'Skipped (already downloaded)'
+            return
+        
         # Create download directory
         base_path = self.download_manager.settings['download_path']
         if self.download_manager.settings.get('auto_organize', True):
@@ -720,19 +916,27 @@ class YouTubeDownloaderApp:
             download_path = base_path
         
         os.makedirs(download_path, exist_ok=True)
+        # In-progress files go to the scratch directory; finished ones are moved to download_path
+        scratch_root = self.config.get('temp_directory')
+        # Named after the item, so a retry finds the .part file of the previous attempt
+        output_path = os.path.join(scratch_root, f"gui-{item['id']}") if scratch_root else download_path
+        finished_files = []
+        # Converted on the post-processing pool rather than by yt-dlp inside the download slot
+        convert = format_type == 'mp3' and self.postprocessor is not None
         
         # Configure yt-dlp options
         if format_type == 'mp3':
             ydl_opts = {
                 "format": "bestaudio/best",
-                "outtmpl": os.path.join(download_path, "%(title)s.%(ext)s"),
-                "postprocessors": [{
+                "outtmpl": os.path.join(output_path, "%(title)s.%(ext)s"),
+                "progress_hooks": [lambda d: self.progress_hook(d, item)]
+            }
+            if not convert:
+                ydl_opts["postprocessors"] = [{
                     "key": "FFmpegExtractAudio",
                     "preferredcodec": "mp3",
                     "preferredquality": "192",
-                }],
-                "progress_hooks": [lambda d: self.progress_hook(d, item)]
-            }
+                }]
         else:  # mp4
             quality = self.quality_var.get()
             format_selector = "bestvideo+bestaudio/best" if quality == "best" else f"best[height<={quality[:-1]}]"
@@ -740,30 +944,97 @@ class YouTubeDownloaderApp:
             ydl_opts = {
                 "format": format_selector,
                 "merge_output_format": "mp4",
-                "outtmpl": os.path.join(download_path, "%(title)s.%(ext)s"),
+                "outtmpl": os.path.join(output_path, "%(title)s.%(ext)s"),
                 "progress_hooks": [lambda d: self.progress_hook(d, item)]
             }
         
+        if self.download_archive is not None:
+            ydl_opts["download_archive"] = self.download_archive.path
+        ydl_opts["post_hooks"] = [finished_files.append]
+        expiry_margin = self.config.get('info_expiry_margin', 300)
+        
+        # Transient failures go back to the scheduler, which runs the item again after a backoff
+        # without it holding a download slot meanwhile; yt-dlp resumes the .part file
+        job = self.scheduler.get(item['id'])
+        attempt = job.attempts if job is not None else 0
         try:
             item['status'] = 'Downloading'
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
+                # Start from what "Fetch Info" already extracted; retries extract afresh
+                reuse = attempt == 0 and self.config.get('reuse_extracted_info', True)
+                info = self.metadata_cache.get(url, namespace='info') if reuse else None
+                if info is None or not is_single_video(url, info) or info_expired(info, expiry_margin):
+                    info = ydl.extract_info(url, download=False)
                 item['title'] = info.get('title', 'Unknown')
                 
+                if self.download_archive is not None and self.download_archive.has_info(info):
+                    item['status'] = 'Skipped (already downloaded)'
+                    return
+                
                 # Download thumbnail if requested
                 if self.format_vars['thumbnail'].get() or self.download_manager.settings.get('auto_thumbnail', False):
                     self.download_thumbnail(info, download_path)
                 
-                ydl.download([url])
-                
-                item['status'] = 'Completed'
-                
-                # Add to history
-                file_path = os.path.join(download_path, f"{info['title']}.{format_type}")
-                self.download_manager.add_to_history(url, info['title'], format_type, file_path)
-                
+                # Reuses the extraction above instead of running it again
+                self._transfer_params[item['id']] = ydl.params
+                ydl.params['ratelimit'] = self.bandwidth.add(item['id'])
+                try:
+                    ydl.process_ie_result(info, download=True)
+                finally:
+                    self._transfer_params.pop(item['id'], None)
+                    self.bandwidth.remove(item['id'])
+                if convert:
+                    item['status'] = 'Converting'
+                    return self.postprocess_item(item, info, finished_files, output_path, download_path)
+                self.finish_item(item, info, finished_files, output_path, download_path)
+            return
         except Exception as e:
-            item['status'] = f'Error: {str(e)}'
+            kind = classify_failure(str(e))
+            if not self.retry_policy.should_retry(kind, attempt):
+                item['status'] = f'Error: {str(e)}'
+                if scratch_root:
+                    shutil.rmtree(output_path, ignore_errors=True)
+                return
+            delay = self.retry_policy.delay(kind, attempt)
+            item['status'] = f'Retrying in {delay:.0f}s ({kind} error)'
+            raise RetryLater(delay, str(e))
+    
+    def finish_item(self, item, info, files, output_path, download_path, convert=False):
+        """Convert an item's downloaded files if that was left to us, move them into place and record it"""
+        if convert:
+            bitrate = self.config.get('audio_bitrate', '192')
+            files = [extract_audio(self.ffmpeg_path, path, 'mp3', bitrate) for path in files]
+        if output_path != download_path:
+            for path in files:
+                move_into(path, download_path)
+            shutil.rmtree(output_path, ignore_errors=True)
+        
+        item['status'] = 'Completed'
+        
+        # Add to history
+        file_path = os.path.join(download_path, f"{info['title']}.{item['format']}")
+        self.download_manager.add_to_history(item['url'], info['title'], item['format'], file_path)
+    
+    def postprocess_item(self, item, info, files, output_path, download_path):
+        """Queue an item's conversion; the returned future resolves once the item is finished"""
+        result = Future()
+        
+        def done(future):
+            try:
+                future.result()
+            except Exception as e:
+                item['status'] = f'Error: {str(e)}'
+                if output_path != download_path:
+                    shutil.rmtree(output_path, ignore_errors=True)
+            finally:
+                with self.download_manager.lock:
+                    self.download_manager.active_downloads.pop(item['id'], None)
+                self.request_queue_refresh()
+                result.set_result(item['status'] == 'Completed')
+        
+        future = self.postprocessor.submit(self.finish_item, item, info, files, output_path, download_path, True)
+        future.add_done_callback(done)
+        return result
     
     def download_thumbnail(self, info, download_path):
         try:
@@ -779,6 +1050,14 @@ class YouTubeDownloaderApp:
             print(f"Error downloading thumbnail: {e}")
     
     def progress_hook(self, d, item):
+        if not self.downloads_resumed.is_set():
+            # Holding the hook stalls yt-dlp's read loop, so the transfer stops without
+            # losing the bytes already written to the .part file
+            item['status'] = 'Paused'
+            self.request_queue_refresh()
+            self.downloads_resumed.wait()
+            item['status'] = 'Downloading'
+        
         if d["status"] == "downloading":
             percent = d.get("_percent_str", "0.0%").replace("%", "").strip()
             try:
@@ -792,6 +1071,7 @@ class YouTubeDownloaderApp:
             
             # Update main progress bar for first item
             self.root.after(0, lambda: self.update_main_progress(item))
+            self.request_queue_refresh()
             
         elif d["status"] == "finished":
             item['progress'] = 100
@@ -804,19 +1084,25 @@ class YouTubeDownloaderApp:
         self.root.update_idletasks()
     
     def update_queue_display(self):
-        # Clear existing items
-        for item in self.queue_tree.get_children():
-            self.queue_tree.delete(item)
-        
-        # Add queue items
-        for item in self.download_manager.download_queue + list(self.download_manager.active_downloads.values()):
-            self.queue_tree.insert('', 'end', values=(
-                item['title'][:30] + '...' if len(item['title']) > 30 else item['title'],
-                item['status'],
-                f"{item['progress']:.1f}%",
-                item['speed'],
-                item['eta']
-            ))
+        self._queue_refresh_pending = False
+        with self.download_manager.lock:
+            items = list(self.download_manager.download_queue) + list(self.download_manager.active_downloads.values())
+        # Only rows on the current page that changed are touched
+        self.queue_view.show(items, lambda item: (item['id'], (
+            item['title'][:30] + '...' if len(item['title']) > 30 else item['title'],
+            item['url'],
+            item['format'].upper(),
+            item['status'],
+            f"{item['progress']:.1f}%",
+            item['speed'],
+            item['eta']
+        )))
+    
+    def request_queue_refresh(self):
+        """Redraw the queue soon; calls from worker threads within 250 ms share one redraw"""
+        if not self._queue_refresh_pending:
+            self._queue_refresh_pending = True
+            self.root.after(250, self.update_queue_display)
     
     def choose_download_folder(self):
         folder = filedialog.askdirectory(initialdir=self.download_manager.settings['download_path'])
@@ -829,6 +1115,10 @@ class YouTubeDownloaderApp:
         self.download_manager.settings['auto_organize'] = self.auto_organize_var.get()
         self.download_manager.settings['auto_thumbnail'] = self.auto_thumbnail_var.get()
         self.download_manager.save_settings()
+        if self.disk_guard is not None:
+            # Admission checks whichever download folder new items will be written to
+            self.disk_guard.set_directories(
+                [self.config.get('temp_directory'), self.download_manager.settings['download_path']])
     
     def paste_from_clipboard(self):
         try:
@@ -863,19 +1153,16 @@ class YouTubeDownloaderApp:
             self.monitor_clipboard()
     
     def refresh_history(self):
-        # Clear existing items
-        for item in self.history_tree.get_children():
-            self.history_tree.delete(item)
-        
-        # Add history items
-        for item in self.download_manager.history:
-            date_str = datetime.fromisoformat(item['timestamp']).strftime('%Y-%m-%d %H:%M')
-            self.history_tree.insert('', 'end', values=(
-                item['title'][:40] + '...' if len(item['title']) > 40 else item['title'],
-                item['format'].upper(),
-                date_str,
-                item['file_path']
-            ))
+        # History is append-only, so an entry's position is a stable row id
+        entries = list(enumerate(self.download_manager.history))
+        self.history_view.show(entries, lambda entry: (f"h{entry[0]}", (
+            datetime.fromisoformat(entry[1]['timestamp']).strftime('%Y-%m-%d %H:%M'),
+            entry[1]['title'][:40] + '...' if len(entry[1]['title']) > 40 else entry[1]['title'],
+            entry[1]['url'],
+            entry[1]['format'].upper(),
+            'Completed',
+            entry[1]['file_path']
+        )))
     
     def clear_history(self):
         if messagebox.askyesno("Confirm", "Clear all download history?"):
@@ -920,10 +1207,15 @@ For better distribution, consider using:
         messagebox.showinfo("Packaging Guide", info_text)
     
     def pause_all_downloads(self):
-        messagebox.showinfo("Feature", "Pause/Resume functionality would be implemented here")
+        """Suspend running downloads at their next progress update"""
+        self.downloads_resumed.clear()
+        self.scheduler.pause()
+        self.status_bar_label.config(text="Downloads paused")
     
     def resume_all_downloads(self):
-        messagebox.showinfo("Feature", "Resume functionality would be implemented here")
+        self.downloads_resumed.set()
+        self.scheduler.resume()
+        self.status_bar_label.config(text="Downloads resumed")
     
     def clear_completed(self):
         messagebox.showinfo("Feature", "Clear completed downloads from queue")
@@ -1051,7 +1343,13 @@ Built with Python, tkinter, and yt-dlp
     def clear_queue(self):
         """Clear the download queue"""
         if messagebox.askyesno("Clear Queue", "Clear all items from download queue?"):
-            self.download_manager.download_queue.clear()
+            manager = self.download_manager
+            manager.download_queue.clear()
+            # Started items that haven't reached a worker yet are dropped too
+            with manager.lock:
+                for item_id in list(manager.active_downloads):
+                    if self.scheduler.cancel(item_id):
+                        del manager.active_downloads[item_id]
             self.update_queue_display()
     
     def export_history(self):
@@ -1077,6 +1375,9 @@ Built with Python, tkinter, and yt-dlp
         """Handle application closing"""
         if messagebox.askokcancel("Quit", "Do you want to quit? Any active downloads will be stopped."):
             self.download_manager.save_settings()
+            self.scheduler.shutdown()
+            if self.postprocessor is not None:
+                self.postprocessor.shutdown()
             self.root.destroy()
     
     def update_stats(self):
@@ -1218,51 +1519,6 @@ class URLProcessor:
         return url
 
 
-# Configuration manager for advanced settings
-class ConfigManager:
-    def __init__(self):
-        self.config_file = 'advanced_config.json'
-        self.default_config = {
-            'max_concurrent_downloads': 3,
-            'retry_attempts': 3,
-            'timeout_seconds': 30,
-            'temp_directory': None,
-            'proxy_settings': None,
-            'custom_headers': {},
-            'rate_limit': None,
-            'preferred_codec': 'auto',
-            'subtitle_languages': ['en'],
-            'thumbnail_quality': 'maxresdefault',
-            'audio_bitrate': '192',
-            'video_quality_priority': ['1080p', '720p', '480p'],
-            'naming_template': '%(title)s.%(ext)s',
-            'auto_update_ytdlp': True
-        }
-        self.config = self.load_config()
-    
-    def load_config(self):
-        try:
-            with open(self.config_file, 'r') as f:
-                loaded_config = json.load(f)
-                # Merge with defaults
-                config = self.default_config.copy()
-                config.update(loaded_config)
-                return config
-        except FileNotFoundError:
-            return self.default_config.copy()
-    
-    def save_config(self):
-        with open(self.config_file, 'w') as f:
-            json.dump(self.config, f, indent=4)
-    
-    def get(self, key, default=None):
-        return self.config.get(key, default)
-    
-    def set(self, key, value):
-        self.config[key] = value
-        self.save_config()
-
-
 # Enhanced download statistics
 class DownloadStats:
     def __init__(self):
@@ -0,0 +1,228 @@
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from bandwidth import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Concurrent downloads that can have their own live rate limit and be paused
+RATE_SLOTS = 256
+
+# How often a paused download checks whether it was resumed
+PAUSE_POLL_INTERVAL = 0.2
+
+# Set in each worker process by _init_worker
+_progress_queue = None
+_rates = None
+_paused = None
+
+
+# --- Worker process side ---
+def _init_worker(progress_queue, rates, paused):
+    global _progress_queue, _rates, _paused
+    _progress_queue = progress_queue
+    _rates = rates
+    _paused = paused
+    # Pay the interpreter + extractor import cost once per worker, not once per job
+    import yt_dlp
+    yt_dlp.YoutubeDL({'quiet': True})
+
+
+def _ping(delay):
+    time.sleep(delay)
+    return True
+
+
+def _extract(url, flat=True):
+    import yt_dlp
+    ydl_opts = {'quiet': True, 'no_warnings': True, 'skip_download': True}
+    if flat:
+        ydl_opts['extract_flat'] = 'in_playlist'
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.sanitize_info(ydl.extract_info(url, download=False))
+    # Same shape as `yt-dlp --dump-json --flat-playlist`: one dict per video
+    if info.get('_type') == 'playlist':
+        return [entry for entry in info.get('entries') or [] if entry]
+    return [info]
+
+
+def _download(job_id, url, ydl_opts, rate_slot=None, info=None):
+    """Returns the paths of the finished files, or None if yt-dlp failed; starts from info if given"""
+    import yt_dlp
+
+    bucket = TokenBucket()
+    counted = {'filename': None, 'bytes': 0}
+
+    def throttle(d, downloaded):
+        # The parent rewrites our slot whenever the job's bandwidth share changes
+        rate = _rates[rate_slot] or None
+        if rate != bucket.rate:
+            bucket.set_rate(rate)
+        if d.get('filename') != counted['filename']:
+            # New file, or a resumed .part: bytes already on disk are free
+            counted['filename'] = d.get('filename')
+            counted['bytes'] = downloaded
+        # Sleeping here stalls yt-dlp's read loop, which is what limits the rate
+        bucket.consume(downloaded - counted['bytes'])
+        counted['bytes'] = downloaded
+
+    def progress_hook(d):
+        if d['status'] != 'downloading':
+            return
+        if rate_slot is not None:
+            # Pausing only stalls this job's read loop; the worker process itself is shared
+            while _paused[rate_slot]:
+                time.sleep(PAUSE_POLL_INTERVAL)
+        downloaded = d.get('downloaded_bytes') or 0
+        if rate_slot is not None:
+            throttle(d, downloaded)
+        total = d.get('total_bytes') or d.get('total_bytes_estimate')
+        # Same fields as progress_parser.parse_progress_line
+        _progress_queue.put((job_id, {
+            'status': 'Downloading',
+            'progress': downloaded * 100.0 / total if total else 0.0,
+            'downloaded_bytes': downloaded,
+            'total_bytes': int(total) if total else None,
+            'speed': d.get('speed'),
+            'eta': d.get('eta')
+        }))
+
+    files = []
+    ydl_opts = dict(ydl_opts, quiet=True, no_warnings=True, noprogress=True, progress_hooks=[progress_hook],
+                    post_hooks=[files.append])
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        if info is not None:
+            # Already extracted: only format selection and the download are left
+            ydl.process_ie_result(info, download=True)
+            return files
+        return files if ydl.download([url]) == 0 else None
+
+
+# --- Parent process side ---
+class YtdlpEngine:
+    """Runs yt_dlp.YoutubeDL jobs in pools of pre-warmed worker processes.
+
+    Separate processes keep extraction off the server's GIL and contain
+    crashes: if a worker dies its pool is rebuilt and only the jobs that were
+    running on it fail. Progress from download hooks comes back over a
+    multiprocessing queue and is handed to on_progress(job_id, data). Rate
+    limits and pauses go the other way through shared memory, one slot per
+    running download, so a pause never stops the other jobs of a worker.
+    """
+
+    def __init__(self, download_workers=4, metadata_workers=2, on_progress=None):
+        self._ctx = multiprocessing.get_context('spawn')
+        self._progress_queue = self._ctx.Queue()
+        self._sizes = {'download': max(1, download_workers), 'metadata': max(1, metadata_workers)}
+        self._pools = {}
+        self._lock = threading.Lock()
+        # Per-job rate limits in shared memory, bytes/sec (0 = unlimited)
+        self._rates = self._ctx.RawArray('d', RATE_SLOTS)
+        # Per-job pause flags, checked by the job's progress hook
+        self._paused = self._ctx.RawArray('b', RATE_SLOTS)
+        self._paused_jobs = set()
+        self._free_slots = list(range(RATE_SLOTS))
+        self._slots = {}  # job_id -> index into self._rates and self._paused
+        self.on_progress = on_progress
+        for kind in self._sizes:
+            self._pools[kind] = self._create_pool(kind)
+        threading.Thread(target=self._relay_progress, daemon=True).start()
+
+    def warm_up(self):
+        """Start every worker now so the first jobs don't pay for process startup"""
+        futures = [self._pools[kind].submit(_ping, 0.2)
+                   for kind, size in self._sizes.items() for _ in range(size)]
+        for future in futures:
+            future.result()
+
+    def extract(self, url, flat=True):
+        return self._run('metadata', _extract, url, flat)
+
+    def download(self, job_id, url, ydl_opts, rate=None, info=None):
+        with self._lock:
+            slot = self._free_slots.pop() if self._free_slots else None
+            if slot is not None:
+                self._slots[job_id] = slot
+                self._rates[slot] = rate or 0
+                # Paused before it reached a worker
+                self._paused[slot] = job_id in self._paused_jobs
+        try:
+            return self._run('download', _download, job_id, url, ydl_opts, slot, info)
+        finally:
+            with self._lock:
+                self._paused_jobs.discard(job_id)
+                if self._slots.pop(job_id, None) is not None:
+                    self._paused[slot] = 0
+                    self._free_slots.append(slot)
+
+    def set_rate(self, job_id, rate):
+        """Change a running download's rate limit (bytes/sec, None for unlimited)"""
+        with self._lock:
+            slot = self._slots.get(job_id)
+            if slot is not None:
+                self._rates[slot] = rate or 0
+
+    def set_paused(self, job_id, paused):
+        """Hold or release a download at its next progress update, without stopping its worker"""
+        with self._lock:
+            if paused:
+                self._paused_jobs.add(job_id)
+            else:
+                self._paused_jobs.discard(job_id)
+            slot = self._slots.get(job_id)
+            if slot is not None:
+                self._paused[slot] = 1 if paused else 0
+
+    def shutdown(self):
+        with self._lock:
+            for pool in self._pools.values():
+                pool.shutdown(wait=False, cancel_futures=True)
+        self._progress_queue.put(None)
+
+    def _create_pool(self, kind):
+        return ProcessPoolExecutor(max_workers=self._sizes[kind], mp_context=self._ctx,
+                                   initializer=_init_worker, initargs=(self._progress_queue, self._rates, self._paused))
+
+    def _run(self, kind, fn, *args):
+        with self._lock:
+            pool = self._pools[kind]
+        try:
+            return pool.submit(fn, *args).result()
+        except BrokenProcessPool:
+            with self._lock:
+                if self._pools[kind] is pool:
+                    logger.error(f"yt-dlp {kind} worker crashed, restarting pool")
+                    self._pools[kind] = self._create_pool(kind)
+            raise RuntimeError("yt-dlp worker process crashed")
+
+    def _relay_progress(self):
+        while True:
+            message = self._progress_queue.get()
+            if message is None:
+                return
+            if self.on_progress:
+                try:
+                    self.on_progress(*message)
+                except Exception:
+                    logger.exception("Progress callback failed")
+
+
+def build_ydl_options(options):
+    """Translate the web app's download options into YoutubeDL params"""
+    ydl_opts = {
+        'format': options['format_code'],
+        'outtmpl': options['output_template'],
+        'continuedl': True,
+    }
+    if options.get('extract_audio') and not options.get('defer_postprocess'):
+        ydl_opts['postprocessors'] = [{
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': options['audio_format'],
+        }]
+    if options.get('download_archive'):
+        ydl_opts['download_archive'] = options['download_archive']
+    return ydl_opts